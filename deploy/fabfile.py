@@ -23,7 +23,18 @@ class FabricDeployCommand(object):
         self.parser = _parser
         self.options, self.args = self.parser.parse_args()
         self.deploy = DeployContext(cfg=Configuration(
-            self.options.configPath, self.options.configName, configOutPath=self.options.output),
+            self.options.configPath, self.options.configName, configOutPath=self.options.output,
+            parallel=self.options.parallel, maxWorkers=self.options.max_workers,
+            perHostWorkers=self.options.per_host_workers,
+            sshBackend=self.options.ssh_backend, chunkSize=self.options.chunk_size,
+            sshCompress=self.options.ssh_compress, fullUpload=self.options.full_upload,
+            streamUpload=self.options.stream_upload,
+            relay=self.options.relay, relayFanout=self.options.relay_fanout,
+            packageWorkers=self.options.package_workers, sharedBundle=self.options.shared_bundle,
+            hostBundle=self.options.host_bundle, packageFormat=self.options.package_format,
+            memoryPackage=self.options.memory_package, debugArtifacts=self.options.debug_artifacts,
+            force=self.options.force, crossCheck=self.options.cross_check,
+            channelWorkers=self.options.channel_workers),
             virtual_host=self.options.virtual_host
         )
 
@@ -49,6 +60,8 @@ class FabricDeployCommand(object):
             wrap(self.deploy.compose_zip, self.options.zip_modules)
         elif self.options.compose_show:
             wrap(self.deploy.compose_show, self.options.zip_modules)
+        elif self.options.compose_benchmark:
+            wrap(self.deploy.compose_benchmark, self.options.zip_modules)
         else:
             self.parser.print_help()
 
@@ -290,6 +303,45 @@ if __name__ == '__main__':
                      help="Hyperledger Fabric extend 配置文件名, 用于定义需要对现有的Fabric网络进行扩充, default: extend.yaml")
     group.add_option("--output", dest="output", default="./gen",
                      help="配置文件输出结果目录,default: ./gen")
+    group.add_option("--parallel", action="store_true", dest="parallel",
+                     help="多台服务器并发执行拷贝、安装等远程操作")
+    group.add_option("--max-workers", dest="max_workers", type="int", default=8,
+                     help="并发执行的最大线程数, default: 8")
+    group.add_option("--per-host-workers", dest="per_host_workers", type="int", default=1,
+                     help="单台服务器并发执行的最大线程数, default: 1")
+    group.add_option("--ssh-backend", dest="ssh_backend", default="fabric",
+                     help="远程执行后端 fabric/asyncssh/fake, default: fabric")
+    group.add_option("--chunk-size", dest="chunk_size", type="int", default=32768,
+                     help="sftp 文件传输分块大小(字节), default: 32768")
+    group.add_option("--ssh-compress", action="store_true", dest="ssh_compress",
+                     help="启用 ssh 传输层压缩")
+    group.add_option("--full-upload", action="store_true", dest="full_upload",
+                     help="重新打包并上传完整 zip 包, 默认跳过未变化的配置包, 并对比远程文件 sha256 只上传变化的文件")
+    group.add_option("--stream-upload", action="store_true", dest="stream_upload",
+                     help="拷贝配置时以 tar 流直接解压至远程目录, 不生成本地 zip 包及远程临时文件")
+    group.add_option("--relay", action="store_true", dest="relay",
+                     help="多台主机共用的文件只上传至种子主机, 再由主机之间树形中继分发, 同时开启 --shared-bundle")
+    group.add_option("--relay-fanout", dest="relay_fanout", type="int", default=2,
+                     help="树形中继分发时每台主机每轮分发的主机数, default: 2")
+    group.add_option("--package-workers", dest="package_workers", type="int", default=1,
+                     help="并发生成配置包的进程数, default: 1")
+    group.add_option("--shared-bundle", action="store_true", dest="shared_bundle",
+                     help="组件共用的证书目录按内容打包为共享包, 每台主机只上传一次")
+    group.add_option("--host-bundle", action="store_true", dest="host_bundle",
+                     help="同一台主机的所有配置包合并为一个压缩包, 只上传、解压一次")
+    group.add_option("--memory-package", action="store_true", dest="memory_package",
+                     help="配置包在内存中生成并直接上传(超过 16MB 转存至临时文件), 不写入 package 目录, "
+                          "多台主机时打包与上传并行")
+    group.add_option("--package-format", dest="package_format", default="zip",
+                     help="配置包格式 zip/zip-deflate/tar.gz/tar.zst, 可指定压缩级别如 zip-deflate:9, tar.zst 需要安装 zstandard, default: zip")
+    group.add_option("--debug-artifacts", action="store_true", dest="debug_artifacts",
+                     help="扩展 channel/联盟时在 configtx/channels 下保存配置更新各步骤的中间文件(json/pb)")
+    group.add_option("--force", action="store_true", dest="force",
+                     help="忽略 configtxgen 输入指纹, 强制重新生成创世块及 channel 交易文件")
+    group.add_option("--cross-check", action="store_true", dest="cross_check",
+                     help="扩展 channel/联盟时同时运行 configtxlator compute_update, 与进程内计算的配置增量不一致时终止")
+    group.add_option("--channel-workers", dest="channel_workers", type="int", default=1,
+                     help="一键部署时并发生成 channel 交易文件及创建/加入 channel 的 channel 数, default: 1")
     parser.add_option_group(group)
 
     group = OptionGroup(parser, "Generate Options", "生成Docker-Compose选项")
@@ -307,6 +359,8 @@ if __name__ == '__main__':
                      dest="clean_zip", help="删除生成的 .zip 文件")
     group.add_option("--show", action="store_true", dest="compose_show",
                      help="列出所有 crypto-config & docker compose zip")
+    group.add_option("--package-benchmark", action="store_true", dest="compose_benchmark",
+                     help="对比各配置包格式打包当前输出目录的大小及打包、解压耗时")
     parser.add_option_group(group)
 
     group = OptionGroup(parser, "Crypto Options", "生成配置文件选项")
@@ -9,6 +9,7 @@ import logging
 from optparse import OptionParser
 from utils.configuration import Configuration, ExtendConfiguration
 from utils.context import DeployContext
+from utils.remote import SshHost
 
 logger = logging.getLogger(__name__)
 
@@ -29,12 +30,68 @@ if __name__ == '__main__':
                       help="Hyperledger Fabric Go SDK Client 配置文件生成")
     parser.add_option("--org-name", dest="sdk_org", help="Hyperledger Fabric Go SDK Client 配置的组织")
     parser.add_option("--clean-all", action="store_true", dest="clean_all", help="Hyperledger Fabric 网络节点清除操作")
+    parser.add_option("--parallel", action="store_true", dest="parallel", help="多台服务器并发执行拷贝、安装等远程操作")
+    parser.add_option("--max-workers", dest="max_workers", type="int", default=8,
+                      help="并发执行的最大线程数, default: 8")
+    parser.add_option("--per-host-workers", dest="per_host_workers", type="int", default=1,
+                      help="单台服务器并发执行的最大线程数, default: 1")
+    parser.add_option("--ssh-backend", dest="ssh_backend", default="fabric",
+                      help="远程执行后端 fabric/asyncssh/fake, asyncssh 使用单个事件循环处理所有主机连接, "
+                           "fake 为进程内模拟主机(测试用), default: fabric")
+    parser.add_option("--chunk-size", dest="chunk_size", type="int", default=32768,
+                      help="sftp 文件传输分块大小(字节), default: 32768")
+    parser.add_option("--ssh-compress", action="store_true", dest="ssh_compress",
+                      help="启用 ssh 传输层压缩")
+    parser.add_option("--full-upload", action="store_true", dest="full_upload",
+                      help="重新打包并上传完整 zip 包, 默认跳过未变化的配置包, 并对比远程文件 sha256 只上传变化的文件")
+    parser.add_option("--stream-upload", action="store_true", dest="stream_upload",
+                      help="拷贝配置时以 tar 流直接解压至远程目录, 不生成本地 zip 包及远程临时文件")
+    parser.add_option("--relay", action="store_true", dest="relay",
+                      help="多台主机共用的文件只上传至种子主机, 再由主机之间树形中继分发, 同时开启 --shared-bundle")
+    parser.add_option("--relay-fanout", dest="relay_fanout", type="int", default=2,
+                      help="树形中继分发时每台主机每轮分发的主机数, default: 2")
+    parser.add_option("--package-workers", dest="package_workers", type="int", default=1,
+                      help="并发生成配置包的进程数, default: 1")
+    parser.add_option("--shared-bundle", action="store_true", dest="shared_bundle",
+                      help="组件共用的证书目录按内容打包为共享包, 每台主机只上传一次")
+    parser.add_option("--host-bundle", action="store_true", dest="host_bundle",
+                      help="同一台主机的所有配置包合并为一个压缩包, 只上传、解压一次")
+    parser.add_option("--memory-package", action="store_true", dest="memory_package",
+                      help="配置包在内存中生成并直接上传(超过 16MB 转存至临时文件), 不写入 package 目录, "
+                           "多台主机时打包与上传并行")
+    parser.add_option("--package-format", dest="package_format", default="zip",
+                      help="配置包格式 zip/zip-deflate/tar.gz/tar.zst, 可指定压缩级别如 zip-deflate:9, tar.zst 需要安装 zstandard, default: zip")
+    parser.add_option("--debug-artifacts", action="store_true", dest="debug_artifacts",
+                      help="扩展 channel/联盟时在 configtx/channels 下保存配置更新各步骤的中间文件(json/pb)")
+    parser.add_option("--force", action="store_true", dest="force",
+                      help="忽略 configtxgen 输入指纹, 强制重新生成创世块及 channel 交易文件")
+    parser.add_option("--cross-check", action="store_true", dest="cross_check",
+                      help="扩展 channel/联盟时同时运行 configtxlator compute_update, 与进程内计算的配置增量不一致时终止")
+    parser.add_option("--channel-workers", dest="channel_workers", type="int", default=1,
+                      help="一键部署时并发生成 channel 交易文件及创建/加入 channel 的 channel 数, default: 1")
+    parser.add_option("--package-benchmark", action="store_true", dest="package_benchmark",
+                      help="对比各配置包格式打包当前输出目录的大小及打包、解压耗时")
+    parser.add_option("--metrics-json", dest="metrics_json",
+                      help="部署结束时将远程操作统计(耗时、退出码、收发字节数、重试次数)导出为 json 文件")
 
     options, args = parser.parse_args()
 
-    deploy = DeployContext(cfg=Configuration(options.config_path, options.config_name, configOutPath=options.output),
+    deploy = DeployContext(cfg=Configuration(options.config_path, options.config_name, configOutPath=options.output,
+                                             parallel=options.parallel, maxWorkers=options.max_workers,
+                                             perHostWorkers=options.per_host_workers,
+                                             sshBackend=options.ssh_backend, chunkSize=options.chunk_size,
+                                             sshCompress=options.ssh_compress, fullUpload=options.full_upload,
+                                             streamUpload=options.stream_upload,
+                                             relay=options.relay, relayFanout=options.relay_fanout,
+                                             packageWorkers=options.package_workers,
+                                             sharedBundle=options.shared_bundle, hostBundle=options.host_bundle,
+                                             packageFormat=options.package_format,
+                                             memoryPackage=options.memory_package,
+                                             debugArtifacts=options.debug_artifacts,
+                                             force=options.force, crossCheck=options.cross_check,
+                                             channelWorkers=options.channel_workers),
                            ext=ExtendConfiguration(options.config_path, options.extend_filename),
-                           virtual_host=options.virtual_host)
+                           virtual_host=options.virtual_host, metrics_json=options.metrics_json)
 
     try:
         if options.install:
@@ -50,6 +107,9 @@ if __name__ == '__main__':
             logger.info(f"[*] Begin to generate go sdk config yaml, client<{options.sdk_org}>.")
             deploy.load_network()
             deploy.gen_go_sdk_yaml(options.sdk_org)
+        elif options.package_benchmark:
+            deploy.load_network()
+            deploy.compose_benchmark("zookeeper", "kafka", "orderer", "orderer-cli", "peer", "peer-cli")
         elif options.clean_all:
             flag = input("✘ Clear all server deployment scripts, run containers, and mount directories [N/y]:")
             if flag.lower() == "y":
@@ -61,3 +121,5 @@ if __name__ == '__main__':
 
     except Exception as e:
         logger.error(e, exc_info=True)
+    finally:
+        SshHost.close_all()
@@ -6,8 +6,11 @@
 @Email:  quanbin@parcelx.io
 """
 
+from utils.configtx.codec import ProtoCodec
 from utils.configtx.config import ConfigTxConfigure
 from utils.configtx.handle import ConfigTxHandler, CustomChannel
+from utils.configtx.sign import MspSigner
+from utils.configtx.update import compute_update
 
-__all__ = ["ConfigTxConfigure", "ConfigTxHandler", "CustomChannel"]
+__all__ = ["ConfigTxConfigure", "ConfigTxHandler", "CustomChannel", "MspSigner", "ProtoCodec", "compute_update"]
 
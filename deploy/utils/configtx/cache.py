@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+    channel 配置区块本地缓存, 目录 configtx/channels/<channel>/:
+        - config_block.<sequence>.pb   按配置序号保存的配置区块, 只保留最新的一个
+        - config_cache.json            缓存索引: 区块号、配置序号、缓存时 channel 的区块高度、是否已确认
+    channel 区块高度与缓存时一致时(peer channel getinfo)直接使用缓存, 不再从 orderer 获取;
+    本工具提交 config update 后, 在本地应用增量生成新的配置区块, 记录为未确认:
+        orderer 接受广播不代表区块已提交, 之后 peer 的区块高度大于提交前的高度时才确认并使用
+"""
+import os
+import re
+import json
+import logging
+
+from .update import apply_update
+
+logger = logging.getLogger(__name__)
+
+
+class ConfigBlockCache(object):
+    INDEX = "config_cache.json"
+
+    def __init__(self, root, codec):
+        """
+        :param root: 缓存根目录, 即 ConfigTxConfigure.configtx_channels
+        :param codec: <utils.configtx.codec.ProtoCodec>
+        """
+        self.root = root
+        self.codec = codec
+
+    def block_path(self, channel, sequence):
+        return os.path.join(self.root, channel, f"config_block.{sequence}.pb")
+
+    def index_path(self, channel):
+        return os.path.join(self.root, channel, ConfigBlockCache.INDEX)
+
+    def get(self, channel, height=None):
+        """
+        获取缓存的配置区块
+        :param channel:
+        :param height: 当前 channel 区块高度, 不一致时缓存失效
+        :return: 配置区块文件路径 或 None
+        """
+        if self.codec is None or not os.path.exists(self.index_path(channel)):
+            return None
+        with open(self.index_path(channel)) as fp:
+            index = json.load(fp)
+        path = self.block_path(channel, index["sequence"])
+        if not os.path.exists(path):
+            return None
+        if height is not None and not index.get("verified", True) and height > index["height"]:
+            # 提交 config update 后 peer 区块高度增长, 确认本地生成的配置区块
+            logger.info(f"config block cache of channel<{channel}> verified, height {index['height']} -> {height}")
+            index.update(height=height, verified=True)
+            with open(self.index_path(channel), "w") as fp:
+                json.dump(index, fp, indent=4)
+        elif height is None or height != index["height"] or not index.get("verified", True):
+            logger.info(f"config block cache of channel<{channel}> expired or unverified, "
+                        f"height {index['height']} -> {height}")
+            return None
+        logger.info(f"config block cache of channel<{channel}> hit, sequence {index['sequence']}, height {height}")
+        return path
+
+    def put(self, channel, block, height, synthesized=False, verified=True):
+        """
+        缓存配置区块
+        :param channel:
+        :param block: common.Block bytes
+        :param height: 获取配置区块时 channel 的区块高度, 未知时不缓存;
+                       未确认时为提交 config update 前的区块高度
+        :param synthesized: 是否为本地应用增量生成的区块
+        :param verified: 区块是否已确认提交
+        :return: 配置区块文件路径 或 None
+        """
+        if self.codec is None or height is None:
+            return None
+        number, config = self.__parse(block)
+        path = self.block_path(channel, config.sequence)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(f"{path}.tmp", "wb") as fp:
+            fp.write(block)
+        os.replace(f"{path}.tmp", path)
+        with open(self.index_path(channel), "w") as fp:
+            json.dump({"number": number, "sequence": config.sequence, "height": height,
+                       "synthesized": synthesized, "verified": verified}, fp, indent=4)
+        # 只保留最新的配置区块
+        for filename in os.listdir(os.path.dirname(path)):
+            if re.match(r"^config_block\.\d+\.pb$", filename) and filename != os.path.basename(path):
+                os.remove(os.path.join(os.path.dirname(path), filename))
+        return path
+
+    def update(self, channel, config_update):
+        """
+        本工具提交的 config update 被 orderer 接受后, 在缓存上应用增量, 生成的区块待确认; 增量与缓存不匹配时清除缓存
+        :param channel:
+        :param config_update: common.ConfigUpdate bytes
+        :return:
+        """
+        if self.codec is None or not os.path.exists(self.index_path(channel)):
+            return None
+        with open(self.index_path(channel)) as fp:
+            index = json.load(fp)
+        path = self.block_path(channel, index["sequence"])
+        if not os.path.exists(path) or not index.get("verified", True):
+            # 上一次生成的区块尚未确认
+            self.invalidate(channel)
+            return None
+        with open(path, "rb") as fp:
+            _, config = self.__parse(fp.read())
+
+        update = self.codec.message_type("common.ConfigUpdate")()
+        update.ParseFromString(config_update)
+        if not self.__read_set_matches(config.channel_group, update.read_set):
+            logger.info(f"config update does not match the cached config of channel<{channel}>, drop cache")
+            self.invalidate(channel)
+            return None
+        # 配置交易单独出块, 区块号为提交时的区块高度
+        block = self.__block(channel, index["height"], apply_update(config, update))
+        return self.put(channel, block, index["height"], synthesized=True, verified=False)
+
+    def invalidate(self, channel):
+        if os.path.exists(self.index_path(channel)):
+            os.remove(self.index_path(channel))
+
+    def __read_set_matches(self, group, read_set):
+        """
+        读集中的版本号与缓存的配置一致
+        """
+        if group.version != read_set.version:
+            return False
+        for members, read_members in ((group.values, read_set.values), (group.policies, read_set.policies)):
+            for name, item in read_members.items():
+                if name not in members or members[name].version != item.version:
+                    return False
+        for name, child in read_set.groups.items():
+            if name not in group.groups or not self.__read_set_matches(group.groups[name], child):
+                return False
+        return True
+
+    def __parse(self, block):
+        """
+        :return: (区块号, common.Config)
+        """
+        msg = self.codec.message_type("common.Block")()
+        msg.ParseFromString(block)
+        envelope = self.codec.message_type("common.Envelope")()
+        envelope.ParseFromString(msg.data.data[0])
+        payload = self.codec.message_type("common.Payload")()
+        payload.ParseFromString(envelope.payload)
+        config_envelope = self.codec.message_type("common.ConfigEnvelope")()
+        config_envelope.ParseFromString(payload.data)
+        return msg.header.number, config_envelope.config
+
+    def __block(self, channel, number, config):
+        """
+        生成只包含配置的区块, 供后续 decode/extract 使用
+        """
+        channel_header = self.codec.message_type("common.ChannelHeader")(type=1, channel_id=channel)
+        payload = self.codec.message_type("common.Payload")(
+            header=self.codec.message_type("common.Header")(channel_header=channel_header.SerializeToString()),
+            data=self.codec.message_type("common.ConfigEnvelope")(config=config).SerializeToString())
+        envelope = self.codec.message_type("common.Envelope")(payload=payload.SerializeToString())
+        block = self.codec.message_type("common.Block")()
+        block.header.number = number
+        block.data.data.append(envelope.SerializeToString())
+        return block.SerializeToString(deterministic=True)
@@ -0,0 +1,311 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+    进程内 protobuf 编解码, 与 configtxlator proto_encode/proto_decode 的 json 格式一致:
+        - 字段名为 proto 原始字段名, 未设置的字段输出默认值, 64 位整数输出为字符串, 枚举输出为名称
+        - 嵌套在 bytes 字段中的消息(Envelope.payload、ConfigValue.value、Policy.value ...)按上下文展开
+        - 使用 hfc 自带的 Fabric protobuf 定义, 不需要启动 configtxlator 进程及读写中间文件
+"""
+import base64
+
+try:
+    from google.protobuf.descriptor import FieldDescriptor
+    from hfc.protos.common import common_pb2, configtx_pb2, configuration_pb2, policies_pb2
+    from hfc.protos.msp import identities_pb2, msp_config_pb2, msp_principal_pb2
+    from hfc.protos.orderer import configuration_pb2 as orderer_configuration_pb2
+    from hfc.protos.peer import configuration_pb2 as peer_configuration_pb2
+except ImportError:
+    FieldDescriptor = None
+
+# 64 位整数在 json 中输出为字符串
+INT64_TYPES = ("TYPE_INT64", "TYPE_UINT64", "TYPE_SINT64", "TYPE_FIXED64", "TYPE_SFIXED64")
+
+# ConfigGroup 子组的类型, "*" 匹配任意组名
+CONFIG_GROUPS = {
+    "Channel": {"Orderer": "Orderer", "Application": "Application", "Consortiums": "Consortiums"},
+    "Orderer": {"*": "OrdererOrg"},
+    "Application": {"*": "ApplicationOrg"},
+    "Consortiums": {"*": "Consortium"},
+    "Consortium": {"*": "ConsortiumOrg"},
+}
+
+# ConfigGroup 中 ConfigValue.value 的消息类型
+CONFIG_VALUES = {
+    "Channel": {
+        "HashingAlgorithm": "common.HashingAlgorithm",
+        "BlockDataHashingStructure": "common.BlockDataHashingStructure",
+        "OrdererAddresses": "common.OrdererAddresses",
+        "Consortium": "common.Consortium",
+        "Capabilities": "common.Capabilities",
+    },
+    "Orderer": {
+        "ConsensusType": "orderer.ConsensusType",
+        "BatchSize": "orderer.BatchSize",
+        "BatchTimeout": "orderer.BatchTimeout",
+        "KafkaBrokers": "orderer.KafkaBrokers",
+        "ChannelRestrictions": "orderer.ChannelRestrictions",
+        "Capabilities": "common.Capabilities",
+    },
+    "OrdererOrg": {
+        "MSP": "msp.MSPConfig",
+    },
+    "Application": {
+        "Capabilities": "common.Capabilities",
+        "ACLs": "protos.ACLs",
+    },
+    "ApplicationOrg": {
+        "MSP": "msp.MSPConfig",
+        "AnchorPeers": "protos.AnchorPeers",
+    },
+    "Consortiums": {},
+    "Consortium": {
+        "ChannelCreationPolicy": "common.Policy",
+    },
+    "ConsortiumOrg": {
+        "MSP": "msp.MSPConfig",
+    },
+}
+
+# bytes 字段中固定类型的消息 {(消息, 字段): 消息类型}
+STATIC_OPAQUE_FIELDS = {
+    ("common.Envelope", "payload"): "common.Payload",
+    ("common.Header", "channel_header"): "common.ChannelHeader",
+    ("common.Header", "signature_header"): "common.SignatureHeader",
+    ("common.SignatureHeader", "creator"): "msp.SerializedIdentity",
+    ("common.BlockData", "data"): "common.Envelope",
+    ("common.ConfigSignature", "signature_header"): "common.SignatureHeader",
+    ("common.ConfigUpdateEnvelope", "config_update"): "common.ConfigUpdate",
+}
+
+# 消息字段对应的 ConfigGroup 类型 {(消息, 字段): 组类型}
+GROUP_FIELDS = {
+    ("common.Config", "channel_group"): "Channel",
+    ("common.ConfigUpdate", "read_set"): "Channel",
+    ("common.ConfigUpdate", "write_set"): "Channel",
+}
+
+
+class ProtoCodec(object):
+    """
+    Fabric 配置相关消息与 configtxlator 格式 json(dict) 的相互转换
+        codec = ProtoCodec()
+        block = codec.decode(block_bytes, "common.Block")
+        config_pb = codec.encode(block["data"]["data"][0]["payload"]["data"]["config"], "common.Config")
+    """
+
+    def __init__(self):
+        if not ProtoCodec.available():
+            raise ImportError("in-process protobuf codec required, please run 'pip3 install fabric-sdk-py'")
+        self.types = {}
+        for module in (common_pb2, configtx_pb2, configuration_pb2, policies_pb2, identities_pb2,
+                       msp_config_pb2, msp_principal_pb2, orderer_configuration_pb2, peer_configuration_pb2):
+            package = module.DESCRIPTOR.package
+            for name in module.DESCRIPTOR.message_types_by_name:
+                self.types[f"{package}.{name}"] = getattr(module, name)
+
+    @staticmethod
+    def available():
+        return FieldDescriptor is not None
+
+    def message_type(self, name):
+        """
+        :param name: 消息类型, 如 common.Block、common.Config、common.ConfigUpdate、common.Envelope
+        :return: protobuf message class
+        """
+        if name not in self.types:
+            raise AttributeError(f"proto message type<{name}> could not been supported!")
+        return self.types[name]
+
+    def decode(self, data, decode_type="common.Block"):
+        """
+        protobuf bytes 转换为 dict, 同 configtxlator proto_decode
+        :param data: bytes
+        :param decode_type:
+        :return: dict
+        """
+        msg = self.message_type(decode_type)()
+        msg.ParseFromString(data)
+        return self.to_dict(msg)
+
+    def encode(self, obj, encode_type="common.Config"):
+        """
+        dict 转换为 protobuf bytes, 同 configtxlator proto_encode
+        :param obj: dict
+        :param encode_type:
+        :return: bytes
+        """
+        return self.from_dict(obj, encode_type).SerializeToString(deterministic=True)
+
+    def to_dict(self, msg, context=None):
+        """
+        protobuf message 转换为 dict
+        :param msg:
+        :param context: 消息为 ConfigGroup 时的组类型, 为 ConfigValue 时的 (组类型, 配置名)
+        :return: dict
+        """
+        result = {}
+        for field in msg.DESCRIPTOR.fields:
+            oneof = field.containing_oneof
+            if oneof is not None and msg.WhichOneof(oneof.name) != field.name:
+                continue
+            value = getattr(msg, field.name)
+            if self.__is_map(field):
+                value_field = field.message_type.fields_by_name["value"]
+                result[field.name] = {key: self.__value_to_json(msg, value_field, value[key], context, key, field)
+                                      for key in sorted(value)}
+            elif field.label == FieldDescriptor.LABEL_REPEATED:
+                result[field.name] = [self.__value_to_json(msg, field, v, context, repeated=True) for v in value]
+            elif field.type == FieldDescriptor.TYPE_MESSAGE and not msg.HasField(field.name):
+                result[field.name] = None
+            else:
+                result[field.name] = self.__value_to_json(msg, field, value, context)
+        return result
+
+    def from_dict(self, obj, message_type, context=None):
+        """
+        dict 转换为 protobuf message
+        :param obj: dict
+        :param message_type: 消息类型名 或 message class
+        :param context: 同 to_dict
+        :return: protobuf message
+        """
+        cls = self.message_type(message_type) if isinstance(message_type, str) else message_type
+        msg = cls()
+        self.__fill(msg, obj, context)
+        return msg
+
+    def __fill(self, msg, obj, context):
+        if not isinstance(obj, dict):
+            raise AttributeError(f"{msg.DESCRIPTOR.full_name} json must be an object, got: {obj!r}")
+        # 按字段定义顺序填充, 按上下文展开的 bytes 字段依赖的字段(如 type)已先填充
+        for field in msg.DESCRIPTOR.fields:
+            value = obj.get(field.name, None)
+            if value is None:
+                continue
+            if self.__is_map(field):
+                value_field = field.message_type.fields_by_name["value"]
+                target = getattr(msg, field.name)
+                for key, v in value.items():
+                    if value_field.type == FieldDescriptor.TYPE_MESSAGE:
+                        self.__fill(target[key], v, self.__child_context(msg, field, context, key))
+                    else:
+                        target[key] = self.__value_from_json(msg, value_field, v, context, key, field)
+            elif field.label == FieldDescriptor.LABEL_REPEATED:
+                target = getattr(msg, field.name)
+                for v in value:
+                    if field.type == FieldDescriptor.TYPE_MESSAGE:
+                        self.__fill(target.add(), v, None)
+                    else:
+                        target.append(self.__value_from_json(msg, field, v, context))
+            elif field.type == FieldDescriptor.TYPE_MESSAGE:
+                target = getattr(msg, field.name)
+                if field.message_type.full_name == "google.protobuf.Timestamp":
+                    target.FromJsonString(value)
+                else:
+                    target.SetInParent()
+                    self.__fill(target, value, self.__child_context(msg, field, context))
+            else:
+                setattr(msg, field.name, self.__value_from_json(msg, field, value, context))
+
+    def __value_to_json(self, msg, field, value, context, key=None, map_field=None, repeated=False):
+        if field.type == FieldDescriptor.TYPE_MESSAGE:
+            if field.message_type.full_name == "google.protobuf.Timestamp":
+                return value.ToJsonString()
+            return self.to_dict(value, self.__child_context(msg, map_field or field, context, key))
+        if field.type == FieldDescriptor.TYPE_BYTES:
+            opaque = self.__opaque(msg, map_field or field, context, key)
+            if opaque is not None:
+                if not value:
+                    return None
+                cls, child_context = opaque
+                nested = cls()
+                nested.ParseFromString(value)
+                return self.to_dict(nested, child_context)
+            if not value and not repeated and map_field is None:
+                return None
+            return base64.b64encode(value).decode("utf-8")
+        if field.type == FieldDescriptor.TYPE_ENUM:
+            enum_value = field.enum_type.values_by_number.get(value, None)
+            return enum_value.name if enum_value is not None else value
+        if self.__type_name(field) in INT64_TYPES:
+            return str(value)
+        return value
+
+    def __value_from_json(self, msg, field, value, context, key=None, map_field=None):
+        if field.type == FieldDescriptor.TYPE_BYTES:
+            opaque = self.__opaque(msg, map_field or field, context, key)
+            if opaque is not None and isinstance(value, dict):
+                cls, child_context = opaque
+                return self.from_dict(value, cls, child_context).SerializeToString(deterministic=True)
+            return base64.b64decode(value)
+        if field.type == FieldDescriptor.TYPE_ENUM:
+            if isinstance(value, str):
+                if value not in field.enum_type.values_by_name:
+                    raise AttributeError(f"{field.full_name} unknown enum value: {value}")
+                return field.enum_type.values_by_name[value].number
+            return value
+        if self.__type_name(field) in INT64_TYPES:
+            return int(value)
+        if field.type in (FieldDescriptor.TYPE_FLOAT, FieldDescriptor.TYPE_DOUBLE):
+            return float(value)
+        return value
+
+    def __child_context(self, msg, field, context, key=None):
+        """
+        嵌套消息的上下文: ConfigGroup 的组类型, ConfigValue 的 (组类型, 配置名)
+        """
+        name = msg.DESCRIPTOR.full_name
+        if (name, field.name) in GROUP_FIELDS:
+            return GROUP_FIELDS[(name, field.name)]
+        if name == "common.ConfigGroup" and context is not None:
+            if field.name == "groups":
+                groups = CONFIG_GROUPS.get(context, {})
+                return groups.get(key, groups.get("*", None))
+            if field.name == "values":
+                return context, key
+        return None
+
+    def __opaque(self, msg, field, context, key=None):
+        """
+        bytes 字段中嵌套的消息类型
+        :return: (message class, 上下文) 或 None 不展开
+        """
+        name = msg.DESCRIPTOR.full_name
+        if (name, field.name) in STATIC_OPAQUE_FIELDS:
+            return self.types[STATIC_OPAQUE_FIELDS[(name, field.name)]], None
+
+        type_name = None
+        if name == "common.Payload" and field.name == "data":
+            channel_header = common_pb2.ChannelHeader()
+            channel_header.ParseFromString(msg.header.channel_header)
+            type_name = {common_pb2.CONFIG: "common.ConfigEnvelope",
+                         common_pb2.CONFIG_UPDATE: "common.ConfigUpdateEnvelope"}.get(channel_header.type, None)
+        elif name == "common.ConfigValue" and field.name == "value" and context is not None:
+            group, value_key = context
+            type_name = CONFIG_VALUES.get(group, {}).get(value_key, None)
+        elif name == "common.Policy" and field.name == "value":
+            type_name = {policies_pb2.Policy.SIGNATURE: "common.SignaturePolicyEnvelope",
+                         policies_pb2.Policy.IMPLICIT_META: "common.ImplicitMetaPolicy"}.get(msg.type, None)
+        elif name == "msp.MSPConfig" and field.name == "config":
+            type_name = {0: "msp.FabricMSPConfig", 1: "msp.IdemixMSPConfig"}.get(msg.type, None)
+        elif name == "common.MSPPrincipal" and field.name == "principal":
+            principal = msp_principal_pb2.MSPPrincipal
+            type_name = {principal.ROLE: "common.MSPRole",
+                         principal.ORGANIZATION_UNIT: "common.OrganizationUnit",
+                         principal.IDENTITY: "msp.SerializedIdentity",
+                         principal.ANONYMITY: "common.MSPIdentityAnonymity",
+                         principal.COMBINED: "common.CombinedPrincipal"}.get(msg.principal_classification, None)
+        if type_name is None or type_name not in self.types:
+            return None
+        return self.types[type_name], None
+
+    @staticmethod
+    def __is_map(field):
+        return field.type == FieldDescriptor.TYPE_MESSAGE and field.message_type.GetOptions().map_entry
+
+    @staticmethod
+    def __type_name(field):
+        for name in INT64_TYPES:
+            if field.type == getattr(FieldDescriptor, name):
+                return name
+        return None
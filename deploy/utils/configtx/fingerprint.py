@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+    configtxgen 输入指纹, 输入未变化时复用已生成的 .block/.tx:
+        - 指纹: configtx.yaml 内容、profile 引用的组织 MSPDir 下所有文件、profile、channel id 及 configtxgen 参数
+        - 生成文件同目录下的 <output>.fingerprint 保存上次生成时的指纹
+"""
+import os
+import json
+import hashlib
+import logging
+
+from ruamel.yaml import YAML
+
+logger = logging.getLogger(__name__)
+
+SUFFIX = ".fingerprint"
+
+
+def referenced_msp_dirs(configtx_path, profile):
+    """
+    profile 引用的组织 MSPDir, 相对 configtx.yaml 所在目录;
+    profile 不存在时返回所有组织的 MSPDir, 交由 configtxgen 报错
+    :param configtx_path: configtx.yaml 路径
+    :param profile:
+    :return: 排序后的绝对路径列表
+    """
+    with open(configtx_path) as fp:
+        config = YAML(typ="safe").load(fp) or {}
+    node = (config.get("Profiles") or {}).get(profile) or config.get("Organizations")
+
+    msp_dirs = set()
+    stack = [node]
+    while stack:
+        item = stack.pop()
+        if isinstance(item, dict):
+            if isinstance(item.get("MSPDir"), str):
+                msp_dirs.add(os.path.join(os.path.dirname(os.path.abspath(configtx_path)), item["MSPDir"]))
+            stack.extend(item.values())
+        elif isinstance(item, list):
+            stack.extend(item)
+    return sorted(msp_dirs)
+
+
+def fingerprint(configtx_path, profile, channel_id, *args):
+    """
+    计算 configtxgen 输入指纹
+    :param configtx_path: configtx.yaml 路径
+    :param profile: -profile
+    :param channel_id: -channelID
+    :param args: 其他影响输出的参数, 如 configtxgen 版本、输出类型
+    :return: sha256 hex
+    """
+    sha = hashlib.sha256()
+    sha.update(json.dumps([profile, channel_id] + [str(a) for a in args]).encode("utf-8"))
+    with open(configtx_path, "rb") as fp:
+        sha.update(fp.read())
+    for msp_dir in referenced_msp_dirs(configtx_path, profile):
+        sha.update(msp_dir.encode("utf-8"))
+        for root, dirs, files in os.walk(msp_dir):
+            dirs.sort()
+            for filename in sorted(files):
+                path = os.path.join(root, filename)
+                sha.update(os.path.relpath(path, msp_dir).encode("utf-8"))
+                with open(path, "rb") as fp:
+                    sha.update(hashlib.sha256(fp.read()).digest())
+    return sha.hexdigest()
+
+
+def is_fresh(output, digest):
+    """
+    生成文件存在且指纹一致
+    :param output: .block/.tx 路径
+    :param digest:
+    :return:
+    """
+    if not os.path.exists(output) or not os.path.exists(output + SUFFIX):
+        return False
+    with open(output + SUFFIX) as fp:
+        return fp.read().strip() == digest
+
+
+def save(output, digest):
+    with open(output + SUFFIX, "w") as fp:
+        fp.write(digest)
+
+
+def invalidate(output):
+    if os.path.exists(output + SUFFIX):
+        os.remove(output + SUFFIX)
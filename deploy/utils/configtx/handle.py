@@ -6,12 +6,23 @@
 @Email:  quanbin@parcelx.io
 """
 import os
+import re
+import json
 import uuid
+import logging
+import tempfile
 import subprocess
-from utils import format_org_msp_id
+from contextlib import contextmanager
+from utils import format_org_msp_id, format_org_domain
 from utils.tool import FabricRelease
+from . import sign, fingerprint
+from .cache import ConfigBlockCache
+from .codec import ProtoCodec
+from .update import compute_update
 from .config import CustomChannel, ConfigTxConfigure
 
+logger = logging.getLogger(__name__)
+
 
 class ConfigTxHandler(object):
     """
@@ -34,6 +45,17 @@ class ConfigTxHandler(object):
         else:
             raise AttributeError("configure type must be <utils.configtxgen.ConfigTxConfigure>")
 
+        # 进程内 protobuf 编解码, 未安装 hfc 时使用 configtxlator
+        self.codec = ProtoCodec() if ProtoCodec.available() else None
+        # 配置更新各步骤的中间文件只在调试时保存
+        self.debug_artifacts = False
+        # 忽略 configtxgen 输入指纹, 强制重新生成创世块/channel 交易
+        self.force = False
+        # 进程内计算配置增量时同时运行 configtxlator compute_update 对比结果
+        self.cross_check = False
+        # 本地 channel 配置区块缓存 configtx/channels/<channel_name>
+        self.config_cache = ConfigBlockCache(self.configure.configtx_channels, self.codec)
+
     def gen_orderer_genesis(self, channel=None):
         """
         生成 fabric 网络 排序节点的创世块
@@ -44,20 +66,7 @@ class ConfigTxHandler(object):
         if not isinstance(channel, CustomChannel):
             raise AttributeError(f"channel type must be <utils.configtxgen.config,CustomChannel>")
 
-        ret = subprocess.run([
-            self.release.configtxgen,
-            "-outputBlock",
-            self.configure.relative_path(channel.filepath),
-            "-profile",
-            channel.genesis_profile,
-            "-channelID",
-            channel.genesis_channel_id,
-            # f"--config={self.configure.filepath}"
-        ],
-            stdout=subprocess.PIPE,
-            cwd=self.configure.output)
-        ret.check_returncode()
-        return ret
+        return self.__configtxgen("-outputBlock", channel)
 
     def gen_channel_genesis(self, channel=None):
         """
@@ -68,20 +77,36 @@ class ConfigTxHandler(object):
         if not channel and not isinstance(channel, CustomChannel):
             raise AttributeError(f"channel type must be <utils.configtxgen.config,CustomChannel>")
 
-        ret = subprocess.run([
+        return self.__configtxgen("-outputCreateChannelTx", channel)
+
+    def __configtxgen(self, output_flag, channel):
+        """
+        运行 configtxgen 生成创世块/channel 交易, 输入指纹未变化且输出文件存在时直接复用, --force 时强制重新生成
+        :param output_flag: -outputBlock / -outputCreateChannelTx
+        :param channel: <utils.configtx.config.CustomChannel>
+        :return: subprocess.CompletedProcess
+        """
+        args = [
             self.release.configtxgen,
-            "-outputCreateChannelTx",
+            output_flag,
             self.configure.relative_path(channel.filepath),
             "-profile",
             channel.genesis_profile,
             "-channelID",
             channel.genesis_channel_id,
-            # "--configPath",
-            # "./"  # self.configure.output
-        ],
-            stdout=subprocess.PIPE,
-            cwd=self.configure.output)
+        ]
+        digest = fingerprint.fingerprint(self.configure.filepath, channel.genesis_profile,
+                                         channel.genesis_channel_id, self.release.release, output_flag) \
+            if os.path.exists(self.configure.filepath) else None
+        if digest and not self.force and fingerprint.is_fresh(channel.filepath, digest):
+            logger.info(f"configtxgen inputs of <{channel.filepath}> unchanged, skip generating")
+            return subprocess.CompletedProcess(args, 0, b"", b"")
+
+        fingerprint.invalidate(channel.filepath)
+        ret = subprocess.run(args, stdout=subprocess.PIPE, cwd=self.configure.output)
         ret.check_returncode()
+        if digest:
+            fingerprint.save(channel.filepath, digest)
         return ret
 
     def print_org(self, org):
@@ -141,6 +166,21 @@ class ConfigTxHandler(object):
         ret.check_returncode()
         return ret
 
+    def org_admin_signer(self, org):
+        """
+        本地 crypto-config 中组织 Admin 的签名身份
+        :param org: 组织名
+        :return: <utils.configtx.sign.MspSigner>, 本地没有 Admin 证书私钥时返回 None
+        """
+        if not sign.available():
+            return None
+        org_domain = f"{format_org_domain(org)}.{self.configure.domain}"
+        msp_dir = os.path.join(self.configure.output, "crypto-config", "peerOrganizations",
+                               org_domain, "users", f"Admin@{org_domain}", "msp")
+        if not os.path.isdir(os.path.join(msp_dir, "keystore")):
+            return None
+        return sign.MspSigner.from_msp_dir(format_org_msp_id(org), msp_dir)
+
     def remote_fetch_config_pb_cmd(self, domain, channel_name, orderer=None, capath=None):
         """
         远程执行命令， 获取相应channel的配置文件 .pb
@@ -163,6 +203,30 @@ class ConfigTxHandler(object):
             f'{fetch}"'
         return remote_fetch_cmd, f"/data/fabric/{domain.replace('-cli', '')}/cli-data/{remote_pb}"
 
+    def remote_channel_info_cmd(self, domain, channel_name):
+        """
+        远程执行命令， 获取 channel 当前区块高度
+        Example Command:
+            peer channel getinfo -c $CHANNEL_NAME
+        :param domain: 主机域名
+        :param channel_name:
+        :return: cmd
+        """
+        return f'docker exec {domain} bash -c "peer channel getinfo -c {channel_name}"'
+
+    @staticmethod
+    def parse_channel_height(stdout):
+        """
+        解析 peer channel getinfo 输出:
+            Blockchain info: {"height":7,"currentBlockHash":"...","previousBlockHash":"..."}
+        :param stdout:
+        :return: 区块高度 或 None
+        """
+        match = re.search(r"Blockchain info: (\{.*\})", stdout or "")
+        if not match:
+            return None
+        return json.loads(match.group(1)).get("height", None)
+
     def remote_sign_channel_pb_cmd(self, envelope_file, domain):
         """
         远程执行命令， 签名相应的配置.pb
@@ -200,15 +264,66 @@ class ConfigTxHandler(object):
             f'"'
         return remote_sign_and_update, f"/data/fabric/{domain.replace('-cli', '')}/cli-data/"
 
+    @contextmanager
+    def __tmpdir(self):
+        """
+        ConfigTxConfigure.output 下的临时目录, 返回绝对路径
+        configtxlator 以 ConfigTxConfigure.output 为工作目录运行, 相对路径会被重复拼接
+        :return: 临时目录绝对路径
+        """
+        with tempfile.TemporaryDirectory(dir=self.configure.output) as tmp:
+            yield os.path.abspath(tmp)
+
+    def encode(self, obj, encode_type="common.Config"):
+        """
+        dict 转换为 protobuf bytes, 同 configtxlator proto_encode
+        未安装 hfc 时经临时文件调用 configtxlator
+        :param obj: dict
+        :param encode_type:
+        :return: bytes
+        """
+        if self.codec is not None:
+            return self.codec.encode(obj, encode_type)
+        with self.__tmpdir() as tmp:
+            with open(os.path.join(tmp, "input.json"), "w") as fp:
+                json.dump(obj, fp)
+            self.proto_encode(os.path.join(tmp, "input.json"), os.path.join(tmp, "output.pb"), encode_type)
+            with open(os.path.join(tmp, "output.pb"), "rb") as fp:
+                return fp.read()
+
+    def decode(self, data, decode_type="common.Block"):
+        """
+        protobuf bytes 转换为 dict, 同 configtxlator proto_decode
+        未安装 hfc 时经临时文件调用 configtxlator
+        :param data: bytes
+        :param decode_type:
+        :return: dict
+        """
+        if self.codec is not None:
+            return self.codec.decode(data, decode_type)
+        with self.__tmpdir() as tmp:
+            with open(os.path.join(tmp, "input.pb"), "wb") as fp:
+                fp.write(data)
+            self.proto_decode(os.path.join(tmp, "input.pb"), os.path.join(tmp, "output.json"), decode_type)
+            with open(os.path.join(tmp, "output.json"), "r") as fp:
+                return json.load(fp)
+
     def proto_encode(self, input_json, output_pb, encode_type="common.Config"):
         """
-        转换 .json 到 .pb 文件
+        转换 .json 到 .pb 文件, 已安装 hfc 时在进程内编码
         Example Command:
             configtxlator proto_encode --input config.json --type common.Config --output config.pb
         :param input_json: json file path
         :param encode_type:
         :return: pb file path
         """
+        if self.codec is not None:
+            with open(os.path.join(self.configure.output, input_json)) as fp:
+                data = self.codec.encode(json.load(fp), encode_type)
+            with open(os.path.join(self.configure.output, output_pb), "wb") as fp:
+                fp.write(data)
+            return subprocess.CompletedProcess(["proto_encode", input_json, output_pb, encode_type], 0, b"", b"")
+
         # output_pb = f'{os.path.basename(input_json).split(".")[0]}.pb'
         ret = subprocess.run([
             self.release.configtxlator,
@@ -227,7 +342,7 @@ class ConfigTxHandler(object):
 
     def proto_decode(self, input_pb, output_json, decode_type="common.Block"):
         """
-        转换 .pb 文件到json文件
+        转换 .pb 文件到json文件, 已安装 hfc 时在进程内解码
         Example Command:
             configtxlator proto_decode --input config_block.pb --type common.Block | jq .data.data[0].payload.data.config > config.json
         :param input_pb:
@@ -235,6 +350,13 @@ class ConfigTxHandler(object):
         :param decode_type:
         :return:
         """
+        if self.codec is not None:
+            with open(os.path.join(self.configure.output, input_pb), "rb") as fp:
+                obj = self.codec.decode(fp.read(), decode_type)
+            with open(os.path.join(self.configure.output, output_json), "w") as fp:
+                json.dump(obj, fp, indent=2)
+            return subprocess.CompletedProcess(["proto_decode", input_pb, output_json, decode_type], 0, b"", b"")
+
         # output_file = f'{os.path.basename(input_pb).split(".")[0]}.json'
         ret = subprocess.run([
             self.release.configtxlator,
@@ -251,17 +373,34 @@ class ConfigTxHandler(object):
         ret.check_returncode()
         return ret
 
-    def compute_update(self, channel_name, original_pb, updated_pb, output_pb):
+    def compute_update(self, channel_name, original_pb, updated_pb, output_pb, cross_check=None):
         """
-        计算配置文件增量
+        计算配置文件增量, 已安装 hfc 时在进程内计算
         Example Command:
             configtxlator compute_update --channel_id $CHANNEL_NAME --original config.pb --updated modified_config.pb --output org3_update.pb
         :param channel_name:
         :param original_pb:
         :param updated_pb:
         :param output_pb:
+        :param cross_check: 同时运行 configtxlator compute_update, 结果不一致时抛出异常, 默认使用 self.cross_check
         :return:
         """
+        cross_check = self.cross_check if cross_check is None else cross_check
+        if self.codec is not None:
+            config_type = self.codec.message_type("common.Config")
+            original, updated = config_type(), config_type()
+            with open(os.path.join(self.configure.output, original_pb), "rb") as fp:
+                original.ParseFromString(fp.read())
+            with open(os.path.join(self.configure.output, updated_pb), "rb") as fp:
+                updated.ParseFromString(fp.read())
+            config_update = compute_update(original, updated, channel_name)
+            if cross_check:
+                self.__cross_check_update(config_update, channel_name, original_pb, updated_pb)
+            with open(os.path.join(self.configure.output, output_pb), "wb") as fp:
+                fp.write(config_update.SerializeToString(deterministic=True))
+            return subprocess.CompletedProcess(["compute_update", channel_name, original_pb, updated_pb, output_pb],
+                                               0, b"", b"")
+
         ret = subprocess.run([
             self.release.configtxlator,
             "compute_update",
@@ -279,6 +418,95 @@ class ConfigTxHandler(object):
         ret.check_returncode()
         return ret
 
+    def config_update(self, channel_name, original, updated):
+        """
+        计算配置增量, 不读写文件; 未安装 hfc 时经临时文件调用 configtxlator
+        :param channel_name:
+        :param original: dict, common.Config
+        :param updated: dict, common.Config
+        :return: dict, common.ConfigUpdate
+        """
+        if self.codec is None:
+            with self.__tmpdir() as tmp:
+                for name, config in (("original.pb", original), ("updated.pb", updated)):
+                    with open(os.path.join(tmp, name), "wb") as fp:
+                        fp.write(self.encode(config, "common.Config"))
+                self.compute_update(channel_name, os.path.join(tmp, "original.pb"), os.path.join(tmp, "updated.pb"),
+                                    os.path.join(tmp, "update.pb"))
+                with open(os.path.join(tmp, "update.pb"), "rb") as fp:
+                    return self.decode(fp.read(), "common.ConfigUpdate")
+        original_config = self.codec.from_dict(original, "common.Config")
+        updated_config = self.codec.from_dict(updated, "common.Config")
+        config_update = compute_update(original_config, updated_config, channel_name)
+        if self.cross_check:
+            with self.__tmpdir() as tmp:
+                for name, config in (("original.pb", original_config), ("updated.pb", updated_config)):
+                    with open(os.path.join(tmp, name), "wb") as fp:
+                        fp.write(config.SerializeToString(deterministic=True))
+                self.__cross_check_update(config_update, channel_name, os.path.join(tmp, "original.pb"),
+                                          os.path.join(tmp, "updated.pb"))
+        return self.codec.to_dict(config_update)
+
+    @staticmethod
+    def update_envelope(channel_name, config_update):
+        """
+        ConfigUpdate 添加头信息包装为 Envelope
+        :param channel_name:
+        :param config_update: dict, common.ConfigUpdate
+        :return: dict, common.Envelope
+        """
+        return {
+            "payload": {
+                "header": {
+                    # https://github.com/hyperledger/fabric/blob/eca1b14b7e3453a5d32296af79cc7bad10c7673b/protos/common/common.proto#L47
+                    # CONFIG_UPDATE = 2;             // Used for transactions which update the channel config
+                    "channel_header": {"channel_id": channel_name, "type": 2}
+                },
+                "data": {"config_update": config_update}}
+        }
+
+    def config_update_envelope(self, channel_name, original, updated):
+        """
+        计算配置增量并包装为 Envelope, 不读写文件
+        :param channel_name:
+        :param original: dict, common.Config
+        :param updated: dict, common.Config
+        :return: bytes, common.Envelope
+        """
+        config_update = self.config_update(channel_name, original, updated)
+        return self.encode(self.update_envelope(channel_name, config_update), "common.Envelope")
+
+    def __cross_check_update(self, config_update, channel_name, original_pb, updated_pb):
+        """
+        对比 configtxlator compute_update 的结果
+        """
+        check_pb = f"{os.path.splitext(original_pb)[0]}-{str(uuid.uuid4())[-12:]}.pb"
+        check_path = os.path.join(self.configure.output, check_pb)
+        try:
+            subprocess.run([
+                self.release.configtxlator,
+                "compute_update",
+                "--channel_id",
+                channel_name,
+                "--original",
+                original_pb,
+                "--updated",
+                updated_pb,
+                "--output",
+                check_pb
+            ],
+                stdout=subprocess.PIPE,
+                cwd=self.configure.output).check_returncode()
+            expected = self.codec.message_type("common.ConfigUpdate")()
+            with open(check_path, "rb") as fp:
+                expected.ParseFromString(fp.read())
+        finally:
+            if os.path.exists(check_path):
+                os.remove(check_path)
+        if expected != config_update:
+            raise RuntimeError(f"compute_update of channel<{channel_name}> differs from configtxlator: "
+                               f"{self.codec.to_dict(config_update)} != {self.codec.to_dict(expected)}")
+
     def channel_sign(self, org_update_in_envelope_pb, env=None):
         """
         channel 签名
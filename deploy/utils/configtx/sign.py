@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+    进程内 config update 签名, 同 peer channel signconfigtx:
+        - 使用本地 crypto-config 中组织 Admin 的证书与私钥生成 ConfigSignature
+        - 合并远程签名过的 envelope 中的 ConfigSignature, 同一身份只保留一个签名
+        - 合并后的 envelope 不包含外层签名, 由 peer channel update 提交时签名
+"""
+import os
+
+try:
+    from cryptography.hazmat.backends import default_backend
+    from cryptography.hazmat.primitives import hashes, serialization
+    from cryptography.hazmat.primitives.asymmetric import ec
+    from cryptography.hazmat.primitives.asymmetric.utils import decode_dss_signature, encode_dss_signature
+except ImportError:
+    ec = None
+
+try:
+    from hfc.protos.common import common_pb2, configtx_pb2
+    from hfc.protos.msp import identities_pb2
+except ImportError:
+    common_pb2 = None
+
+# ecdsa 签名需为 low-S 格式
+CURVE_ORDERS = {
+    "secp256r1": 0xFFFFFFFF00000000FFFFFFFFFFFFFFFFBCE6FAADA7179E84F3B9CAC2FC632551,
+    "secp384r1": 0xFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFC7634D81F4372DDF581A0DB248B0A77AECEC196ACCC52973,
+}
+
+
+def available():
+    return ec is not None and common_pb2 is not None
+
+
+def _check_available():
+    if ec is None:
+        raise ImportError("local config update signing required, please run 'pip3 install cryptography'")
+    if common_pb2 is None:
+        raise ImportError("local config update signing required, please run 'pip3 install fabric-sdk-py'")
+
+
+class MspSigner(object):
+    """
+    组织 Admin 身份签名
+        signer = MspSigner.from_msp_dir("OrgEastMSP", ".../users/Admin@orgEast.parcelx.io/msp")
+        envelope_pb = sign_envelope(envelope_pb, [signer])
+    """
+
+    def __init__(self, msp_id, cert, key):
+        """
+        :param msp_id: 组织 MSP ID
+        :param cert: PEM 证书 bytes
+        :param key: PEM 私钥 bytes
+        """
+        _check_available()
+        self.msp_id = msp_id
+        self.cert = cert
+        self.key = serialization.load_pem_private_key(key, password=None, backend=default_backend())
+        if not isinstance(self.key, ec.EllipticCurvePrivateKey) or self.key.curve.name not in CURVE_ORDERS:
+            raise AttributeError(f"msp<{msp_id}> private key must be an ecdsa P-256/P-384 key")
+
+    @classmethod
+    def from_msp_dir(cls, msp_id, msp_dir):
+        """
+        :param msp_id:
+        :param msp_dir: 包含 signcerts/ 与 keystore/ 的 msp 目录
+        :return: MspSigner
+        """
+        with open(cls.__first_file(os.path.join(msp_dir, "signcerts")), "rb") as fp:
+            cert = fp.read()
+        with open(cls.__first_file(os.path.join(msp_dir, "keystore")), "rb") as fp:
+            key = fp.read()
+        return cls(msp_id, cert, key)
+
+    @staticmethod
+    def __first_file(path):
+        files = sorted(f for f in os.listdir(path) if os.path.isfile(os.path.join(path, f)))
+        if not files:
+            raise AttributeError(f"no file found in msp directory <{path}>")
+        return os.path.join(path, files[0])
+
+    @property
+    def creator(self):
+        return identities_pb2.SerializedIdentity(mspid=self.msp_id, id_bytes=self.cert).SerializeToString()
+
+    def sign(self, data):
+        """
+        ecdsa sha256 签名, 返回 low-S DER 编码
+        :param data: bytes
+        :return: bytes
+        """
+        r, s = decode_dss_signature(self.key.sign(data, ec.ECDSA(hashes.SHA256())))
+        order = CURVE_ORDERS[self.key.curve.name]
+        if s > order // 2:
+            s = order - s
+        return encode_dss_signature(r, s)
+
+    def config_signature(self, config_update):
+        """
+        :param config_update: ConfigUpdate bytes
+        :return: common.ConfigSignature
+        """
+        header = common_pb2.SignatureHeader(creator=self.creator, nonce=os.urandom(24)).SerializeToString()
+        return configtx_pb2.ConfigSignature(signature_header=header, signature=self.sign(header + config_update))
+
+
+def parse_config_update_envelope(envelope):
+    """
+    :param envelope: common.Envelope bytes
+    :return: (common.Payload, common.ConfigUpdateEnvelope)
+    """
+    _check_available()
+    env = common_pb2.Envelope()
+    env.ParseFromString(envelope)
+    payload = common_pb2.Payload()
+    payload.ParseFromString(env.payload)
+    channel_header = common_pb2.ChannelHeader()
+    channel_header.ParseFromString(payload.header.channel_header)
+    if channel_header.type != common_pb2.CONFIG_UPDATE:
+        raise AttributeError(f"envelope type must be CONFIG_UPDATE, got: {channel_header.type}")
+    config_update_envelope = configtx_pb2.ConfigUpdateEnvelope()
+    config_update_envelope.ParseFromString(payload.data)
+    return payload, config_update_envelope
+
+
+def signature_creator(signature):
+    header = common_pb2.SignatureHeader()
+    header.ParseFromString(signature.signature_header)
+    return header.creator
+
+
+def add_config_signatures(envelope, signatures):
+    """
+    向 envelope 中添加签名, 已签名的身份跳过
+    :param envelope: common.Envelope bytes
+    :param signatures: common.ConfigSignature 列表
+    :return: common.Envelope bytes
+    """
+    payload, config_update_envelope = parse_config_update_envelope(envelope)
+    creators = {signature_creator(s) for s in config_update_envelope.signatures}
+    for signature in signatures:
+        creator = signature_creator(signature)
+        if creator in creators:
+            continue
+        creators.add(creator)
+        config_update_envelope.signatures.add().CopyFrom(signature)
+    payload.data = config_update_envelope.SerializeToString()
+    return common_pb2.Envelope(payload=payload.SerializeToString()).SerializeToString()
+
+
+def sign_envelope(envelope, signers):
+    """
+    使用本地身份对 envelope 中的 ConfigUpdate 签名
+    :param envelope: common.Envelope bytes
+    :param signers: MspSigner 列表
+    :return: common.Envelope bytes
+    """
+    _, config_update_envelope = parse_config_update_envelope(envelope)
+    return add_config_signatures(envelope, [s.config_signature(config_update_envelope.config_update) for s in signers])
+
+
+def merge_signed_envelopes(envelope, signed_envelopes):
+    """
+    合并远程签名过的 envelope 中的签名, 签名的 ConfigUpdate 必须一致
+    :param envelope: common.Envelope bytes
+    :param signed_envelopes: common.Envelope bytes 列表
+    :return: common.Envelope bytes
+    """
+    _, config_update_envelope = parse_config_update_envelope(envelope)
+    signatures = []
+    for signed in signed_envelopes:
+        _, signed_update_envelope = parse_config_update_envelope(signed)
+        if signed_update_envelope.config_update != config_update_envelope.config_update:
+            raise AttributeError("signed envelope contains a different config update")
+        signatures.extend(signed_update_envelope.signatures)
+    return add_config_signatures(envelope, signatures)
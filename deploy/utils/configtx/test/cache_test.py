@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+    channel 配置区块缓存测试:
+        cd deploy && python -m unittest utils/configtx/test/cache_test.py
+"""
+import os
+import json
+import shutil
+import tempfile
+import unittest
+
+from utils.configtx.cache import ConfigBlockCache
+from utils.configtx.codec import ProtoCodec
+from utils.configtx.handle import ConfigTxHandler
+
+FIXTURES = os.path.dirname(os.path.abspath(__file__))
+CHANNEL = "parcelxdevchannel"
+
+
+def fixture(name):
+    with open(os.path.join(FIXTURES, name), "rb") as fp:
+        return fp.read()
+
+
+@unittest.skipUnless(ProtoCodec.available(), "hfc protos required")
+class ConfigBlockCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp(prefix="config-cache-")
+        self.codec = ProtoCodec()
+        self.cache = ConfigBlockCache(self.root, self.codec)
+        self.block = fixture("config_block.pb")
+        self.sequence = self.codec.decode(self.block)["data"]["data"][0]["payload"]["data"]["config"]["sequence"]
+
+    def tearDown(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def config(self, path):
+        with open(path, "rb") as fp:
+            return self.codec.decode(fp.read())["data"]["data"][0]["payload"]["data"]["config"]
+
+    def test_height_validation(self):
+        self.assertIsNone(self.cache.get(CHANNEL, 5))
+        self.assertIsNone(self.cache.put(CHANNEL, self.block, None))
+        path = self.cache.put(CHANNEL, self.block, 5)
+        self.assertTrue(path.endswith(f"config_block.{self.sequence}.pb"))
+
+        self.assertEqual(path, self.cache.get(CHANNEL, 5))
+        self.assertIsNone(self.cache.get(CHANNEL, 6))
+        self.assertIsNone(self.cache.get(CHANNEL))
+
+    def test_update_in_place(self):
+        self.cache.put(CHANNEL, self.block, 5)
+        path = self.cache.update(CHANNEL, fixture("orgwest_update.pb"))
+
+        # 区块尚未提交, peer 高度未增长时不使用
+        self.assertIsNone(self.cache.get(CHANNEL, 5))
+        self.assertEqual(path, self.cache.get(CHANNEL, 6))
+        self.assertEqual(path, self.cache.get(CHANNEL, 6))
+        self.assertEqual([os.path.basename(path), ConfigBlockCache.INDEX], sorted(os.listdir(os.path.dirname(path))))
+        config = self.config(path)
+        expected = json.loads(fixture("modified_config.json"))
+        self.assertEqual(str(int(self.sequence) + 1), config["sequence"])
+        application, expected_application = (config["channel_group"]["groups"]["Application"],
+                                             expected["channel_group"]["groups"]["Application"])
+        self.assertEqual(expected_application["groups"], application["groups"])
+        self.assertEqual(str(int(expected_application["version"]) + 1), application["version"])
+
+    def test_update_unverified(self):
+        self.cache.put(CHANNEL, self.block, 5)
+        self.cache.update(CHANNEL, fixture("orgwest_update.pb"))
+        # 上一次生成的区块未确认时不再叠加增量
+        self.assertIsNone(self.cache.update(CHANNEL, fixture("orgwest_update.pb")))
+        self.assertIsNone(self.cache.get(CHANNEL, 6))
+
+    def test_update_mismatch(self):
+        self.cache.put(CHANNEL, self.block, 5)
+        self.cache.update(CHANNEL, fixture("orgwest_update.pb"))
+        self.assertIsNotNone(self.cache.get(CHANNEL, 6))
+        # 同一增量的读集版本已过期
+        self.assertIsNone(self.cache.update(CHANNEL, fixture("orgwest_update.pb")))
+        self.assertIsNone(self.cache.get(CHANNEL, 7))
+
+    def test_parse_channel_height(self):
+        stdout = 'Blockchain info: {"height":7,"currentBlockHash":"YQ==","previousBlockHash":"Yg=="}\n'
+        self.assertEqual(7, ConfigTxHandler.parse_channel_height(stdout))
+        self.assertIsNone(ConfigTxHandler.parse_channel_height("Error: channel not found"))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+    进程内 protobuf 编解码测试, 对比 configtxlator 生成的 .pb/.json (见 README.md):
+        cd deploy && python -m unittest utils/configtx/test/codec_test.py
+"""
+import os
+import json
+import unittest
+
+from utils.configtx.codec import ProtoCodec
+
+FIXTURES = os.path.dirname(os.path.abspath(__file__))
+
+
+def fixture(name, mode="r"):
+    with open(os.path.join(FIXTURES, name), mode) as fp:
+        return json.load(fp) if mode == "r" else fp.read()
+
+
+@unittest.skipUnless(ProtoCodec.available(), "hfc protos required")
+class ProtoCodecTest(unittest.TestCase):
+
+    def setUp(self):
+        self.codec = ProtoCodec()
+
+    def assertEncoded(self, name, encode_type):
+        cls = self.codec.message_type(encode_type)
+        encoded, expected = cls(), cls()
+        encoded.ParseFromString(self.codec.encode(fixture(f"{name}.json"), encode_type))
+        expected.ParseFromString(fixture(f"{name}.pb", "rb"))
+        self.assertEqual(expected, encoded)
+
+    def test_decode_block(self):
+        block = self.codec.decode(fixture("config_block.pb", "rb"), "common.Block")
+        self.assertEqual(fixture("config_block.json"), block)
+
+    def test_decode_config_update(self):
+        update = self.codec.decode(fixture("orgwest_update.pb", "rb"), "common.ConfigUpdate")
+        self.assertEqual(fixture("orgwest_update.json"), update)
+
+    def test_encode_config(self):
+        self.assertEncoded("config", "common.Config")
+        self.assertEncoded("modified_config", "common.Config")
+
+    def test_encode_envelope(self):
+        self.assertEncoded("orgwest_update", "common.ConfigUpdate")
+        self.assertEncoded("orgwest_update_in_envelope", "common.Envelope")
+
+    def test_unknown_type(self):
+        with self.assertRaises(AttributeError):
+            self.codec.decode(b"", "common.Unknown")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+    configtxgen 输入指纹测试:
+        cd deploy && python -m unittest utils/configtx/test/fingerprint_test.py
+"""
+import os
+import shutil
+import tempfile
+import unittest
+
+from utils.configtx import fingerprint
+
+FIXTURES = os.path.dirname(os.path.abspath(__file__))
+PROFILES = """
+Profiles:
+    OrgWestChannel:
+        Consortium: SampleConsortium
+        Application:
+            Organizations:
+                - *OrgWest
+"""
+
+
+class FingerprintTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp(prefix="configtxgen-fingerprint-")
+        shutil.copytree(os.path.join(FIXTURES, "crypto-config"), os.path.join(self.root, "crypto-config"))
+        self.configtx = os.path.join(self.root, "configtx.yaml")
+        with open(os.path.join(FIXTURES, "configtx.yaml")) as src, open(self.configtx, "w") as dst:
+            dst.write(src.read() + PROFILES)
+        self.msp_dir = os.path.join(self.root, "crypto-config", "peerOrganizations", "orgWest.parcelx.io", "msp")
+
+    def tearDown(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def digest(self, profile="OrgWestChannel", channel_id="orgwestchannel"):
+        return fingerprint.fingerprint(self.configtx, profile, channel_id, "1.4.0", "-outputCreateChannelTx")
+
+    def test_referenced_msp_dirs(self):
+        self.assertEqual([self.msp_dir], fingerprint.referenced_msp_dirs(self.configtx, "OrgWestChannel"))
+
+    def test_inputs_changed(self):
+        digest = self.digest()
+        self.assertEqual(digest, self.digest())
+        self.assertNotEqual(digest, self.digest(channel_id="otherchannel"))
+
+        with open(os.path.join(self.msp_dir, "admincerts", "new-admin.pem"), "w") as fp:
+            fp.write("certificate")
+        self.assertNotEqual(digest, self.digest())
+
+    def test_output_fresh(self):
+        output = os.path.join(self.root, "orgwestchannel.tx")
+        digest = self.digest()
+        fingerprint.save(output, digest)
+        # 生成文件不存在
+        self.assertFalse(fingerprint.is_fresh(output, digest))
+
+        with open(output, "wb") as fp:
+            fp.write(b"tx")
+        self.assertTrue(fingerprint.is_fresh(output, digest))
+        self.assertFalse(fingerprint.is_fresh(output, self.digest(channel_id="otherchannel")))
+
+        fingerprint.invalidate(output)
+        self.assertFalse(fingerprint.is_fresh(output, digest))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+    进程内 config update 签名测试, 使用 crypto-config 中 OrgWest Admin 证书私钥:
+        cd deploy && python -m unittest utils/configtx/test/sign_test.py
+"""
+import os
+import unittest
+
+from utils.configtx import sign
+from utils.configtx.sign import MspSigner, sign_envelope, merge_signed_envelopes, parse_config_update_envelope
+
+FIXTURES = os.path.dirname(os.path.abspath(__file__))
+ADMIN_MSP = os.path.join(FIXTURES, "crypto-config", "peerOrganizations", "orgWest.parcelx.io",
+                         "users", "Admin@orgWest.parcelx.io", "msp")
+
+
+@unittest.skipUnless(sign.available(), "cryptography and hfc protos required")
+class SignTest(unittest.TestCase):
+
+    def setUp(self):
+        with open(os.path.join(FIXTURES, "orgwest_update_in_envelope.pb"), "rb") as fp:
+            self.envelope = fp.read()
+        self.signer = MspSigner.from_msp_dir("OrgWestMSP", ADMIN_MSP)
+
+    def test_sign_envelope(self):
+        _, config_update_envelope = parse_config_update_envelope(sign_envelope(self.envelope, [self.signer]))
+        self.assertEqual(1, len(config_update_envelope.signatures))
+        signature = config_update_envelope.signatures[0]
+
+        self.assertEqual(self.signer.creator, sign.signature_creator(signature))
+        public_key = self.signer.key.public_key()
+        public_key.verify(signature.signature, signature.signature_header + config_update_envelope.config_update,
+                          sign.ec.ECDSA(sign.hashes.SHA256()))
+        _, s = sign.decode_dss_signature(signature.signature)
+        self.assertLessEqual(s, sign.CURVE_ORDERS["secp256r1"] // 2)
+
+    def test_merge_signed_envelopes(self):
+        other = MspSigner(self.signer.msp_id.replace("West", "South"), self.signer.cert, self.__new_key())
+        signed = [sign_envelope(self.envelope, [self.signer]), sign_envelope(self.envelope, [other])]
+        merged = merge_signed_envelopes(sign_envelope(self.envelope, [self.signer]), signed)
+
+        # 同一身份只保留一个签名
+        _, config_update_envelope = parse_config_update_envelope(merged)
+        self.assertEqual([self.signer.creator, other.creator],
+                         [sign.signature_creator(s) for s in config_update_envelope.signatures])
+
+    def test_merge_different_update(self):
+        payload, config_update_envelope = parse_config_update_envelope(self.envelope)
+        config_update_envelope.config_update += b"\x00"
+        payload.data = config_update_envelope.SerializeToString()
+        changed = sign.common_pb2.Envelope(payload=payload.SerializeToString()).SerializeToString()
+        with self.assertRaises(AttributeError):
+            merge_signed_envelopes(self.envelope, [sign_envelope(changed, [self.signer])])
+
+    @staticmethod
+    def __new_key():
+        key = sign.ec.generate_private_key(sign.ec.SECP256R1(), sign.default_backend())
+        return key.private_bytes(sign.serialization.Encoding.PEM, sign.serialization.PrivateFormat.PKCS8,
+                                 sign.serialization.NoEncryption())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+    进程内 compute_update 测试, 对比 configtxlator compute_update 的输出:
+        cd deploy && python -m unittest utils/configtx/test/update_test.py
+    PATH 中有 configtxlator 时额外与二进制的实时输出交叉校验
+"""
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+import subprocess
+from types import SimpleNamespace
+
+from utils.configtx.codec import ProtoCodec
+from utils.configtx.handle import ConfigTxHandler
+from utils.configtx.update import compute_update
+
+FIXTURES = os.path.dirname(os.path.abspath(__file__))
+CHANNEL = "parcelxdevchannel"
+
+# 模拟 configtxlator, 与二进制一样以相对工作目录解析 --input/--output
+CONFIGTXLATOR = """#!{python}
+import os, sys, json, shutil
+sys.path[:0] = {path!r}
+from utils.configtx.codec import ProtoCodec
+from utils.configtx.update import compute_update
+
+args = sys.argv[1:]
+opt = lambda name: args[args.index(name) + 1]
+codec = ProtoCodec()
+if args[0] == "proto_encode":
+    with open(opt("--input")) as fp:
+        data = codec.encode(json.load(fp), opt("--type"))
+    with open(opt("--output"), "wb") as fp:
+        fp.write(data)
+elif args[0] == "proto_decode":
+    with open(opt("--input"), "rb") as fp:
+        obj = codec.decode(fp.read(), opt("--type"))
+    with open(opt("--output"), "w") as fp:
+        json.dump(obj, fp)
+elif args[0] == "compute_update" and os.environ.get("EXPECTED_PB"):
+    shutil.copy(os.environ["EXPECTED_PB"], opt("--output"))
+elif args[0] == "compute_update":
+    configs = []
+    for name in ("--original", "--updated"):
+        configs.append(codec.message_type("common.Config")())
+        with open(opt(name), "rb") as fp:
+            configs[-1].ParseFromString(fp.read())
+    with open(opt("--output"), "wb") as fp:
+        fp.write(compute_update(configs[0], configs[1], opt("--channel_id")).SerializeToString(deterministic=True))
+"""
+
+
+@unittest.skipUnless(ProtoCodec.available(), "hfc protos required")
+class ComputeUpdateTest(unittest.TestCase):
+
+    def setUp(self):
+        self.codec = ProtoCodec()
+
+    def load(self, name, message_type):
+        msg = self.codec.message_type(message_type)()
+        with open(os.path.join(FIXTURES, name), "rb") as fp:
+            msg.ParseFromString(fp.read())
+        return msg
+
+    def test_add_org(self):
+        original = self.load("config.pb", "common.Config")
+        updated = self.load("modified_config.pb", "common.Config")
+        self.assertEqual(self.load("orgwest_update.pb", "common.ConfigUpdate"),
+                         compute_update(original, updated, CHANNEL))
+
+    def test_modify_value(self):
+        original = self.load("config.pb", "common.Config")
+        updated = self.load("config.pb", "common.Config")
+        batch_size = updated.channel_group.groups["Orderer"].values["BatchSize"]
+        batch_size.value += b"\x20\x01"
+        update = self.codec.to_dict(compute_update(original, updated, CHANNEL))
+
+        orderer_read, orderer_write = update["read_set"]["groups"]["Orderer"], update["write_set"]["groups"]["Orderer"]
+        self.assertEqual({}, orderer_read["values"])
+        self.assertEqual(["BatchSize"], list(orderer_write["values"]))
+        self.assertEqual(str(batch_size.version + 1), orderer_write["values"]["BatchSize"]["version"])
+        self.assertEqual(orderer_read["version"], orderer_write["version"])
+
+    def test_no_differences(self):
+        original = self.load("config.pb", "common.Config")
+        with self.assertRaises(AttributeError):
+            compute_update(original, original, CHANNEL)
+
+    @unittest.skipUnless(shutil.which("configtxlator"), "configtxlator binary required")
+    def test_cross_check_configtxlator(self):
+        root = tempfile.mkdtemp(prefix="compute-update-")
+        try:
+            output = os.path.join(root, "update.pb")
+            subprocess.run(["configtxlator", "compute_update", "--channel_id", CHANNEL,
+                            "--original", os.path.join(FIXTURES, "config.pb"),
+                            "--updated", os.path.join(FIXTURES, "modified_config.pb"),
+                            "--output", output], stdout=subprocess.PIPE).check_returncode()
+            expected = self.codec.message_type("common.ConfigUpdate")()
+            with open(output, "rb") as fp:
+                expected.ParseFromString(fp.read())
+        finally:
+            shutil.rmtree(root, ignore_errors=True)
+        original = self.load("config.pb", "common.Config")
+        updated = self.load("modified_config.pb", "common.Config")
+        self.assertEqual(expected, compute_update(original, updated, CHANNEL))
+
+
+@unittest.skipUnless(ProtoCodec.available(), "hfc protos required")
+class ConfigTxlatorTest(unittest.TestCase):
+    """
+    未安装 hfc 时经 configtxlator 编解码, 及与 configtxlator 交叉校验, 输出目录为相对路径(默认 --output ./gen)
+    """
+
+    def setUp(self):
+        self.codec = ProtoCodec()
+        self.cwd = os.getcwd()
+        self.root = tempfile.mkdtemp(prefix="configtxlator-")
+        self.configtxlator = os.path.join(self.root, "configtxlator")
+        with open(self.configtxlator, "w") as fp:
+            fp.write(CONFIGTXLATOR.format(python=sys.executable, path=sys.path))
+        os.chmod(self.configtxlator, 0o755)
+        os.chdir(self.root)
+        os.makedirs("gen")
+
+    def tearDown(self):
+        os.environ.pop("EXPECTED_PB", None)
+        os.chdir(self.cwd)
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def handler(self, codec=None):
+        handler = ConfigTxHandler.__new__(ConfigTxHandler)
+        handler.codec = codec
+        handler.release = SimpleNamespace(configtxlator=self.configtxlator)
+        handler.configure = SimpleNamespace(output="./gen")
+        handler.cross_check = False
+        return handler
+
+    def load(self, name, message_type):
+        with open(os.path.join(FIXTURES, name), "rb") as fp:
+            return self.codec.decode(fp.read(), message_type)
+
+    def test_encode_decode(self):
+        handler = self.handler()
+        config = self.load("config.pb", "common.Config")
+        data = handler.encode(config, "common.Config")
+        self.assertEqual(self.codec.encode(config, "common.Config"), data)
+        self.assertEqual(config, handler.decode(data, "common.Config"))
+        self.assertEqual([], os.listdir("gen"))
+
+    def test_config_update_envelope(self):
+        original = self.load("config.pb", "common.Config")
+        updated = self.load("modified_config.pb", "common.Config")
+        envelope = self.handler().config_update_envelope(CHANNEL, original, updated)
+        self.assertEqual(self.codec.decode(self.handler(self.codec).config_update_envelope(CHANNEL, original, updated),
+                                           "common.Envelope"),
+                         self.codec.decode(envelope, "common.Envelope"))
+        self.assertEqual([], os.listdir("gen"))
+
+    def test_cross_check(self):
+        handler = self.handler(self.codec)
+        handler.cross_check = True
+        original = self.load("config.pb", "common.Config")
+        updated = self.load("modified_config.pb", "common.Config")
+        self.assertEqual(self.load("orgwest_update.pb", "common.ConfigUpdate"),
+                         handler.config_update(CHANNEL, original, updated))
+
+        # configtxlator 输出不一致时抛出异常
+        os.environ["EXPECTED_PB"] = os.path.join(self.root, "empty.pb")
+        open(os.environ["EXPECTED_PB"], "wb").close()
+        with self.assertRaises(RuntimeError):
+            handler.config_update(CHANNEL, original, updated)
+        self.assertEqual([], os.listdir("gen"))
+
+
+if __name__ == '__main__':
+    unittest.main()
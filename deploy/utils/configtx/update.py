@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+    进程内计算配置增量, 同 configtxlator compute_update (common/tools/configtxlator/update):
+        - 未变化的配置不进入读写集; 成员(组/值/策略)增删时, 未变化的成员以版本号加入读写集
+        - 修改的值/策略版本号 +1, 新增的组/值/策略版本号为 0
+"""
+try:
+    from hfc.protos.common import configtx_pb2
+except ImportError:
+    configtx_pb2 = None
+
+
+def compute_update(original, updated, channel_id):
+    """
+    计算配置增量
+    :param original: common.Config 原始配置
+    :param updated: common.Config 修改后的配置
+    :param channel_id: channel name
+    :return: common.ConfigUpdate
+    """
+    if configtx_pb2 is None:
+        raise ImportError("in-process compute_update required, please run 'pip3 install fabric-sdk-py'")
+    if not original.HasField("channel_group"):
+        raise AttributeError("no channel group included for original config")
+    if not updated.HasField("channel_group"):
+        raise AttributeError("no channel group included for updated config")
+
+    read_set, write_set, group_updated = compute_group_update(original.channel_group, updated.channel_group)
+    if not group_updated:
+        raise AttributeError("no differences detected between original and updated config")
+    return configtx_pb2.ConfigUpdate(channel_id=channel_id, read_set=read_set, write_set=write_set)
+
+
+def compute_policies_update(original, updated):
+    """
+    :return: (写集, 未变化集, 成员是否增删)
+    """
+    write_set, same_set, members_updated = {}, {}, False
+    for name, policy in original.items():
+        if name not in updated:
+            members_updated = True
+            continue
+        updated_policy = updated[name]
+        if policy.mod_policy == updated_policy.mod_policy and policy.policy == updated_policy.policy:
+            same_set[name] = configtx_pb2.ConfigPolicy(version=policy.version)
+            continue
+        write_set[name] = new_config_policy(policy.version + 1, updated_policy)
+
+    for name, updated_policy in updated.items():
+        if name in original:
+            continue
+        members_updated = True
+        write_set[name] = new_config_policy(0, updated_policy)
+    return write_set, same_set, members_updated
+
+
+def compute_values_update(original, updated):
+    """
+    :return: (写集, 未变化集, 成员是否增删)
+    """
+    write_set, same_set, members_updated = {}, {}, False
+    for name, value in original.items():
+        if name not in updated:
+            members_updated = True
+            continue
+        updated_value = updated[name]
+        if value.mod_policy == updated_value.mod_policy and value.value == updated_value.value:
+            same_set[name] = configtx_pb2.ConfigValue(version=value.version)
+            continue
+        write_set[name] = configtx_pb2.ConfigValue(version=value.version + 1,
+                                                   mod_policy=updated_value.mod_policy,
+                                                   value=updated_value.value)
+
+    for name, updated_value in updated.items():
+        if name in original:
+            continue
+        members_updated = True
+        write_set[name] = configtx_pb2.ConfigValue(version=0,
+                                                   mod_policy=updated_value.mod_policy,
+                                                   value=updated_value.value)
+    return write_set, same_set, members_updated
+
+
+def compute_groups_update(original, updated):
+    """
+    :return: (读集, 写集, 未变化集, 成员是否增删)
+    """
+    read_set, write_set, same_set, members_updated = {}, {}, {}, False
+    for name, group in original.items():
+        if name not in updated:
+            members_updated = True
+            continue
+        group_read_set, group_write_set, group_updated = compute_group_update(group, updated[name])
+        if not group_updated:
+            same_set[name] = group_read_set
+            continue
+        read_set[name] = group_read_set
+        write_set[name] = group_write_set
+
+    for name, updated_group in updated.items():
+        if name in original:
+            continue
+        members_updated = True
+        _, group_write_set, _ = compute_group_update(configtx_pb2.ConfigGroup(), updated_group)
+        write_set[name] = new_config_group(0, updated_group.mod_policy,
+                                           group_write_set.policies, group_write_set.values, group_write_set.groups)
+    return read_set, write_set, same_set, members_updated
+
+
+def compute_group_update(original, updated):
+    """
+    计算 ConfigGroup 增量
+    :param original: common.ConfigGroup
+    :param updated: common.ConfigGroup
+    :return: (读集, 写集, 是否有变化)
+    """
+    write_policies, same_policies, policies_updated = compute_policies_update(original.policies, updated.policies)
+    write_values, same_values, values_updated = compute_values_update(original.values, updated.values)
+    read_groups, write_groups, same_groups, groups_updated = compute_groups_update(original.groups, updated.groups)
+
+    # 成员及 mod_policy 均未变化
+    if not (policies_updated or values_updated or groups_updated or original.mod_policy != updated.mod_policy):
+        if not (write_policies or write_values or read_groups or write_groups):
+            return (configtx_pb2.ConfigGroup(version=original.version),
+                    configtx_pb2.ConfigGroup(version=original.version), False)
+        return (new_config_group(original.version, groups=read_groups),
+                new_config_group(original.version, policies=write_policies, values=write_values, groups=write_groups),
+                True)
+
+    read_policies = dict(same_policies)
+    write_policies.update(same_policies)
+    read_values = dict(same_values)
+    write_values.update(same_values)
+    read_groups.update(same_groups)
+    write_groups.update(same_groups)
+    return (new_config_group(original.version, policies=read_policies, values=read_values, groups=read_groups),
+            new_config_group(original.version + 1, updated.mod_policy, write_policies, write_values, write_groups),
+            True)
+
+
+def new_config_policy(version, updated):
+    policy = configtx_pb2.ConfigPolicy(version=version, mod_policy=updated.mod_policy)
+    if updated.HasField("policy"):
+        policy.policy.CopyFrom(updated.policy)
+    return policy
+
+
+def new_config_group(version, mod_policy="", policies=None, values=None, groups=None):
+    group = configtx_pb2.ConfigGroup(version=version, mod_policy=mod_policy)
+    for name, policy in (policies or {}).items():
+        group.policies[name].CopyFrom(policy)
+    for name, value in (values or {}).items():
+        group.values[name].CopyFrom(value)
+    for name, child in (groups or {}).items():
+        group.groups[name].CopyFrom(child)
+    return group
+
+
+def apply_update(config, config_update):
+    """
+    将配置增量应用到原始配置, 同 orderer 处理 config update 后生成的新配置:
+        - 版本号变化的组以写集中的成员为准, 未出现在写集中的成员被删除
+        - 版本号变化的值/策略以写集为准, 其余保持原配置
+    :param config: common.Config 原始配置
+    :param config_update: common.ConfigUpdate
+    :return: common.Config, sequence + 1
+    """
+    if configtx_pb2 is None:
+        raise ImportError("in-process apply_update required, please run 'pip3 install fabric-sdk-py'")
+    updated = configtx_pb2.Config()
+    updated.CopyFrom(config)
+    updated.sequence = config.sequence + 1
+    apply_group_update(updated.channel_group, config_update.write_set)
+    return updated
+
+
+def apply_group_update(group, write_set):
+    """
+    在原 ConfigGroup 上应用写集
+    :param group: common.ConfigGroup
+    :param write_set: common.ConfigGroup 同一路径下的写集
+    :return:
+    """
+    if write_set.version != group.version:
+        group.version = write_set.version
+        group.mod_policy = write_set.mod_policy
+        for members, updated_members in ((group.groups, write_set.groups),
+                                         (group.values, write_set.values),
+                                         (group.policies, write_set.policies)):
+            for name in [n for n in members if n not in updated_members]:
+                del members[name]
+
+    for members, updated_members in ((group.values, write_set.values), (group.policies, write_set.policies)):
+        for name, item in updated_members.items():
+            if name not in members or members[name].version != item.version:
+                members[name].CopyFrom(item)
+
+    for name, child in write_set.groups.items():
+        if name not in group.groups:
+            group.groups[name].CopyFrom(child)
+        else:
+            apply_group_update(group.groups[name], child)
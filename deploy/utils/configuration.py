@@ -57,6 +57,11 @@ class Configuration(object):
         self.config_output = kwargs.get("configOutPath", "./gen")
         # config json,  record script execution status
         self.exec_status_json_file = os.path.join(self.config_output, "_data.json")
+        # 远程执行后端 fabric / asyncssh
+        SshHost.use_backend(kwargs.get("sshBackend", None) or "fabric")
+        # sftp 传输配置
+        SshHost.configure_transfer(chunk_size=kwargs.get("chunkSize", None),
+                                   compress=kwargs.get("sshCompress", None))
 
         self.yaml = YAML()
         self.yaml.indent(sequence=4, offset=2)
@@ -85,6 +90,31 @@ class Configuration(object):
         self.assign_manager.crypto_output = self.crypto_configurator.output
         self.assign_manager.configtx_output = self.configtx_configurator.output
         self.assign_manager.compose_output = self.docker_compose_configurator.config_output
+        # 组件远程操作并发执行
+        self.assign_manager.set_parallel(self._kwargs.get("parallel", False),
+                                         max_workers=self._kwargs.get("maxWorkers", None),
+                                         per_host_workers=self._kwargs.get("perHostWorkers", None))
+        # 拷贝配置时只上传变化的文件
+        self.assign_manager.delta_upload = not self._kwargs.get("fullUpload", False)
+        # 按打包清单跳过未变化的配置包
+        self.assign_manager.incremental = not self._kwargs.get("fullUpload", False)
+        # 以 tar 流拷贝配置
+        self.assign_manager.stream_upload = self._kwargs.get("streamUpload", False) or False
+        # 共用文件树形中继分发
+        self.assign_manager.relay = self._kwargs.get("relay", False) or False
+        self.assign_manager.relay_fanout = self._kwargs.get("relayFanout", None) or 2
+        # 多进程并发打包
+        self.assign_manager.package_workers = self._kwargs.get("packageWorkers", None) or 1
+        # 共用证书目录打包为共享包, 树形中继分发时共享包经中继分发
+        self.assign_manager.shared_bundle = self._kwargs.get("sharedBundle", False) or self.assign_manager.relay
+        # 按主机合并配置包
+        self.assign_manager.host_bundle = self._kwargs.get("hostBundle", False) or False
+        # 内存中生成配置包直接上传
+        self.assign_manager.memory_package = self._kwargs.get("memoryPackage", False) or False
+        # 配置包格式
+        self.assign_manager.set_package_format(self._kwargs.get("packageFormat", None) or "zip")
+        # 并发创建/加入 channel 数
+        self.assign_manager.channel_workers = self._kwargs.get("channelWorkers", None) or 1
 
         # read yaml configure
         self.__init_network(data)
@@ -106,6 +136,12 @@ class Configuration(object):
         # fabric configtx operator
         self.configtx_handler = ConfigTxHandler(
             self.fabric_release, self.configtx_configurator)
+        # 配置更新时保存中间文件
+        self.configtx_handler.debug_artifacts = self._kwargs.get("debugArtifacts", False) or False
+        # 忽略输入指纹, 强制重新运行 configtxgen
+        self.configtx_handler.force = self._kwargs.get("force", False) or False
+        # 配置增量与 configtxlator 交叉校验
+        self.configtx_handler.cross_check = self._kwargs.get("crossCheck", False) or False
 
     def __init_network(self, data):
         """ 初始化网络配置根据配置文件"""
@@ -5,10 +5,15 @@
 @Author: quanbin_zhu
 @Email:  quanbin@parcelx.io
 """
+import io
 import os
 import sys
+import copy
 import json
+import asyncio
 import logging
+import threading
+from contextlib import contextmanager
 from collections import OrderedDict
 
 from utils.chaincode.operation import ChaincodeInstallOperator, ChaincodeInstantiateOperator, \
@@ -18,6 +23,13 @@ from utils import format_org_msp_id, format_org_domain, split_line
 from utils.remote import *
 from utils.configtx import *
 from utils.tool import *
+from utils.configtx.sign import sign_envelope, merge_signed_envelopes
+from utils.tool.relay import TreeRelay
+from utils.tool.executor import ParallelExecutor, KeyedSemaphore
+from utils.tool.bundle import SharedBundle
+from utils.tool.manifest import PackageManifest
+from utils.tool.archive import format_benchmark
+from utils.tool.delta import file_digests, remote_digest_cmd, parse_digests, changed_files
 
 logger = logging.getLogger(__name__)
 
@@ -258,6 +270,10 @@ class DeployContext(BaseContext):
 
     def __init__(self, **kwargs):
         super(DeployContext, self).__init__(**kwargs)
+        # 并发安装 channel 时 peer-cli 容器、主机及 orderer 的访问控制
+        self.channel_locks = KeyedSemaphore()
+        # 同一主机的多个组件并发拷贝时, 共享包查询、上传、安装的访问控制
+        self.bundle_locks = KeyedSemaphore()
 
     # docker compose functions
     def compose_gen(self, virtual_host=False):
@@ -265,11 +281,21 @@ class DeployContext(BaseContext):
 
     def compose_zip(self, *modules):
         """
-        服务配置文件打成zip压缩包
+        服务配置文件打成zip压缩包, 内容未变化的配置包不重新生成
         :param modules:
-        :return:
+        :return: list 重新打包的组件域名
         """
-        self.assign_manager.zip(*modules)
+        return self.assign_manager.zip(*modules)
+
+    def compose_benchmark(self, *modules):
+        """
+        对比各配置包格式的大小及打包、解压耗时
+        :param modules:
+        :return: list
+        """
+        rows = self.assign_manager.benchmark(*modules)
+        print(format_benchmark(rows))
+        return rows
 
     def compose_show(self, *modules):
         """
@@ -359,6 +385,7 @@ class DeployContext(BaseContext):
     def config_tx_ext_consortium(self, consortium):
         """
         修改 System 创世区块配置，添加新联盟
+        各步骤之间在内存中传递配置, --debug-artifacts 时保存中间文件
         :param consortium:
         :return:
         """
@@ -370,10 +397,9 @@ class DeployContext(BaseContext):
         prefix_path = f"{channel}/{consortium}"
 
         # step 0 gen new system genesis
-        logger.info(f"step 0 start to generate system.json.")
+        logger.info(f"step 0 start to generate system genesis.")
         new_system_pb = self.configtx_configurator.get_config_tx_channel_path(
             prefix_path, "system.pb")
-        new_system_json = new_system_pb.replace(".pb", ".json")
         new_system_channel = self.configtx_configurator.orderer_genesis.copy(
             "system.pb",
             os.path.dirname(new_system_pb))
@@ -381,168 +407,271 @@ class DeployContext(BaseContext):
         if 0 != ret.returncode:
             logger.info(f"stdout: {ret.stdout}\nstderr: {ret.stderr}")
             return
-        self.configtx_handler.proto_decode(self.configtx_configurator.relative_path(new_system_pb),
-                                           self.configtx_configurator.relative_path(new_system_json))
+        with open(new_system_pb, "rb") as fp:
+            new_system = self.configtx_handler.decode(fp.read())
+        self.__config_tx_ext_artifact(prefix_path, "system.json", new_system)
         logger.info(f"step 0 finished!")
 
         rc = SshHost.getConnection(self.assign_manager.get_host(one_node))
         # step 1
-        channel_config_pb = self.__config_tx_ext_fetch_cfg(
+        channel_config_block = self.__config_tx_ext_fetch_cfg(
             one_node, prefix_path, channel,
             tls_ca=self.assign_manager.orderer_cli_tls_ca
         )
 
         # step 2 ~ 3
-        channel_part_config_json = self.__config_tx_ext_decode_and_extract(
-            prefix_path, channel_config_pb
+        channel_part_config = self.__config_tx_ext_decode_and_extract(
+            prefix_path, channel_config_block
         )
 
         # step 4
-        modified_config_json = self.__config_tx_ext_modify_config(
-            prefix_path, channel_part_config_json, new_system_json,
+        modified_config = self.__config_tx_ext_modify_config(
+            prefix_path, channel_part_config, new_system,
             consortium=consortium
         )
 
         # step 5 ~ 7
-        consortium_updated_json = self.__config_tx_ext_compute_config(
-            prefix_path, channel, channel_part_config_json,
-            modified_config_json, consortium
+        consortium_updated = self.__config_tx_ext_compute_config(
+            prefix_path, channel, channel_part_config,
+            modified_config, consortium
         )
 
         # step 8 ~ 9
-        consortium_update_in_envelope_pb = self.__config_tx_ext_envelope_config(
-            prefix_path, channel, consortium_updated_json, consortium
+        consortium_update_in_envelope = self.__config_tx_ext_envelope_config(
+            prefix_path, channel, consortium_updated, consortium
         )
 
         # step 10、对 orgN_update_in_envelope.pb进行签名， 并进行下载
         logger.info(f"step 10 start to remote docker cli exec sign & update pb file!")
-        envelope_pb_filename = os.path.basename(consortium_update_in_envelope_pb)
+        envelope_pb_filename = f"{consortium}_updated_in_envelope.pb"
         sign_cmd, one_node_path = self.configtx_handler.remote_sign_channel_pb_cmd(envelope_pb_filename, one_node)
         update_cmd, _ = self.configtx_handler.remote_update_channel_pb_cmd(
             envelope_pb_filename, one_node, channel,
             self.assign_manager.first_orderer_service, self.assign_manager.orderer_cli_tls_ca)
-        rc.upload(consortium_update_in_envelope_pb, "/tmp")
-        rc.sudo(f"mv /tmp/{envelope_pb_filename} {one_node_path}")
-        rc.sudo(sign_cmd)
-        rc.sudo(update_cmd)
+        with rc.batch() as b:
+            b.upload(io.BytesIO(consortium_update_in_envelope), f"/tmp/{envelope_pb_filename}")
+            b.sudo(f"mv /tmp/{envelope_pb_filename} {one_node_path}")
+            b.sudo(sign_cmd)
+            b.sudo(update_cmd)
+        self.__config_tx_ext_update_cache(channel, consortium_updated)
 
     def config_tx_ext_channel(self, **kwargs):
         """
         向现有的channel中添加新的组织， 包含的步骤：
             0、 获取新增组织必要配置证书生成 orgN.json
-            1、 获取 channel 最新的配置文件 channel_config.pb
-            2、 将 channel_config.pb 文件转换为 channel_config.json
-            3、 从 channel_config.json 中提取必要的字段配置信息生成 config.json
-            4、 将 orgN.json 添加到 config.json 中 生成新的 modified_config.json
-            5、 将 config.json 转换为 config.pb, modified_config.json 转换为 modified_config.pb
-            6、 对比 config.pb 和 modified_config.pb 之间的差异生成 orgN_updated.pb
-            7、 将 orgN_updated.pb 转换为 orgN_updated.json
-            8、 对 orgN_updated.json 添加头信息并包装之前剥离出来的信息生成 orgN_update_in_envelope.json
-            9、 将 orgN_update_in_envelope.json 转换为 orgN_update_in_envelope.pb
-            10、对 orgN_update_in_envelope.pb进行签名， 并进行提交
+            1、 获取 channel 最新的配置区块 config_block.pb
+            2、 解码 config_block.pb
+            3、 从配置区块中提取 channel 配置 config
+            4、 将 orgN.json 添加到 config 中 生成新的 modified_config
+            5、 -
+            6、 对比 config 和 modified_config 之间的差异生成 orgN_updated
+            7、 -
+            8、 对 orgN_updated 添加头信息并包装之前剥离出来的信息生成 orgN_update_in_envelope
+            9、 编码 orgN_update_in_envelope.pb
+            10、由 channel 所有组织 Admin 对 orgN_update_in_envelope.pb 签名(本地或并发远程), 合并签名
+            11、一次提交 channel update
+
+        多个组织在同一个 ConfigUpdate 中添加, 只需一次签名及提交;
+        各步骤之间在内存中传递配置, --debug-artifacts 时才在 configtx/channels/<channel>/<orgs> 下保存中间文件
 
         :param kwargs:
             channel:
                 需要添加组织的channel id
             org:
                 待添加的组织名
+            orgs:
+                待添加的组织名列表
         :return:
         """
         #
         channel = kwargs["channel"]
         # 随机的节点
         one_node = self.configtx_configurator.get_peer_from_channel(channel)
-        to_extend_org = format_org_msp_id(kwargs["org"])
+        to_extend_orgs = list(OrderedDict.fromkeys(
+            format_org_msp_id(o) for o in kwargs.get("orgs", None) or [kwargs["org"]]))
+        to_extend_org = "-".join(to_extend_orgs)
         logger.info(
-            f"start to extend channel<{channel}>, add org<{to_extend_org}>.")
+            f"start to extend channel<{channel}>, add orgs<{to_extend_orgs}>.")
         prefix_path = f"{channel}/{to_extend_org}"
 
         # step 0
-        logger.info(f"step 0 start to generate {to_extend_org}.json.")
-        to_extend_org_json = self.configtx_configurator.get_config_tx_org_path(
-            f"{to_extend_org}.json")
-        if not os.path.exists(to_extend_org_json):
-            self.configtx_handler.print_org(to_extend_org)
+        to_extend_org_groups = []
+        for org in to_extend_orgs:
+            logger.info(f"step 0 start to generate {org}.json.")
+            org_json = self.configtx_configurator.get_config_tx_org_path(f"{org}.json")
+            if not os.path.exists(org_json):
+                self.configtx_handler.print_org(org)
+            with open(org_json, "r") as fp:
+                to_extend_org_groups.append(json.load(fp))
         logger.info(f"step 0 finished!")
 
         # 获取远程 docker cli 命令执行实例
         rc = SshHost.getConnection(self.assign_manager.get_host(one_node))
 
         # step 1
-        channel_config_pb = self.__config_tx_ext_fetch_cfg(
+        channel_config_block = self.__config_tx_ext_fetch_cfg(
             one_node, prefix_path, channel,
             tls_ca=self.assign_manager.peer_cli_tls_ca
         )
 
         # step 2 ~ 3
-        channel_part_config_json = self.__config_tx_ext_decode_and_extract(
-            prefix_path, channel_config_pb
+        channel_part_config = self.__config_tx_ext_decode_and_extract(
+            prefix_path, channel_config_block
         )
 
         # step 4
-        modified_config_json = self.__config_tx_ext_modify_config(
-            prefix_path, channel_part_config_json, to_extend_org_json,
-            organization=to_extend_org, channel=channel
+        modified_config = self.__config_tx_ext_modify_config(
+            prefix_path, channel_part_config, to_extend_org_groups,
+            organization=to_extend_orgs, channel=channel
         )
 
         # step 5 ~ 7
-        extend_org_updated_json = self.__config_tx_ext_compute_config(
-            prefix_path, channel, channel_part_config_json,
-            modified_config_json, to_extend_org
+        extend_org_updated = self.__config_tx_ext_compute_config(
+            prefix_path, channel, channel_part_config,
+            modified_config, to_extend_org
         )
 
         # step 8 ~ 9
-        org_update_in_envelope_pb = self.__config_tx_ext_envelope_config(
-            prefix_path, channel, extend_org_updated_json, to_extend_org
+        org_update_in_envelope = self.__config_tx_ext_envelope_config(
+            prefix_path, channel, extend_org_updated, to_extend_org
         )
 
-        # step 10、对 orgN_update_in_envelope.pb进行签名， 并进行下载
-        logger.info(f"step 10 start to remote docker cli exec sign pb file!")
-        envelope_pb_filename = os.path.basename(org_update_in_envelope_pb)
-        sign_cmd, one_node_path = self.configtx_handler.remote_sign_channel_pb_cmd(envelope_pb_filename, one_node)
-        rc.upload(org_update_in_envelope_pb, "/tmp")
-        rc.sudo(f"mv /tmp/{envelope_pb_filename} {one_node_path}")
-        rc.sudo(sign_cmd)
-
-        # step 11、下载签名过的pb文件, 并在 channel 所在的其他组织cli上进行 channel update
-        envelope_signed_pb_filepath = self.configtx_configurator.get_config_tx_channel_path(
-            prefix_path,
-            f"{format_org_domain(to_extend_org)}_signed_in_envelope.pb"
+        # step 10、由 channel 中所有组织的 Admin 对 orgN_update_in_envelope.pb 进行签名
+        signed_pb_filename = f"{'-'.join(map(format_org_domain, to_extend_orgs))}_signed_in_envelope.pb"
+        signed_in_envelope = self.__config_tx_ext_collect_signatures(
+            prefix_path, channel, org_update_in_envelope, f"{to_extend_org}_updated_in_envelope.pb",
+            signed_pb_filename
         )
-        envelope_signed_pb_filename = os.path.basename(envelope_signed_pb_filepath)
-
-        rc.download(f"{one_node_path}{envelope_pb_filename}", envelope_signed_pb_filepath)
-        # 其他组织进行 channel update 操作
-        for node in self.configtx_configurator.get_peer_from_channel(channel, first=False):
-            update_cmd, remote_path = self.configtx_handler.remote_update_channel_pb_cmd(
-                envelope_signed_pb_filename, node, channel,
-                self.assign_manager.first_orderer_service,
-                self.assign_manager.peer_cli_tls_ca)
-            oc = SshHost.getConnection(self.assign_manager.get_host(node))
-            oc.upload(envelope_signed_pb_filepath, "/tmp")
-            oc.sudo(f"mv /tmp/{envelope_signed_pb_filename} {remote_path}")
-            oc.sudo(update_cmd)
+
+        # step 11、在 channel 第一个组织的cli上进行 channel update
+        logger.info(f"step 11 start to update channel<{channel}> with <{signed_pb_filename}>")
+        update_cmd, remote_path = self.configtx_handler.remote_update_channel_pb_cmd(
+            signed_pb_filename, one_node, channel,
+            self.assign_manager.first_orderer_service,
+            self.assign_manager.peer_cli_tls_ca)
+        with rc.batch() as b:
+            b.upload(io.BytesIO(signed_in_envelope), f"/tmp/{signed_pb_filename}")
+            b.sudo(f"mv /tmp/{signed_pb_filename} {remote_path}")
+            b.sudo(update_cmd)
+        self.__config_tx_ext_update_cache(channel, extend_org_updated)
+        logger.info(f"step 11 channel<{channel}> updated!")
+
+    def __config_tx_ext_artifact(self, prefix_path, filename, data):
+        """
+        --debug-artifacts 时保存中间文件至 configtx/channels/<prefix_path>/
+        :param prefix_path:
+        :param filename:
+        :param data: bytes 或 dict
+        :return: 文件路径, 未开启时返回 None
+        """
+        if not self.configtx_handler.debug_artifacts:
+            return None
+        path = self.configtx_configurator.get_config_tx_channel_path(prefix_path, filename)
+        if isinstance(data, bytes):
+            with open(path, "wb") as fp:
+                fp.write(data)
+        else:
+            with open(path, "w") as fp:
+                json.dump(data, fp, indent=4)
+        logger.info(f"debug artifact <{path}> saved.")
+        return path
+
+    def __config_tx_ext_update_cache(self, channel, config_update):
+        """
+        config update 提交成功后, 更新本地缓存的配置区块
+        :param channel:
+        :param config_update: dict, common.ConfigUpdate
+        :return:
+        """
+        if self.configtx_handler.codec is None:
             return
+        self.configtx_handler.config_cache.update(
+            channel, self.configtx_handler.encode(config_update, "common.ConfigUpdate"))
+
+    def __config_tx_ext_collect_signatures(self, prefix_path, channel, envelope, envelope_filename, signed_filename):
+        """
+        step 10:
+            收集 channel 中所有组织 Admin 对 config update 的签名并合并至一个 envelope
+            - 本地 crypto-config 存在组织 Admin 证书私钥时在进程内签名
+            - 否则并发在各组织的 cli 上执行 peer channel signconfigtx, 下载后提取签名
+
+        :param prefix_path:
+        :param channel:
+        :param envelope: 未签名的 envelope bytes
+        :param envelope_filename: 远程签名时 envelope 的文件名
+        :param signed_filename: 合并签名后的 envelope 文件名
+        :return: 合并签名后的 envelope bytes
+        """
+        logger.info(f"step 10 start to collect signatures of channel<{channel}> organizations!")
+        signers, remote_orgs = [], []
+        for org in self.configtx_configurator.get_channel(channel).get_org():
+            signer = self.configtx_handler.org_admin_signer(org)
+            if signer:
+                signers.append(signer)
+            else:
+                remote_orgs.append(org)
+
+        def _remote_sign(node=None):
+            sign_cmd, node_path = self.configtx_handler.remote_sign_channel_pb_cmd(envelope_filename, node)
+            signed = io.BytesIO()
+            with SshHost.getConnection(self.assign_manager.get_host(node)).batch() as b:
+                b.upload(io.BytesIO(envelope), f"/tmp/{envelope_filename}")
+                b.sudo(f"mv /tmp/{envelope_filename} {node_path}")
+                b.sudo(sign_cmd)
+                b.download(f"{node_path}{envelope_filename}", signed)
+            return signed.getvalue()
+
+        signed_envelopes = []
+        if remote_orgs:
+            executor = ParallelExecutor(max_workers=self.assign_manager.max_workers, per_host=1)
+            for org in remote_orgs:
+                node = self.__config_tx_ext_signer_node(channel, org)
+                executor.submit(org, self.assign_manager.get_host(node, throw=True).ip, _remote_sign, node=node)
+            result = executor.run()
+            result.summary(logger)
+            result.raise_for_failure()
+            for r in result.results:
+                signed_envelopes.append(r.result)
+                self.__config_tx_ext_artifact(prefix_path, f"{format_org_domain(r.key)}_signed_in_envelope.pb",
+                                              r.result)
+
+        if signers:
+            envelope = sign_envelope(envelope, signers)
+        if signed_envelopes:
+            envelope = merge_signed_envelopes(envelope, signed_envelopes)
+        self.__config_tx_ext_artifact(prefix_path, signed_filename, envelope)
+        logger.info(f"step 10 {len(signers)} local and {len(signed_envelopes)} remote signatures merged!")
+        return envelope
+
+    def __config_tx_ext_signer_node(self, channel, org):
+        """
+        组织用于远程签名的 peer-cli 节点, 取组织中注册的第一个 peer-cli(按域名排序)
+        :param channel:
+        :param org:
+        :return: peer-cli 节点域名
+        :raise AttributeError: 组织没有 peer-cli 节点
+        """
+        nodes = self.assign_manager.org.get(format_org_domain(org), {}).get("peer-cli", None)
+        if not nodes:
+            raise AttributeError(f"Org: {org} has no peer-cli node to sign the config update of channel<{channel}>!")
+        return nodes[0]
 
     def __config_tx_ext_fetch_cfg(self, node, prefix_path, channel, orderer_service=None, tls_ca=None):
         """
         step 1:
-            获取 channel 配置文件
+            获取 channel 配置区块
 
         :param node:  cli 节点
         :param prefix_path:  文件生成目录前缀
         :param channel:
         :param orderer_service:
         :param tls_ca:
-        :return:
+        :return: common.Block bytes
         """
         # step 1
-        logger.info(f"step 1 start to fetch remote channel config file!")
+        logger.info(f"step 1 start to fetch remote channel config block!")
         # 获取远程 docker cli 命令执行实例
         rc = SshHost.getConnection(self.assign_manager.get_host(node))
-        # 本地保存路径
-        channel_config_pb = self.configtx_configurator.get_config_tx_channel_path(
-            prefix_path, "config_block.pb")
         # 获取 fetch 执行命令
         cmd, remote_pb = self.configtx_handler.remote_fetch_config_pb_cmd(
             node,
@@ -550,78 +679,79 @@ class DeployContext(BaseContext):
             orderer_service if orderer_service else self.assign_manager.first_orderer_service,
             tls_ca if tls_ca else self.assign_manager.orderer_cli_tls_ca
         )
-        rc.sudo(cmd, )
-        rc.download(remote_pb, channel_config_pb)
-        rc.sudo(f"rm -f {remote_pb}")
-        logger.info(f"step 1 new <{channel_config_pb}> finished!")
-
-        return channel_config_pb
-
-    def __config_tx_ext_decode_and_extract(self, prefix_path, channel_config_pb):
-        """
-        step 2: decode channel pb 文件 -> json
-        step 3: 从 json 文件中提取 channel 相关的配置
+        # channel 区块高度与缓存一致时使用本地缓存的配置区块;
+        # 系统 channel 及 orderer-cli 上无法通过 peer channel getinfo 获取高度, 不使用缓存
+        height = None
+        if channel != self.configtx_configurator.system_channel_id and node not in self.assign_manager.orderer_cli:
+            ret = rc.sudo(self.configtx_handler.remote_channel_info_cmd(node, channel), throw=False, warn=True,
+                          hide=True, idempotent=True)
+            height = self.configtx_handler.parse_channel_height(ret.stdout if ret else None)
+        cached_pb = self.configtx_handler.config_cache.get(channel, height)
+        if cached_pb:
+            with open(cached_pb, "rb") as fp:
+                block = fp.read()
+            logger.info(f"step 1 config block from cache <{cached_pb}> finished!")
+        else:
+            buffer = io.BytesIO()
+            with rc.batch() as b:
+                b.sudo(cmd)
+                b.download(remote_pb, buffer)
+                b.sudo(f"rm -f {remote_pb}")
+            block = buffer.getvalue()
+            self.configtx_handler.config_cache.put(channel, block, height)
+            logger.info(f"step 1 fetch config block of channel<{channel}> finished!")
+        self.__config_tx_ext_artifact(prefix_path, "config_block.pb", block)
+
+        return block
+
+    def __config_tx_ext_decode_and_extract(self, prefix_path, channel_config_block):
+        """
+        step 2: decode channel 配置区块
+        step 3: 从配置区块中提取 channel 相关的配置
         :param prefix_path:
-        :param channel_config_pb:
-        :return:
+        :param channel_config_block: common.Block bytes
+        :return: dict, common.Config
         """
         # step 2
-        channel_config_json = self.configtx_configurator.get_config_tx_channel_path(
-            prefix_path, "config_block.json")
-        logger.info(f"step 2 start to proto decode config file <{channel_config_pb}>")
-        ret = self.configtx_handler.proto_decode(
-            self.configtx_configurator.relative_path(channel_config_pb),
-            self.configtx_configurator.relative_path(channel_config_json)
-        )
-        if 0 != ret.returncode:
-            logger.error(f"stdout: {ret.stdout}\nstderr: {ret.stderr}")
-            sys.exit(1)
-        logger.info(f"step 2 new channel config json <{channel_config_json}> finished!")
+        logger.info(f"step 2 start to proto decode config block.")
+        channel_config = self.configtx_handler.decode(channel_config_block)
+        self.__config_tx_ext_artifact(prefix_path, "config_block.json", channel_config)
 
         # step 3
-        logger.info(f"step 3 start to extract json config file <{channel_config_json}>")
-        channel_part_config_json = self.configtx_configurator.get_config_tx_channel_path(
-            prefix_path, "config.json")
-        with open(channel_config_json, "r") as fp:
-            channel_config_dict = json.load(fp)
-            with open(channel_part_config_json, "w") as nfp:
-                json.dump(channel_config_dict["data"]["data"][0]
-                          ["payload"]["data"]["config"], nfp, indent=4)
-        logger.info(f"step 3 new config json file <{channel_part_config_json}> finished!")
+        channel_part_config = channel_config["data"]["data"][0]["payload"]["data"]["config"]
+        self.__config_tx_ext_artifact(prefix_path, "config.json", channel_part_config)
+        logger.info(f"step 3 extract channel config finished!")
 
-        return channel_part_config_json
+        return channel_part_config
 
-    def __config_tx_ext_modify_config(self, prefix_path, config_json, to_ext_json, **kwargs):
+    def __config_tx_ext_modify_config(self, prefix_path, config, to_ext, **kwargs):
         """
         step 4:
             - 读取 新增的组织 或 联盟 配置
             - 修改 配置文件 加入 新增的成员
         :param prefix_path:
-        :param config_json:  提取的配置文件
-        :param to_ext_json:  待扩展的配置文件
+        :param config:  提取的配置, dict
+        :param to_ext:  待扩展的配置, 添加联盟时为解码的系统创世区块, 扩展 channel 时为组织配置或组织配置列表
         :param kwargs:
             consortium:
                 添加新的联盟时 填写 与 configtx.yaml 中 联盟的Profile名称
             channel:
                 扩展 channel 时 需填写
             organization:
-                扩展 channel 时 需填写
-        :return:
+                扩展 channel 时 需填写, 组织名 或 组织名列表(与 to_ext 一一对应)
+        :return: dict, 修改后的配置
         """
         # step 4
         channel = kwargs.get("channel", None)
         consortium = kwargs.get("consortium", None)
         organization = kwargs.get("organization", None)
-        with open(config_json, "r") as fp:
-            part_config = json.load(fp)
-        with open(to_ext_json, "r") as fp:
-            to_ext_data = json.load(fp)
+        part_config = copy.deepcopy(config)
 
         # 向系统配置中添加新联盟配置
         if consortium:
             logger.info(f"step 4 start to add Consortium<{consortium}> json to config file.")
             groups = part_config["channel_group"]["groups"]["Consortiums"]["groups"]
-            to_ext_cfg = to_ext_data["data"]["data"][0]["payload"]["data"]["config"]
+            to_ext_cfg = to_ext["data"]["data"][0]["payload"]["data"]["config"]
             new_consortium = to_ext_cfg["channel_group"]["groups"]["Consortiums"]["groups"][consortium]
             if consortium in groups:
                 logger.error(f"system genesis contains channel profile <{consortium}> !")
@@ -629,124 +759,69 @@ class DeployContext(BaseContext):
             groups[consortium] = new_consortium
         # 向已经存在的channel中添加新组织
         elif organization:
-            logger.info(f"step 4 start to add Organization<{organization}> json to config file.")
+            organizations = [organization] if isinstance(organization, str) else organization
+            org_groups = [to_ext] if isinstance(to_ext, dict) else to_ext
             groups = part_config["channel_group"]["groups"]["Application"]["groups"]
-            if organization in groups:
-                logger.error(f"channel<{channel}> contains organization {organization}")
-                sys.exit(1)
-            groups[organization] = to_ext_data
+            for org, org_group in zip(organizations, org_groups):
+                logger.info(f"step 4 start to add Organization<{org}> json to config file.")
+                if org in groups:
+                    logger.error(f"channel<{channel}> contains organization {org}")
+                    sys.exit(1)
+                groups[org] = org_group
         else:
             logger.error("Channel extend param error at step 4!")
             sys.exit(1)
 
-        modified_config_json = self.configtx_configurator.get_config_tx_channel_path(
-            prefix_path, "modified_config.json")
-        with open(modified_config_json, "w") as fp:
-            json.dump(part_config, fp, indent=4)
-        logger.info(f"step 4 new modified config file <{modified_config_json}> finished!")
+        self.__config_tx_ext_artifact(prefix_path, "modified_config.json", part_config)
+        logger.info(f"step 4 modify config finished!")
 
-        return modified_config_json
+        return part_config
 
-    def __config_tx_ext_compute_config(self, prefix_path, channel,
-                                       channel_part_config_json, modified_config_json, part):
+    def __config_tx_ext_compute_config(self, prefix_path, channel, config, modified_config, part):
         """
-        step 5:
-            将 config.json 转换为 config.pb, modified_config.json 转换为 modified_config.pb
-        step 6:
-            对比 config.pb 和 modified_config.pb 之间的差异生成 part_updated.pb
-        step 7:
-            将 part_updated.pb 转换为 part_updated.json
+        step 5 ~ 7:
+            对比 config 和 modified_config 之间的差异生成 part_updated
 
         :param prefix_path:
         :param channel:
-        :param channel_part_config_json:
-        :param modified_config_json:
+        :param config: dict, common.Config
+        :param modified_config: dict, common.Config
         :param part:
-        :return:
+        :return: dict, common.ConfigUpdate
         """
-        # step 5、 将 config.json 转换为 config.pb, modified_config.json 转换为 modified_config.pb
-        logger.info(f"step 5 start to proto encode config.json and modified_config.json.")
-        channel_part_config_pb = self.configtx_configurator.get_config_tx_channel_path(
-            prefix_path, "config.pb")
-        self.configtx_handler.proto_encode(self.configtx_configurator.relative_path(channel_part_config_json),
-                                           self.configtx_configurator.relative_path(channel_part_config_pb))
-        logger.info(f"step 5 new pb file <{channel_part_config_pb}> finished!")
-        modified_config_pb = self.configtx_configurator.get_config_tx_channel_path(
-            prefix_path, "modified_config.pb")
-        self.configtx_handler.proto_encode(self.configtx_configurator.relative_path(modified_config_json),
-                                           self.configtx_configurator.relative_path(modified_config_pb))
-        logger.info(f"step 5 new pb file <{modified_config_pb}> finished!")
-
-        # step 6、 对比 config.pb 和 modified_config.pb 之间的差异生成 consortium_updated.pb
-        logger.info(f"step 6 start to compare config.pb with modified_config.pb .")
-        part_updated_pb = self.configtx_configurator.get_config_tx_channel_path(
-            prefix_path,
-            f"{part}_updated.pb"
-        )
-        self.configtx_handler.compute_update(
-            channel,
-            self.configtx_configurator.relative_path(channel_part_config_pb),
-            self.configtx_configurator.relative_path(modified_config_pb),
-            self.configtx_configurator.relative_path(part_updated_pb)
-        )
-        logger.info(f"step 6 new pb file <{part_updated_pb}> finished!")
-
-        # step 7、 将 orgN_updated.pb 转换为 orgN_updated.json
-        logger.info(f"step 7 start to proto decode config file <{part_updated_pb}>")
-        part_updated_json = part_updated_pb.replace(".pb", ".json")
-        self.configtx_handler.proto_decode(
-            self.configtx_configurator.relative_path(part_updated_pb),
-            self.configtx_configurator.relative_path(part_updated_json),
-            decode_type="common.ConfigUpdate")
-        logger.info(f"step 7 new json file <{part_updated_json}> finished!")
+        logger.info(f"step 6 start to compute config update.")
+        part_updated = self.configtx_handler.config_update(channel, config, modified_config)
+        self.__config_tx_ext_artifact(prefix_path, f"{part}_updated.json", part_updated)
+        logger.info(f"step 6 compute config update finished!")
 
-        return part_updated_json
+        return part_updated
 
-    def __config_tx_ext_envelope_config(self, prefix_path, channel, updated_json, part):
+    def __config_tx_ext_envelope_config(self, prefix_path, channel, config_update, part):
         """
         step 8:
-            对 part_updated.json 添加头信息并包装之前剥离出来的信息生成 part_update_in_envelope.json
+            对 part_updated 添加头信息并包装之前剥离出来的信息生成 part_update_in_envelope
         step 9:
-            将 part_update_in_envelope.json 转换为 part_update_in_envelope.pb
+            编码 part_update_in_envelope
 
         :param prefix_path:
         :param channel:
-        :param updated_json:
+        :param config_update: dict, common.ConfigUpdate
         :param part:
         :return:
-            part_update_in_envelope.pb
+            part_update_in_envelope.pb bytes
         """
-        # step 8、 对 orgN_updated.json 添加头信息并包装之前剥离出来的信息生成 orgN_update_in_envelope.json
+        # step 8、 对 orgN_updated 添加头信息并包装之前剥离出来的信息生成 orgN_update_in_envelope
         logger.info(f"step 8 start to wrap in an envelope message ...")
-        with open(updated_json, "r") as fp:
-            updated_dict = json.load(fp)
-        part_update_in_envelope_dict = {
-            "payload": {
-                "header": {
-                    # https://github.com/hyperledger/fabric/blob/eca1b14b7e3453a5d32296af79cc7bad10c7673b/protos/common/common.proto#L47
-                    # CONFIG_UPDATE = 2;             // Used for transactions which update the channel config
-                    "channel_header": {"channel_id": channel, "type": 2}
-                },
-                "data": {"config_update": updated_dict}}
-        }
-        part_update_in_envelope_json = self.configtx_configurator.get_config_tx_channel_path(
-            prefix_path,
-            f"{part}_updated_in_envelope.json"
-        )
-        with open(part_update_in_envelope_json, "w") as fp:
-            json.dump(part_update_in_envelope_dict, fp, indent=4)
-        logger.info(f"step 8 new json file <{part_update_in_envelope_json}> finished!")
+        part_update_in_envelope = self.configtx_handler.update_envelope(channel, config_update)
+        self.__config_tx_ext_artifact(prefix_path, f"{part}_updated_in_envelope.json", part_update_in_envelope)
 
-        # step 9、将 orgN_update_in_envelope.json 转换为 orgN_update_in_envelope.pb
-        logger.info(f"step 9 start to proto encode file <{part_update_in_envelope_json}> ...")
-        part_update_in_envelope_pb = part_update_in_envelope_json.replace(".json", ".pb")
-        self.configtx_handler.proto_encode(
-            self.configtx_configurator.relative_path(part_update_in_envelope_json),
-            self.configtx_configurator.relative_path(part_update_in_envelope_pb),
-            encode_type="common.Envelope")
-        logger.info(f"step 9 new pb file <{part_update_in_envelope_pb}> finished!")
+        # step 9、将 orgN_update_in_envelope 编码为 orgN_update_in_envelope.pb
+        logger.info(f"step 9 start to proto encode envelope ...")
+        envelope = self.configtx_handler.encode(part_update_in_envelope, "common.Envelope")
+        self.__config_tx_ext_artifact(prefix_path, f"{part}_updated_in_envelope.pb", envelope)
+        logger.info(f"step 9 encode envelope finished!")
 
-        return part_update_in_envelope_pb
+        return envelope
 
     # scp functions
     def scp_zip(self, *args, **kwargs):
@@ -768,12 +843,330 @@ class DeployContext(BaseContext):
             :return:
             """
             check_params(host, ele)
-            rc = SshHost.getConnection(host)
-            rc.upload(ele.absolute_zip_path,
-                      self.assign_manager.remote_tmp_path)
-            rc.run(" && ".join(ele.remote_unzip_bashes))
+            self.__scp_zip_run(SshHost.getConnection(host), self.__scp_zip_steps(ele))
 
-        self.assign_manager.handle_func(_copy, *args, **kwargs)
+        # asyncio 后端共享包的访问控制 {key: asyncio.Lock}
+        bundle_locks = {}
+
+        async def _copy_async(ele=None, host=None, **kwargs):
+            """
+            asyncio 后端 copy 操作, 所有主机共享同一个事件循环
+            :param ele:     object <Element>
+            :param host:    object <Host>
+            :return:
+            """
+            check_params(host, ele)
+            await self.__scp_zip_run_async(await AsyncSshHost.getConnection(host), self.__scp_zip_steps(ele),
+                                           bundle_locks)
+
+        # 多台主机共用的共享包经树形中继分发, 组件拷贝时不再上传
+        if self.assign_manager.relay and self.assign_manager.shared_bundle:
+            self.__scp_zip_relay_bundles(*args, **kwargs)
+
+        if self.assign_manager.host_bundle:
+            self.assign_manager.handle_host_func(self.__scp_zip_host, *args, **kwargs)
+        elif SshHost.backend().ASYNC:
+            self.assign_manager.handle_coroutine(_copy_async, *args, **kwargs)
+        else:
+            self.assign_manager.handle_func(_copy, *args, **kwargs)
+
+    def __scp_zip_host(self, host=None, elements=None, **kwargs):
+        """
+        同一台主机的配置包合并拷贝: 一次 sha256 对比, 一次上传, 一次解压
+        :param host:    object <Host>
+        :param elements: list [(domain, ele)]
+        :return:
+        """
+        check_params(host)
+        todo = []
+        for _, ele in elements:
+            if self.assign_manager.is_dirty(ele):
+                todo.append(ele)
+            else:
+                logger.info(f"[{ele.ip}] {ele.zip_name} unchanged since last copy, skip.")
+        if not todo:
+            return
+        rc = SshHost.getConnection(host)
+        # 主机尚未持有的共享包与配置包一起合并
+        bundles = OrderedDict()
+        for ele in todo:
+            for bundle in self.__scp_zip_missing_bundles(ele, self.__scp_zip_host_bundles(rc, ele)):
+                bundles[bundle.name] = bundle
+        shared = not self.assign_manager.shared_bundle
+
+        changed = OrderedDict((ele.role_domain, None) for ele in todo)
+        if self.assign_manager.delta_upload:
+            digests = OrderedDict((ele.role_domain, self.__scp_zip_digests(ele)) for ele in todo)
+            names = list(OrderedDict.fromkeys(name for d in digests.values() for name in d))
+            ret = rc.run(remote_digest_cmd(self.assign_manager.remote_bash_path, names), hide=True, idempotent=True)
+            for ele in todo:
+                changed[ele.role_domain] = self.__scp_zip_changed(ele, digests[ele.role_domain], ret.stdout)
+        parts = [(ele, changed[ele.role_domain]) for ele in todo
+                 if changed[ele.role_domain] is None or changed[ele.role_domain]]
+        bundle_bashes = [f"mkdir -p {self.assign_manager.remote_bash_path}/{SharedBundle.STORE}"] + \
+            [f"touch {self.assign_manager.remote_bash_path}/{SharedBundle.STORE}/{name}" for name in bundles]
+
+        members = OrderedDict()
+        for bundle in bundles.values():
+            members.update(bundle.members)
+        for ele, names in parts:
+            for name, absolute_path in ele.archive_members(shared).items():
+                if names is None or name in names:
+                    members.pop(name, None)
+                    members[name] = absolute_path
+
+        if not parts and not bundles:
+            pass
+        elif self.assign_manager.stream_upload:
+            rc.stream(" && ".join(todo[0].remote_untar_bashes + bundle_bashes),
+                      lambda fp: self.assign_manager.stream_format.write_fileobj(fp, members))
+        else:
+            name = self.assign_manager.host_zip_name(host.ip)
+            logger.info(f"[{host.ip}] merge {len(parts)} packages and {len(bundles)} shared bundles into {name}")
+            remote_zip_path = f"{self.assign_manager.remote_tmp_path}/{name}"
+            if self.assign_manager.memory_package:
+                with self.assign_manager.open_package(members) as fp:
+                    rc.upload(fp, remote_zip_path)
+            else:
+                rc.upload(self.assign_manager.package_format.write(self.assign_manager.host_zip_path(host.ip), members),
+                          remote_zip_path)
+            rc.run(" && ".join(todo[0].unzip_bashes(remote_zip_path) + bundle_bashes))
+        self.assign_manager.add_host_bundles(host.ip, list(bundles))
+        for ele in todo:
+            self.assign_manager.mark_shipped(ele)
+
+    def __scp_zip_steps(self, ele):
+        """
+        组件配置拷贝步骤, 同步与 asyncio 后端共用, 由 __scp_zip_run/__scp_zip_run_async 执行
+        生成 (操作, args, kwargs), 操作为远程连接的方法 run/upload/stream, 或访问控制 lock/unlock,
+        远程操作的返回值经 send 传回
+        :param ele: object <Element>
+        :return:
+        """
+        if not self.assign_manager.is_dirty(ele):
+            logger.info(f"[{ele.ip}] {ele.zip_name} unchanged since last copy, skip.")
+            return
+        yield from self.__scp_zip_bundle_steps(ele)
+        shared = not self.assign_manager.shared_bundle
+        changed = None
+        if self.assign_manager.delta_upload:
+            local_digests = self.__scp_zip_digests(ele)
+            ret = yield "run", (remote_digest_cmd(self.assign_manager.remote_bash_path, local_digests),), \
+                dict(hide=True, idempotent=True)
+            changed = self.__scp_zip_changed(ele, local_digests, ret.stdout)
+        if changed is not None and not changed:
+            pass
+        elif self.assign_manager.stream_upload:
+            yield "stream", (" && ".join(ele.remote_untar_bashes), lambda fp: ele.write_tar(fp, changed, shared)), \
+                dict(idempotent=True)
+        elif changed:
+            with self.__scp_zip_source(ele, changed) as (source, remote):
+                yield "upload", (source, remote), {}
+            yield "run", (" && ".join(ele.remote_delta_unzip_bashes),), {}
+        else:
+            with self.__scp_zip_source(ele) as (source, remote):
+                yield "upload", (source, remote), {}
+            yield "run", (" && ".join(ele.remote_unzip_bashes),), {}
+        self.assign_manager.mark_shipped(ele)
+
+    def __scp_zip_bundle_steps(self, ele, install=True):
+        """
+        共享包拷贝步骤, 首次使用时查询远程主机已安装的共享包
+        同一主机的组件共用同一个远程临时文件, 由持有锁的组件上传、安装, 其余组件跳过
+        :param ele: object <Element>
+        :param install: 是否上传、安装远程主机尚未持有的共享包
+        :return: list<SharedBundle>
+        """
+        bundles = self.assign_manager.element_bundles(ele)
+        if bundles and self.assign_manager.host_bundles(ele.ip) is None:
+            yield "lock", (ele.ip,), {}
+            if self.assign_manager.host_bundles(ele.ip) is None:
+                ret = yield "run", (SharedBundle.remote_list_cmd(self.assign_manager.remote_bash_path),), \
+                    dict(hide=True, idempotent=True)
+                self.assign_manager.add_host_bundles(ele.ip, ret.stdout.split())
+            yield "unlock", (ele.ip,), {}
+        if not install:
+            return bundles
+        for bundle in bundles:
+            yield "lock", (f"{ele.ip}/{bundle.name}",), {}
+            if self.__scp_zip_missing_bundles(ele, [bundle]):
+                yield "upload", (bundle.build(self.assign_manager.bundle_output),
+                                 self.assign_manager.remote_tmp_path), {}
+                yield "run", (" && ".join(bundle.remote_install_bashes(self.assign_manager.remote_bash_path,
+                                                                       self.assign_manager.remote_tmp_path)),), {}
+                self.assign_manager.add_host_bundles(ele.ip, [bundle.name])
+            yield "unlock", (f"{ele.ip}/{bundle.name}",), {}
+        return bundles
+
+    def __scp_zip_host_bundles(self, rc, ele):
+        """
+        组件引用的共享包, 首次使用时查询远程主机已安装的共享包
+        :param rc:  object <SshHost>
+        :param ele: object <Element>
+        :return: list<SharedBundle>
+        """
+        return self.__scp_zip_run(rc, self.__scp_zip_bundle_steps(ele, install=False))
+
+    def __scp_zip_run(self, rc, steps):
+        """
+        执行拷贝步骤, 访问控制使用 bundle_locks
+        :param rc:    object <SshHost>
+        :param steps: generator, 同 __scp_zip_steps
+        :return: 拷贝步骤的返回值
+        """
+        held = []
+        try:
+            result = None
+            while True:
+                op, args, kwargs = steps.send(result)
+                result = None
+                if op == "lock":
+                    lock = self.bundle_locks.get(*args)
+                    lock.acquire()
+                    held.append(lock)
+                elif op == "unlock":
+                    held.pop().release()
+                else:
+                    result = getattr(rc, op)(*args, **kwargs)
+        except StopIteration as e:
+            return e.value
+        finally:
+            steps.close()
+            for lock in held:
+                lock.release()
+
+    @staticmethod
+    async def __scp_zip_run_async(rc, steps, locks):
+        """
+        asyncio 后端执行拷贝步骤, 访问控制使用事件循环中的 asyncio.Lock
+        :param rc:    object <AsyncSshHost>
+        :param steps: generator, 同 __scp_zip_steps
+        :param locks: dict {key: asyncio.Lock}
+        :return: 拷贝步骤的返回值
+        """
+        held = []
+        try:
+            result = None
+            while True:
+                op, args, kwargs = steps.send(result)
+                result = None
+                if op == "lock":
+                    lock = locks.setdefault(args[0], asyncio.Lock())
+                    await lock.acquire()
+                    held.append(lock)
+                elif op == "unlock":
+                    held.pop().release()
+                else:
+                    result = await getattr(rc, op)(*args, **kwargs)
+        except StopIteration as e:
+            return e.value
+        finally:
+            steps.close()
+            for lock in held:
+                lock.release()
+
+    def __scp_zip_relay_bundles(self, *args, **kwargs):
+        """
+        汇总各主机尚未持有的共享包, 超过两台主机需要的共享包经树形中继分发后安装
+        :param args:
+        :param kwargs:
+            modules:    服务类型
+            hosts:      服务主机
+        :return:
+        """
+        lock = threading.Lock()
+        # {bundle name: (SharedBundle, OrderedDict {ip: Host})}
+        missing = OrderedDict()
+
+        def _missing(host=None, elements=None, **_kwargs):
+            rc = SshHost.getConnection(host)
+            for _, ele in elements:
+                if not self.assign_manager.is_dirty(ele):
+                    continue
+                for bundle in self.__scp_zip_missing_bundles(ele, self.__scp_zip_host_bundles(rc, ele)):
+                    with lock:
+                        missing.setdefault(bundle.name, (bundle, OrderedDict()))[1].setdefault(host.ip, host)
+
+        self.assign_manager.handle_host_func(_missing, *args, **kwargs)
+        for bundle, hosts in missing.values():
+            if len(hosts) <= 2:
+                continue
+            TreeRelay(list(hosts.values()), fanout=self.assign_manager.relay_fanout).distribute(
+                bundle.build(self.assign_manager.bundle_output), self.assign_manager.remote_tmp_path)
+            install = " && ".join(bundle.remote_install_bashes(self.assign_manager.remote_bash_path,
+                                                              self.assign_manager.remote_tmp_path))
+            executor = ParallelExecutor(max_workers=self.assign_manager.max_workers, per_host=1)
+            for ip, host in hosts.items():
+                executor.submit(bundle.name, ip, SshHost.getConnection(host).run, install)
+            result = executor.run()
+            result.summary(logger)
+            result.raise_for_failure()
+            for ip in hosts:
+                self.assign_manager.add_host_bundles(ip, [bundle.name])
+
+    def __scp_zip_digests(self, ele):
+        """
+        待拷贝文件的 sha256, 优先使用打包清单中记录的 sha256, 无需读取配置包
+        :param ele:  object <Element>
+        :return: OrderedDict {archive name: sha256}
+        """
+        members = ele.archive_members(not self.assign_manager.shared_bundle)
+        entries = PackageManifest.load(ele.absolute_manifest_path).entries
+        if self.assign_manager.stream_upload or any(name not in entries for name in members):
+            return file_digests(members)
+        return OrderedDict((name, entries[name]["sha256"]) for name in members)
+
+    @contextmanager
+    def __scp_zip_source(self, ele, changed=None):
+        """
+        待上传的配置包: 内存打包时为 file-like object, 否则为本地配置包路径
+        :param ele:  object <Element>
+        :param changed: 变化的文件, 为空时上传完整配置包
+        :return: (本地路径 或 file-like object, 远程路径)
+        """
+        remote = ele.remote_delta_os_path if changed else ele.remote_os_path
+        if not self.assign_manager.memory_package and not changed:
+            yield ele.absolute_zip_path, remote
+            return
+        members = ele.archive_members(not self.assign_manager.shared_bundle)
+        if changed:
+            members = OrderedDict((name, members[name]) for name in changed)
+        if not self.assign_manager.memory_package:
+            yield self.assign_manager.package_format.write(ele.absolute_delta_zip_path, members), remote
+            return
+        with self.assign_manager.open_package(members) as fp:
+            yield fp, remote
+
+    def __scp_zip_missing_bundles(self, ele, bundles):
+        """
+        组件引用的共享包中, 远程主机尚未持有的共享包
+        :param ele:  object <Element>
+        :param bundles: list<SharedBundle>
+        :return: list<SharedBundle>
+        """
+        installed = self.assign_manager.host_bundles(ele.ip) or set()
+        missing = [b for b in bundles if b.name not in installed]
+        for bundle in bundles:
+            if bundle.name in installed:
+                logger.info(f"[{ele.ip}] shared bundle {bundle.name} ({bundle.archive_path}) already installed.")
+        return missing
+
+    def __scp_zip_changed(self, ele, local_digests, remote_stdout):
+        """
+        对比本地文件与远程文件的 sha256, 获取需要上传的文件
+        :param ele:  object <Element>
+        :param local_digests: 本地文件 sha256
+        :param remote_stdout: 远程 sha256sum 输出
+        :return: None 全部上传; [] 远程文件全部一致, 无需上传; list 只上传变化的文件
+        """
+        changed = changed_files(local_digests, parse_digests(remote_stdout))
+        if not changed:
+            logger.info(f"[{ele.ip}] {ele.zip_name} is up to date, skip upload.")
+            return []
+        if len(changed) == len(local_digests):
+            return None
+        logger.info(f"[{ele.ip}] {ele.zip_name} {len(changed)}/{len(local_digests)} files changed, upload delta.")
+        return changed
 
     def scp_channel(self, *args, **kwargs):
         """
@@ -794,25 +1187,30 @@ class DeployContext(BaseContext):
             raise FileNotFoundError(f"{channel_genesis_path} not found!")
 
         def wrap_upload_file(_host, _src, _dest):
-            _ssh = SshHost.getConnection(_host)
-            _ssh.run(f"mkdir -p {_dest}")
-            _ssh.upload(_src, "/tmp")
-            _ssh.run(f"mv /tmp/{os.path.basename(_src)} {_dest}")
+            with SshHost.getConnection(_host).batch() as b:
+                b.upload(_src, "/tmp")
+                b.run(f"mkdir -p {_dest}")
+                b.run(f"mv /tmp/{os.path.basename(_src)} {_dest}")
 
         if orgs and isinstance(orgs, (list, tuple)):
             # for org in orgs:
-            for role_domain in self.assign_manager.get_org_elements("peer-cli", orgs):
-                wrap_upload_file(self.assign_manager.get_host(role_domain),
-                                 channel_genesis_path,
-                                 self.assign_manager.remote_bash_path)
-
+            to_do_hosts = [self.assign_manager.get_host(role_domain)
+                           for role_domain in self.assign_manager.get_org_elements("peer-cli", orgs)]
         elif hosts and isinstance(hosts, (list, tuple)):
-            for host in hosts:
-                wrap_upload_file(self.assign_manager.get_host(host),
-                                 channel_genesis_path,
-                                 self.assign_manager.remote_bash_path)
+            to_do_hosts = [self.assign_manager.get_host(host) for host in hosts]
         else:
-            pass
+            to_do_hosts = []
+
+        # 多台主机时经种子主机树形中继分发
+        if self.assign_manager.relay and len(to_do_hosts) > 2:
+            TreeRelay(to_do_hosts, fanout=self.assign_manager.relay_fanout).distribute(
+                channel_genesis_path, self.assign_manager.remote_bash_path)
+            return
+
+        for host in to_do_hosts:
+            wrap_upload_file(host,
+                             channel_genesis_path,
+                             self.assign_manager.remote_bash_path)
 
     # install functions
     def install(self, services=None, hosts=None, **kwargs):
@@ -936,24 +1334,62 @@ class DeployContext(BaseContext):
             else:
                 # 没有指定则安装 channel 下对应的所有 orgs
                 kwargs["orgs"] = list(custom_channel.get_org())
-            self.assign_manager.handle_func(self.__channel_install, "peer-cli", hosts=hosts, **kwargs)
+            # channel.block 由第一个节点生成, 需顺序执行
+            self.assign_manager.handle_func(self.__channel_install, "peer-cli", hosts=hosts, parallel=False, **kwargs)
 
         elif kwargs.get("extend", False):
-            extend_orgname = kwargs.get("extend_orgname", None)
-            if extend_orgname is None:
-                logger.error("param 'extend_orgname' must been provided!")
+            extend_orgnames = kwargs.get("extend_orgnames", None) or \
+                ([kwargs["extend_orgname"]] if kwargs.get("extend_orgname", None) else [])
+            if not extend_orgnames:
+                logger.error("param 'extend_orgname' or 'extend_orgnames' must been provided!")
                 return
-            # 将 org cert 更新至 channel
-            self.config_tx_ext_channel(channel=custom_channel.genesis_channelID, org=extend_orgname)
+            # 将所有 org cert 在一次 config update 中更新至 channel
+            self.config_tx_ext_channel(channel=custom_channel.genesis_channelID, orgs=extend_orgnames)
             # 添加 org 对应的 peer 加入 channel
-            self.assign_manager.handle_func(self.__channel_extend, modules="peer-cli", orgs=[extend_orgname], **kwargs)
+            self.assign_manager.handle_func(self.__channel_extend, modules="peer-cli", orgs=extend_orgnames,
+                                            parallel=False, **kwargs)
             # 添加 org 到 channel 中
-            custom_channel.add_org(extend_orgname)
+            for extend_orgname in extend_orgnames:
+                custom_channel.add_org(extend_orgname)
         elif kwargs.get("join", False):
-            self.assign_manager.handle_func(self.__channel_join, modules="peer-cli", hosts=hosts, **kwargs)
+            self.assign_manager.handle_func(self.__channel_join, modules="peer-cli", hosts=hosts, parallel=False, **kwargs)
         else:
             pass
 
+    def channels_install(self, *channel_ids):
+        """
+        生成 channel 交易文件, 创建 channel 并将 channel 下所有 peer 加入
+        channel_workers > 1 时:
+            1. 并发生成所有 channel.tx
+            2. channel 之间并发创建/加入, channel 内 peer 顺序加入(channel.block 由第一个节点生成)
+        :param channel_ids:
+        :return:
+        """
+        workers = self.assign_manager.channel_workers
+        if workers <= 1 or len(channel_ids) <= 1:
+            for channel_id in channel_ids:
+                self.config_tx_gen_channel(id=channel_id)
+                self.channel(channel_id=channel_id, install=True, )
+            return
+
+        # 1. configtxgen 为本地进程, channel 之间互不依赖
+        logger.info(f"generate tx of {len(channel_ids)} channels, channel workers: {workers}")
+        executor = ParallelExecutor(max_workers=workers, per_host=workers)
+        for channel_id in channel_ids:
+            executor.submit(channel_id, "localhost", self.config_tx_gen_channel, id=channel_id)
+        result = executor.run()
+        result.summary(logger)
+        result.raise_for_failure()
+
+        # 2. 任务均在本地调度, 远程 peer-cli 容器、主机及 orderer 的并发由 channel_locks 控制
+        logger.info(f"create & join {len(channel_ids)} channels, channel workers: {workers}")
+        executor = ParallelExecutor(max_workers=workers, per_host=workers)
+        for channel_id in channel_ids:
+            executor.submit(channel_id, "localhost", self.channel, channel_id=channel_id, install=True)
+        result = executor.run()
+        result.summary(logger)
+        result.raise_for_failure()
+
     def __channel_install(self, host=None, ele=None, **config):
         """
         install channel
@@ -970,6 +1406,14 @@ class DeployContext(BaseContext):
             raise AttributeError("custom_channel type must be <CustomChannel>!")
 
         logger.info(f"Channel<{custom_channel.genesis_channelID}> will to install on {ele.role_domain} {host}")
+        # 多个 channel 并发安装时, 同一 peer-cli 容器顺序执行, 同一主机并发数受 per_host_workers 限制
+        with self.channel_locks.hold(f"{host.ip}/{ele.docker_container_name}"), \
+                self.channel_locks.hold(host.ip, self.assign_manager.per_host_workers):
+            self.__channel_create_and_join(host, ele, custom_channel)
+
+        split_line(logger)
+
+    def __channel_create_and_join(self, host, ele, custom_channel):
         rc = SshHost.getConnection(host)
         tx_block_filename = f"{custom_channel.genesis_channelID}.block"
         tx_block_filepath = os.path.join(self.configtx_configurator.configtx_genesis, tx_block_filename)
@@ -982,10 +1426,11 @@ class DeployContext(BaseContext):
             rc.upload(custom_channel.filepath, "/tmp")
             # 移动 channel.tx 到 peer-cli 挂载目录下
             rc.run(f'sudo cp /tmp/{custom_channel.genesis_name} {ele.docker_container_volume}')
-            # 根据 channel.tx 创建 channel.block
-            rc.run(f'sudo docker exec {ele.docker_container_name} bash -c "cd /root/cli-data/ && '
-                   f'{tx_to_block_cmd % (custom_channel.genesis_channelID, custom_channel.genesis_name)}"',
-                   throw=False)
+            # 根据 channel.tx 创建 channel.block, 同一 orderer 上的 channel 创建顺序执行
+            with self.channel_locks.hold(self.assign_manager.first_orderer_service):
+                rc.run(f'sudo docker exec {ele.docker_container_name} bash -c "cd /root/cli-data/ && '
+                       f'{tx_to_block_cmd % (custom_channel.genesis_channelID, custom_channel.genesis_name)}"',
+                       throw=False)
             # 下载 channel.block 至本地
             remote_path = f"{ele.docker_container_volume}/{tx_block_filename}"
             # 复制到tmp下 并修改权限
@@ -1005,8 +1450,6 @@ class DeployContext(BaseContext):
         rc.run(f'sudo docker exec {ele.docker_container_name} bash -c "cd /root/cli-data/ && '
                f'peer channel join -b {tx_block_filename}"', throw=False)
 
-        split_line(logger)
-
     def __channel_extend(self, host=None, ele=None, **config):
         """
         extend channel, fetch channel block & join commands:
@@ -1124,15 +1567,18 @@ class DeployContext(BaseContext):
         :return:
         """
         # 0. 安装docker
+        SshHost.METRICS.begin_stage("install docker")
         self.install(services="docker")
 
         # 1. 生成证书
+        SshHost.METRICS.begin_stage("crypto gen")
         self.crypto_gen()
 
         # 2. 生成 docker-compose
         self.compose_gen(virtual_host=self._kwargs.get("virtual_host", False))
 
         # 3. 打包 & 拷贝
+        SshHost.METRICS.begin_stage("package & scp")
         to_do_modules = ("zookeeper", "kafka", "orderer",
                          "orderer-cli", "peer", "peer-cli", "explorer")
         self.compose_zip(*to_do_modules)
@@ -1145,22 +1591,28 @@ class DeployContext(BaseContext):
             channel_name=self.configtx_configurator.system_channel_id, orgs=["orderer"])
 
         # 4. 顺序安装 zookeeper & kafka & orderer & orderer-cli & peer & peer-cli 安装
+        SshHost.METRICS.begin_stage("install services")
         self.install(services=to_do_modules[:-1])
 
         # 5. channel 安装
+        SshHost.METRICS.begin_stage("channel install")
         channels = self.fabric_network["channels"]
         if channels and isinstance(channels, dict):
-            for channel_id in channels:
-                self.config_tx_gen_channel(id=channel_id)
-                self.channel(channel_id=channel_id, install=True, )
+            self.channels_install(*channels)
         else:
             logger.warning("Not found any channel!")
 
+        SshHost.METRICS.begin_stage("install explorer")
         self.install(services=to_do_modules[-1:])
 
         # 6. chain-code install and instantiate
+        SshHost.METRICS.begin_stage("chaincode")
         self.first_deploy_chaincode()
 
+        # 7. 远程操作统计 & 释放 ssh 连接
+        self.remote_report()
+        SshHost.close_all()
+
     def onekey_extend(self):
         """
         一键扩展 by extend.yaml， 执行顺序:
@@ -1172,26 +1624,32 @@ class DeployContext(BaseContext):
             5. new channels install
             6. extend channels
             7. channel install
+            8. exist channel install chaincode
+            9. remote operation report & close ssh connections
         :return:
         """
         logger.info("start to extend current fabric-network!")
         # 0. 新增主机 安装 docker
+        SshHost.METRICS.begin_stage("install docker")
         new_hosts = self.new_hosts()
         if new_hosts:
             self.install(services="docker", hosts=new_hosts)
 
         # 1. extend cert
+        SshHost.METRICS.begin_stage("crypto extend")
         if self.need_extend_cert():
             self.crypto_ext()
 
         new_peers = self.new_peers()
         new_organizations = self.new_organizations()
         # 2. gen docker-compose & package
+        SshHost.METRICS.begin_stage("package")
         if new_peers or new_organizations or self.need_extend_explorer():
             self.compose_gen(virtual_host=self._kwargs.get("virtual_host", False))
             self.compose_zip("peer", "peer-cli", "explorer")
 
         # 3. new peers install
+        SshHost.METRICS.begin_stage("new peers install")
         for org, peers in new_peers.items():
             if peers:
                 # scp;   note: 不能在指定hosts时指定多个 modules
@@ -1204,6 +1662,7 @@ class DeployContext(BaseContext):
                     self.channel(join=True, hosts=peers, channel_id=channel_id, orgs=[org])
 
         # 4. new organizations install
+        SshHost.METRICS.begin_stage("new organizations install")
         for org in new_organizations:
             # scp
             self.scp_zip(modules=("peer", "peer-cli"), orgs=[org])
@@ -1211,6 +1670,7 @@ class DeployContext(BaseContext):
             self.install(services=("peer", "peer-cli"), orgs=[org])
 
         # 5. new channels install
+        SshHost.METRICS.begin_stage("new channels install")
         for channel_id, consortium in self.new_channels():
             self.config_tx_ext_consortium(consortium)
             self.config_tx_gen_channel(id=channel_id)
@@ -1218,21 +1678,38 @@ class DeployContext(BaseContext):
             split_line(logger)
 
         # 6. extend channels
+        SshHost.METRICS.begin_stage("extend channels")
         for channel_id, orgs in self.new_extend_channels().items():
-            for org in orgs:
-                self.channel(extend=True, channel_id=channel_id, extend_orgname=org)
+            if orgs:
+                self.channel(extend=True, channel_id=channel_id, extend_orgnames=orgs)
                 split_line(logger)
 
         # 7. extend explorer
+        SshHost.METRICS.begin_stage("extend explorer")
         if self.need_extend_explorer():
             _m = ["explorer"]
             self.scp_zip(modules=_m)
             self.install(services=_m, restart=True)
 
         # 8. exist channel install chaincode
+        SshHost.METRICS.begin_stage("chaincode")
         self.extend_deploy_chaincode()
         split_line(logger)
 
+        # 9. 远程操作统计 & 释放 ssh 连接
+        self.remote_report()
+        SshHost.close_all()
+
+    def remote_report(self):
+        """
+        打印远程操作统计, 指定 metrics_json 时导出为 json
+        :return:
+        """
+        SshHost.METRICS.report(logger)
+        metrics_json = self._kwargs.get("metrics_json", None)
+        if metrics_json:
+            SshHost.METRICS.dump(metrics_json)
+
     def clean_all(self):
         """
         一键清除 services 和 本地配置
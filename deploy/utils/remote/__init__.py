@@ -7,6 +7,14 @@
 """
 
 from utils.remote.sshhost import SshHost, Host, HostPool
+from utils.remote.pool import SshConnectionPool
+from utils.remote.batch import RemoteBatch
+from utils.remote.transfer import SftpTransfer, TransferStats
+from utils.remote.metrics import RemoteMetrics, OpRecord
+from utils.remote.asynchost import AsyncSshHost, AsyncSshBridge, EventLoopThread
+from utils.remote.fake import FakeSshHost
 from utils.remote.docker import Docker
 
-__all__ = ["SshHost", "Docker", "Host", "HostPool"]
+__all__ = ["SshHost", "Docker", "Host", "HostPool", "AsyncSshHost", "AsyncSshBridge", "EventLoopThread",
+           "SshConnectionPool", "RemoteBatch", "SftpTransfer", "TransferStats",
+           "RemoteMetrics", "OpRecord", "FakeSshHost"]
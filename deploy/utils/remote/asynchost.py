@@ -0,0 +1,423 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+    基于 asyncio 的远程执行后端, 所有主机的 ssh 会话复用同一个事件循环:
+        - AsyncSshHost:  异步接口 run/sudo/upload/download
+        - AsyncSshBridge: 同步接口, 供现有调用方通过 SshHost.getConnection 使用
+"""
+import os
+import time
+import asyncio
+import logging
+import functools
+import threading
+from collections import OrderedDict
+from utils.remote.sshhost import SshHost, Host
+from utils.remote.transfer import TransferStats
+
+try:
+    import asyncssh
+except ImportError:
+    asyncssh = None
+
+logger = logging.getLogger(__name__)
+# asyncssh 默认 INFO 级别会输出每个 channel 的日志
+logging.getLogger("asyncssh").setLevel(logging.WARNING)
+
+
+def measure(op):
+    """
+    记录 AsyncSshHost 远程操作统计
+    :param op: 操作类型
+    :return:
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(self, *args, **kwargs):
+            start, result, error = time.time(), None, None
+            try:
+                result = await func(self, *args, **kwargs)
+                return result
+            except Exception as e:
+                error = e
+                raise
+            finally:
+                if op == "connect":
+                    target = f"{self.host.username}@{self.host.ip}"
+                elif op == "upload":
+                    target = args[1] if len(args) > 1 else kwargs.get("remote", None)
+                else:
+                    target = args[0] if args else None
+                SshHost.METRICS.record(self.host.ip, op, target, start, result=result, error=error)
+        return wrapper
+    return decorator
+
+
+class AsyncResult(object):
+    """
+    远程命令执行结果, 属性与 invoke.Result 保持一致
+    """
+    def __init__(self, command, stdout, stderr, exited, host=None):
+        self.command = command
+        self.stdout = stdout
+        self.stderr = stderr
+        self.exited = exited
+        self.host = host
+
+    @property
+    def return_code(self):
+        return self.exited
+
+    @property
+    def ok(self):
+        return self.exited == 0
+
+    @property
+    def failed(self):
+        return not self.ok
+
+    def __str__(self):
+        return f"Encountered a bad command exit code!\n\n" \
+            f"Command: '{self.command}'\n\n" \
+            f"Exit code: {self.exited}\n\n" \
+            f"Stdout:\n\n{self.stdout}\n\n" \
+            f"Stderr:\n\n{self.stderr}\n"
+
+    def __repr__(self):
+        return f"<AsyncResult: cmd={self.command!r} exited={self.exited}>"
+
+
+class EventLoopThread(object):
+    """
+    后台事件循环线程, 进程内唯一
+    """
+    _instance = None
+    _lock = threading.Lock()
+
+    @staticmethod
+    def instance():
+        with EventLoopThread._lock:
+            if EventLoopThread._instance is None:
+                EventLoopThread._instance = EventLoopThread()
+            return EventLoopThread._instance
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name="ssh-event-loop", daemon=True)
+        self.thread.start()
+
+    def call(self, coro, timeout=None):
+        """
+        在事件循环中执行协程并等待结果
+        :param coro:
+        :param timeout:
+        :return:
+        """
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result(timeout)
+
+
+class AsyncSshHost(object):
+    # 连接池
+    SSH_POOL_HOSTS = OrderedDict()
+    SSH_POOL_LOCK = None
+    # sudo 密码提示符
+    SUDO_PROMPT = "[sudo] password: "
+
+    @staticmethod
+    async def getConnection(host):
+        """获取连接"""
+        if not isinstance(host, Host):
+            raise AttributeError("required Object<utils.remote.Host>")
+        if AsyncSshHost.SSH_POOL_LOCK is None:
+            AsyncSshHost.SSH_POOL_LOCK = asyncio.Lock()
+        async with AsyncSshHost.SSH_POOL_LOCK:
+            if host.ip not in AsyncSshHost.SSH_POOL_HOSTS:
+                ssh = AsyncSshHost(host)
+                await ssh.connect()
+                AsyncSshHost.SSH_POOL_HOSTS[host.ip] = ssh
+            ssh = AsyncSshHost.SSH_POOL_HOSTS[host.ip]
+            if not ssh.is_alive():
+                logger.warning(f"[{host.ip}] ssh connection is not alive, reconnecting ...")
+                await ssh.connect()
+            return ssh
+
+    @staticmethod
+    async def close_all():
+        """关闭连接池中的所有连接"""
+        for ssh in list(AsyncSshHost.SSH_POOL_HOSTS.values()):
+            await ssh.close()
+        AsyncSshHost.SSH_POOL_HOSTS.clear()
+
+    def __init__(self, host):
+        if asyncssh is None:
+            raise ImportError("ssh backend<asyncssh> required, please run 'pip3 install asyncssh'")
+        self.host = host
+        self.conn = None
+
+    @measure("connect")
+    async def connect(self):
+        if not isinstance(self.host, Host):
+            raise AttributeError("required Object<utils.remote.Host>")
+        options = {"username": self.host.username, "known_hosts": None,
+                   "keepalive_interval": SshHost.KEEPALIVE}
+        if SshHost.COMPRESS:
+            options["compression_algs"] = ["zlib@openssh.com", "zlib", "none"]
+        if self.host.key:
+            options["client_keys"] = [self.host.key]
+        else:
+            options["password"] = self.host.password
+        self.conn = await asyncssh.connect(self.host.ip, **options)
+        return self.conn
+
+    def is_alive(self):
+        return self.conn is not None and not self.conn.is_closed()
+
+    async def _exec(self, cmd, password=None, hide=False):
+        """
+        执行远程命令
+        :param cmd:
+        :param password:  sudo 密码, 出现密码提示时写入 stdin
+        :param hide: 不打印远程输出
+        :return: <AsyncResult>
+        """
+        if not self.conn:
+            raise AttributeError("cannot login in remote ssh!")
+
+        async with self.conn.create_process(cmd) as proc:
+            stdout, stderr = [], []
+
+            async def _read(stream, chunks, watch=False):
+                answered = False
+                while True:
+                    data = await stream.read(4096)
+                    if not data:
+                        break
+                    chunks.append(data)
+                    if watch and not answered and AsyncSshHost.SUDO_PROMPT in "".join(chunks):
+                        proc.stdin.write(f"{password}\n")
+                        answered = True
+
+            await asyncio.gather(_read(proc.stdout, stdout),
+                                 _read(proc.stderr, stderr, watch=password is not None))
+            await proc.wait()
+            result = AsyncResult(cmd,
+                                 "".join(stdout),
+                                 "".join(stderr).replace(AsyncSshHost.SUDO_PROMPT, ""),
+                                 proc.exit_status if proc.exit_status is not None else -1,
+                                 host=self.host.ip)
+        if not hide:
+            if result.stdout.strip():
+                logger.info(result.stdout.strip())
+            if result.stderr.strip():
+                logger.info(result.stderr.strip())
+        return result
+
+    def _check(self, result, throw):
+        if result.failed:
+            if throw:
+                raise RuntimeError(result)
+            else:
+                logger.error(result)
+        return result
+
+    @measure("run")
+    async def run(self, cmd, throw=True, **kwargs):
+        logger.info(f"[{self.host.ip}] bash# {cmd}")
+        result = await self._exec(cmd, hide=kwargs.get("hide", False))
+        return self._check(result, throw)
+
+    @measure("sudo")
+    async def sudo(self, cmd, throw=True, **kwargs):
+        logger.info(f"[{self.host.ip}] bash# {cmd}")
+        result = await self._exec(f"sudo -S -p '{AsyncSshHost.SUDO_PROMPT}' {cmd}",
+                                  password=self.host.password or "",
+                                  hide=kwargs.get("hide", False))
+        return self._check(result, throw)
+
+    @measure("stream")
+    async def stream(self, cmd, producer, throw=True, idempotent=False):
+        """
+        执行远程命令, 并将 producer 生成的数据写入命令的 stdin
+        producer 为同步函数, 在线程池中执行, 数据经队列交给事件循环写入 channel
+        :param cmd: 远程命令
+        :param producer: producer(fileobj), 向 fileobj 写入数据
+        :param throw: 命令失败时是否抛出 RuntimeError
+        :return: <AsyncResult>
+        """
+        if not self.conn:
+            raise AttributeError("cannot login in remote ssh!")
+        logger.info(f"[{self.host.ip}] bash# {cmd} < stream")
+        loop = asyncio.get_event_loop()
+        queue = asyncio.Queue(maxsize=16)
+
+        class _Writer(object):
+            written = 0
+
+            def write(self, data):
+                asyncio.run_coroutine_threadsafe(queue.put(bytes(data)), loop).result()
+                _Writer.written += len(data)
+                return len(data)
+
+            def flush(self):
+                pass
+
+        def _produce():
+            try:
+                producer(_Writer())
+            finally:
+                asyncio.run_coroutine_threadsafe(queue.put(None), loop).result()
+
+        async with self.conn.create_process(cmd, encoding=None) as proc:
+            produced = loop.run_in_executor(None, _produce)
+            while True:
+                data = await queue.get()
+                if data is None:
+                    break
+                proc.stdin.write(data)
+                await proc.stdin.drain()
+            proc.stdin.write_eof()
+            await produced
+            completed = await proc.wait()
+        result = AsyncResult(cmd,
+                             (completed.stdout or b"").decode("utf-8", "replace"),
+                             (completed.stderr or b"").decode("utf-8", "replace"),
+                             completed.exit_status if completed.exit_status is not None else -1,
+                             host=self.host.ip)
+        result.bytes_out = _Writer.written
+        return self._check(result, throw)
+
+    @measure("download")
+    async def download(self, remote, local, **kwargs):
+        """
+        Download a file from the current connection to the local filesystem.
+        :param remote: Remote file to download.
+        :param local: Local path to store downloaded file in, or a file-like object.
+        :return: <utils.remote.transfer.TransferStats>
+        """
+        try:
+            if not self.conn:
+                raise AttributeError("cannot login in remote ssh!")
+            start = time.time()
+            async with self.conn.start_sftp_client() as sftp:
+                if isinstance(local, str):
+                    if os.path.isdir(local):
+                        local = os.path.join(local, os.path.basename(remote))
+                    stats = TransferStats("download", local, remote, self.host.ip)
+                    stats.latency = time.time() - start
+                    await sftp.get(remote, local, block_size=SshHost.CHUNK_SIZE)
+                    stats.bytes = os.path.getsize(local)
+                else:
+                    stats = TransferStats("download", local, remote, self.host.ip)
+                    stats.latency = time.time() - start
+                    async with sftp.open(remote, "rb") as fp:
+                        data = await fp.read()
+                        local.write(data)
+                        stats.bytes = len(data)
+            stats.duration = time.time() - start
+            logger.info(f"download file {remote} from {self.host.ip}, {stats}")
+            return stats
+        except (OSError, asyncssh.Error) as e:
+            if kwargs.get("throw", True):
+                raise RuntimeError(e)
+            else:
+                logger.error(e)
+
+    @measure("upload")
+    async def upload(self, local, remote, **kwargs):
+        """
+        Upload a file from the local filesystem to the current connection.
+        :param local: Local path of file to upload, or a file-like object.
+        :param remote: Remote path to which the local file will be written.
+        :return: <utils.remote.transfer.TransferStats>
+        """
+        try:
+            if not self.conn:
+                raise AttributeError("cannot login in remote ssh!")
+            logger.info(f"upload file {local} to {self.host.ip}")
+            start = time.time()
+            stats = TransferStats("upload", local, remote, self.host.ip)
+            async with self.conn.start_sftp_client() as sftp:
+                stats.latency = time.time() - start
+                if isinstance(local, str):
+                    await sftp.put(local, remote, block_size=SshHost.CHUNK_SIZE)
+                    stats.bytes = os.path.getsize(local)
+                else:
+                    data = local.read()
+                    async with sftp.open(remote, "wb") as fp:
+                        await fp.write(data)
+                    stats.bytes = len(data)
+            stats.duration = time.time() - start
+            logger.info(f"{stats}")
+            return stats
+        except (OSError, asyncssh.Error) as e:
+            if kwargs.get("throw", True):
+                raise RuntimeError(e)
+            else:
+                logger.error(e)
+
+    async def close(self):
+        if self.conn:
+            self.conn.close()
+            await self.conn.wait_closed()
+            self.conn = None
+
+
+class AsyncSshBridge(SshHost):
+    """
+    同步接口, 命令提交至后台事件循环执行; 所有主机共享同一个事件循环线程
+    """
+    ASYNC = True
+
+    def __init__(self, host):
+        if asyncssh is None:
+            raise ImportError("ssh backend<asyncssh> required, please run 'pip3 install asyncssh'")
+        self.host = host
+        self.conn = None
+        self.busy = 0
+        self.last_used = time.time()
+        self.loop = EventLoopThread.instance()
+
+    @staticmethod
+    def release_all():
+        if EventLoopThread._instance is not None:
+            EventLoopThread._instance.call(AsyncSshHost.close_all())
+
+    async def _call(self, method, *args, **kwargs):
+        self.busy += 1
+        self.last_used = time.time()
+        try:
+            ssh = await AsyncSshHost.getConnection(self.host)
+            return await getattr(ssh, method)(*args, **kwargs)
+        finally:
+            self.busy -= 1
+            self.last_used = time.time()
+
+    def is_alive(self):
+        # 存活探测与重连在 AsyncSshHost.getConnection 中完成
+        return True
+
+    def reconnect(self):
+        self.close()
+
+    def sudo(self, cmd, throw=True, **kwargs):
+        return self.loop.call(self._call("sudo", cmd, throw=throw, **kwargs))
+
+    def run(self, cmd, throw=True, **kwargs):
+        return self.loop.call(self._call("run", cmd, throw=throw, **kwargs))
+
+    def stream(self, cmd, producer, throw=True, idempotent=False):
+        return self.loop.call(self._call("stream", cmd, producer, throw=throw))
+
+    def download(self, remote, local, **kwargs):
+        return self.loop.call(self._call("download", remote, local, **kwargs))
+
+    def upload(self, local, remote, **kwargs):
+        return self.loop.call(self._call("upload", local, remote, **kwargs))
+
+    def close(self):
+        ssh = AsyncSshHost.SSH_POOL_HOSTS.pop(self.host.ip, None)
+        if ssh and self.loop.thread.is_alive():
+            self.loop.call(ssh.close())
+
+
+SshHost.register_backend("asyncssh", AsyncSshBridge)
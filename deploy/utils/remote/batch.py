@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+    远程批量执行: 在同一个 ssh 会话中依次执行命令与文件传输
+        - 连续的命令合并为一个 shell 脚本执行, 一次往返
+        - 紧跟命令的下载在同一个脚本中以 base64 输出返回, 不单独往返, 其后的命令(如 rm -f)继续合并
+        - 其余文件传输复用连接上的 sftp 会话
+        - 遇到失败的操作立即停止, 返回每个操作的执行结果
+
+    eg:
+        with SshHost.getConnection(host).batch() as b:
+            b.upload(local_pb, "/tmp")
+            b.sudo(f"mv /tmp/{filename} {remote_path}")
+            b.sudo(sign_cmd)
+        b.results
+"""
+import os
+import re
+import uuid
+import shlex
+import base64
+import logging
+from invoke import Result
+from .transfer import TransferStats
+
+logger = logging.getLogger(__name__)
+
+
+class RemoteBatch(object):
+    RUN = "run"
+    SUDO = "sudo"
+    UPLOAD = "upload"
+    DOWNLOAD = "download"
+
+    def __init__(self, ssh):
+        """
+        :param ssh: <utils.remote.SshHost>
+        """
+        self.ssh = ssh
+        self.ops = []
+        self.results = []
+
+    def run(self, cmd):
+        self.ops.append((RemoteBatch.RUN, cmd))
+        return self
+
+    def sudo(self, cmd):
+        self.ops.append((RemoteBatch.SUDO, cmd))
+        return self
+
+    def upload(self, local, remote):
+        self.ops.append((RemoteBatch.UPLOAD, (local, remote)))
+        return self
+
+    def download(self, remote, local, inline=True):
+        """
+        :param remote: 远程文件
+        :param local:  本地文件路径, 或 file-like object
+        :param inline: 紧跟命令时经命令输出返回文件内容, 大文件应设为 False 使用 sftp 下载
+        """
+        self.ops.append((RemoteBatch.DOWNLOAD, (remote, local, inline)))
+        return self
+
+    def __segments(self):
+        """
+        连续的同类命令(run/sudo)合并为一段, 紧跟命令的 inline 下载并入该段, 其余文件传输单独成段
+        :return: [(kind, [args, ...]), ...], 命令段中的下载为 (remote, local)
+        """
+        segments = []
+        for kind, args in self.ops:
+            if kind == RemoteBatch.DOWNLOAD:
+                remote, local, inline = args
+                if inline and segments and segments[-1][0] in (RemoteBatch.RUN, RemoteBatch.SUDO):
+                    segments[-1][1].append((remote, local))
+                else:
+                    segments.append((kind, [(remote, local)]))
+            elif segments and kind in (RemoteBatch.RUN, RemoteBatch.SUDO) and segments[-1][0] == kind:
+                segments[-1][1].append(args)
+            else:
+                segments.append((kind, [args]))
+        return segments
+
+    def __save(self, remote, local, result):
+        """
+        保存 inline 下载的文件内容
+        :param result: base64 命令的执行结果
+        :return: <TransferStats>
+        """
+        data = base64.b64decode(result.stdout)
+        stats = TransferStats("download", local, remote, self.ssh.host.ip)
+        if isinstance(local, str):
+            if not local or local.endswith(os.sep) or os.path.isdir(local):
+                local = os.path.join(local or os.getcwd(), os.path.basename(remote))
+                stats.local = local
+            if os.path.dirname(local) and not os.path.exists(os.path.dirname(local)):
+                os.makedirs(os.path.dirname(local))
+            with open(local, "wb") as fp:
+                fp.write(data)
+        else:
+            local.write(data)
+        stats.bytes = len(data)
+        stats.chunks = 1
+        logger.info(f"download file {remote} from {self.ssh.host.ip} inline, {stats}")
+        return stats
+
+    @staticmethod
+    def script(cmds, marker):
+        """
+        生成批量执行脚本, 每条命令前后输出分隔标记, 命令失败时以其退出码结束脚本
+        :param cmds:
+        :param marker:
+        :return:
+        """
+        lines = []
+        for i, cmd in enumerate(cmds):
+            lines.append(f"echo '{marker}{i}'; echo '{marker}{i}' >&2")
+            lines.append(f"(\n{cmd}\n)")
+            lines.append(f"__rc=$?; echo \"{marker}{i}:$__rc\"; [ $__rc -eq 0 ] || exit $__rc")
+        return "\n".join(lines)
+
+    @staticmethod
+    def split(cmds, marker, stdout, stderr):
+        """
+        按分隔标记拆分脚本输出, 生成每条命令的执行结果; 未执行的命令不返回结果
+        :return: [<invoke.Result>, ...]
+        """
+        results = []
+        for i, cmd in enumerate(cmds):
+            out = re.search(rf"(?s){marker}{i}\n(.*?)\n?{marker}{i}:(\d+)\n", stdout)
+            if not out:
+                break
+            err = re.search(rf"(?s){marker}{i}\n(.*?)(?=\n?{marker}{i + 1}\n|$)", stderr)
+            results.append(Result(stdout=out.group(1), stderr=err.group(1) if err else "",
+                                  command=cmd, exited=int(out.group(2))))
+        return results
+
+    def __execute_cmds(self, kind, ops):
+        """
+        :param ops: [command 或 inline 下载 (remote, local)]
+        :return: 每个已执行操作的结果, 命令为 <invoke.Result>, 下载成功时为 <TransferStats>
+        """
+        marker = f"__batch_{uuid.uuid4().hex[:8]}_"
+        cmds = [f"base64 {shlex.quote(op[0])}" if isinstance(op, tuple) else op for op in ops]
+        script = f"bash -c {shlex.quote(RemoteBatch.script(cmds, marker))}"
+        for cmd in cmds:
+            logger.info(f"[{self.ssh.host.ip}] bash# {cmd}")
+        execute = self.ssh.sudo if kind == RemoteBatch.SUDO else self.ssh.run
+        ret = execute(script, throw=False, warn=True, hide=True)
+        results = RemoteBatch.split(cmds, marker, ret.stdout, ret.stderr)
+        if len(results) < len(cmds) and (not results or results[-1].ok):
+            # 脚本异常退出, 当前命令没有输出结束标记
+            results.append(Result(stdout="", stderr=ret.stderr, command=cmds[len(results)], exited=ret.exited or -1))
+        for i, result in enumerate(results):
+            if isinstance(ops[i], tuple) and result.ok:
+                results[i] = self.__save(*ops[i], result)
+                continue
+            if result.stdout.strip():
+                logger.info(result.stdout.strip())
+            if result.stderr.strip():
+                logger.info(result.stderr.strip())
+        return results
+
+    def execute(self, throw=True):
+        """
+        依次执行所有操作, 遇到失败的操作停止执行
+        :param throw: 失败时是否抛出 RuntimeError
+        :return: 每个已执行操作的结果列表, 命令为 <invoke.Result>, 文件传输为 upload/download 的返回值
+        """
+        ops, self.ops = self.__segments(), []
+        self.results = []
+        for kind, args in ops:
+            if kind in (RemoteBatch.RUN, RemoteBatch.SUDO):
+                results = self.__execute_cmds(kind, args)
+                self.results.extend(results)
+                if results and isinstance(results[-1], Result) and results[-1].failed:
+                    if throw:
+                        raise RuntimeError(results[-1])
+                    logger.error(results[-1])
+                    break
+            elif kind == RemoteBatch.UPLOAD:
+                self.results.append(self.ssh.upload(*args[0], throw=throw))
+            else:
+                self.results.append(self.ssh.download(*args[0], throw=throw))
+        return self.results
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is None:
+            self.execute()
@@ -0,0 +1,569 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+    进程内模拟的远程执行后端, 用于编排逻辑的测试与基准测试:
+        - 每台主机的文件落地到 FakeSshHost.ROOT/<ip>/ 下, $HOME 映射为 /home/<user>
+        - 记录所有执行的命令与文件传输
+        - 模拟 cd/mkdir/mv/cp/rm/touch/ls/unzip/tar/sha256sum/base64/curl 的文件效果, 其余命令直接返回成功
+        - 可配置往返延迟、带宽、命令失败与会话断开的注入
+
+    eg:
+        FakeSshHost.configure(latency=0.05, bandwidth=10 * 1024 * 1024)
+        SshHost.use_backend("fake")
+"""
+import io
+import os
+import re
+import time
+import shlex
+import base64
+import random
+import shutil
+import hashlib
+import tarfile
+import tempfile
+import threading
+from zipfile import ZipFile
+from invoke import Result, UnexpectedExit
+from utils.remote.sshhost import SshHost, Host
+
+
+class FakeFile(object):
+    """
+    sftp 文件, 读写本地模拟文件并按带宽延迟
+    """
+    def __init__(self, path, mode):
+        self.fp = open(path, mode)
+        self.path = path
+
+    def set_pipelined(self, pipelined=True):
+        pass
+
+    def prefetch(self, file_size=None):
+        pass
+
+    def stat(self):
+        return os.stat(self.path)
+
+    def read(self, size=-1):
+        data = self.fp.read(size)
+        FakeSshHost.transfer_delay(len(data))
+        return data
+
+    def write(self, data):
+        FakeSshHost.transfer_delay(len(data))
+        return self.fp.write(data)
+
+    def close(self):
+        self.fp.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class FakeSftp(object):
+    def __init__(self, host):
+        self.host = host
+
+    def open(self, path, mode="r"):
+        FakeSshHost.delay()
+        local = FakeSshHost.local_path(self.host, path)
+        if "w" in mode:
+            os.makedirs(os.path.dirname(local), exist_ok=True)
+        return FakeFile(local, mode)
+
+    def stat(self, path):
+        return os.stat(FakeSshHost.local_path(self.host, path))
+
+    def chmod(self, path, mode):
+        os.chmod(FakeSshHost.local_path(self.host, path), mode)
+
+
+class FakeChannel(object):
+    """
+    exec channel, 关闭写端时执行命令
+    """
+    def __init__(self, conn):
+        self.conn = conn
+        self.cmd = None
+        self.stdin = io.BytesIO()
+        self.result = None
+
+    def exec_command(self, cmd):
+        self.cmd = cmd
+
+    def makefile(self, mode="rb"):
+        if "w" in mode:
+            channel = self
+
+            class _Stdin(object):
+                def write(self, data):
+                    FakeSshHost.transfer_delay(len(data))
+                    return channel.stdin.write(data)
+
+                def flush(self):
+                    pass
+            return _Stdin()
+        return io.BytesIO(self.result.stdout.encode("utf-8"))
+
+    def makefile_stderr(self, mode="rb"):
+        return io.BytesIO(self.result.stderr.encode("utf-8"))
+
+    def shutdown_write(self):
+        self.result = self.conn.execute(self.cmd, stdin=self.stdin.getvalue())
+
+    def recv_exit_status(self):
+        return self.result.exited
+
+    def close(self):
+        pass
+
+
+class FakeTransport(object):
+    def __init__(self, conn):
+        self.conn = conn
+
+    def open_session(self):
+        return FakeChannel(self.conn)
+
+    def is_active(self):
+        return self.conn.is_connected
+
+    def send_ignore(self):
+        pass
+
+    def set_keepalive(self, interval):
+        pass
+
+
+class FakeConnection(object):
+    """
+    模拟 fabric.Connection
+    """
+    def __init__(self, host):
+        self.host = host
+        self.is_connected = False
+        self.transport = None
+
+    def open(self):
+        FakeSshHost.delay(FakeSshHost.HANDSHAKE_RTT)
+        for path in ("/tmp", FakeSshHost.home(self.host)):
+            os.makedirs(FakeSshHost.local_path(self.host, path), exist_ok=True)
+        self.is_connected = True
+        self.transport = FakeTransport(self)
+
+    def close(self):
+        self.is_connected = False
+        self.transport = None
+
+    def sftp(self):
+        return FakeSftp(self.host)
+
+    def run(self, cmd, warn=False, **kwargs):
+        result = self.execute(cmd)
+        if result.failed and not warn:
+            raise UnexpectedExit(result)
+        return result
+
+    def sudo(self, cmd, warn=False, **kwargs):
+        return self.run(cmd, warn=warn, **kwargs)
+
+    def execute(self, cmd, stdin=None):
+        """
+        执行命令: 延迟、失败注入、记录、模拟文件效果
+        :return: <invoke.Result>
+        """
+        FakeSshHost.delay()
+        FakeSshHost.record(self.host.ip, "exec", cmd)
+        if FakeSshHost.maybe(FakeSshHost.DROP_RATE):
+            self.close()
+            raise EOFError(f"fake session to {self.host.ip} dropped")
+        for pattern, exited in FakeSshHost.FAILURES:
+            if re.search(pattern, cmd):
+                return Result(stdout="", stderr=f"fake failure: {pattern}", command=cmd, exited=exited)
+        if FakeSshHost.maybe(FakeSshHost.FAILURE_RATE):
+            return Result(stdout="", stderr="fake random failure", command=cmd, exited=1)
+        exited, stdout, stderr = FakeShell(self.host, stdin).execute(cmd)
+        return Result(stdout=stdout, stderr=stderr, command=cmd, exited=exited)
+
+
+class FakeShellError(Exception):
+    def __init__(self, message, stdout=""):
+        super(FakeShellError, self).__init__(message)
+        self.stdout = stdout
+
+
+class FakeShell(object):
+    """
+    模拟 shell: 支持 bash -c、; && || & 连接的命令、变量与 $?、简单重定向,
+    cd/mkdir/mv/cp/rm/touch/ls/unzip/tar/sha256sum/base64/echo/test/exit 及 http.server/curl/kill 模拟文件效果, 其余命令直接成功
+    """
+    # 模拟的 http 服务 (ip, port) => 本地目录
+    SERVERS = {}
+    # 模拟的 http 服务进程 (ip, pid) => (ip, port)
+    PIDS = {}
+
+    def __init__(self, host, stdin=None):
+        self.host = host
+        self.stdin = stdin
+        self.cwd = FakeSshHost.home(host)
+        self.env = {"HOME": FakeSshHost.home(host), "USER": host.username}
+        self.stdout = []
+        self.stderr = []
+
+    def path(self, p):
+        if not p.startswith("/"):
+            p = f"{self.cwd}/{p}"
+        return FakeSshHost.local_path(self.host, p)
+
+    def expand(self, word):
+        return re.sub(r"\$(\?|!|\{?(\w+)\}?)",
+                      lambda m: str(self.env.get("?" if m.group(1) == "?" else m.group(2) or m.group(1), "")), word)
+
+    @staticmethod
+    def statements(script):
+        """
+        拆分为 [(操作符, 命令参数)], 操作符为前一条命令与本命令的连接符
+        """
+        result = []
+        for line in script.splitlines():
+            # 丢弃至 /dev/null 或 合并到 stdout 的重定向, 标记输出至 stderr 的命令
+            line = re.sub(r"\d?>\s*/dev/null|\d?>&1|<\s*/dev/null", " ", line)
+            line = re.sub(r"1?>&2", " __stderr__ ", line)
+            lex = shlex.shlex(line, posix=True, punctuation_chars=";&|(){}")
+            lex.whitespace_split = True
+            op, args = ";", []
+            for token in lex:
+                if token in (";", "&&", "||", "&"):
+                    if args:
+                        result.append((op, args))
+                    op, args = ";" if token == "&" else token, []
+                elif token not in ("(", ")", "{", "}"):
+                    args.append(token)
+            if args:
+                result.append((op, args))
+        return result
+
+    def execute(self, cmd):
+        """
+        :return: (exited, stdout, stderr)
+        """
+        rc = 0
+        try:
+            words = shlex.split(cmd) if "\n" in cmd else []
+            if len(words) == 3 and words[:2] in (["bash", "-c"], ["sh", "-c"]):
+                # 多行脚本
+                cmd = words[2]
+            for op, args in self.statements(cmd):
+                if (op == "&&" and rc != 0) or (op == "||" and rc == 0):
+                    continue
+                to_stderr = "__stderr__" in args
+                args = [a for a in args if a != "__stderr__"]
+                args = [self.expand(a) for a in args]
+                while args and args[0] in ("sudo", "nohup"):
+                    args = args[1:]
+                if not args:
+                    continue
+                if args[0] == "exit":
+                    rc = int(args[1]) if len(args) > 1 else rc
+                    break
+                if re.match(r"^\w+=", args[0]):
+                    name, value = args[0].split("=", 1)
+                    self.env[name] = value
+                    rc = 0
+                    continue
+                if args[0] in ("bash", "sh") and len(args) > 2 and args[1] == "-c":
+                    shell = FakeShell(self.host, self.stdin)
+                    rc, out, err = shell.execute(args[2])
+                    self.stdout.append(out)
+                    self.stderr.append(err)
+                else:
+                    try:
+                        out, rc = self.command(args), 0
+                    except FakeShellError as e:
+                        out, rc = e.stdout, 1
+                        if str(e):
+                            self.stderr.append(f"{e}\n")
+                    (self.stderr if to_stderr else self.stdout).append(out)
+                self.env["?"] = rc
+        except (OSError, ValueError) as e:
+            rc = 1
+            self.stderr.append(f"{e}\n")
+        return rc, "".join(self.stdout), "".join(self.stderr)
+
+    def command(self, args):
+        name, params = args[0], args[1:]
+        opts = [p for p in params if p.startswith("-") and p != "-"]
+        paths = [p for p in params if (not p.startswith("-") or p == "-")]
+        if name == "cd" and paths:
+            if not os.path.isdir(self.path(paths[0])):
+                raise FakeShellError(f"cd: {paths[0]}: No such file or directory")
+            self.cwd = paths[0] if paths[0].startswith("/") else f"{self.cwd}/{paths[0]}"
+        elif name == "mkdir":
+            for p in paths:
+                os.makedirs(self.path(p), exist_ok=True)
+        elif name in ("mv", "cp") and len(paths) >= 2:
+            src, dst = self.path(paths[0]), self.path(paths[-1])
+            if not os.path.exists(src):
+                raise FakeShellError(f"{name}: cannot stat '{paths[0]}': No such file or directory")
+            if os.path.isdir(dst):
+                dst = os.path.join(dst, os.path.basename(src))
+            os.makedirs(os.path.dirname(dst), exist_ok=True)
+            if name == "mv":
+                shutil.move(src, dst)
+            elif os.path.isdir(src):
+                shutil.copytree(src, dst)
+            else:
+                shutil.copy(src, dst)
+        elif name == "rm":
+            for p in paths:
+                local = self.path(p)
+                if os.path.isdir(local) and any("r" in o for o in opts):
+                    shutil.rmtree(local, ignore_errors=True)
+                elif os.path.isfile(local):
+                    os.remove(local)
+        elif name == "unzip" and paths:
+            dest = self.path(params[params.index("-d") + 1]) if "-d" in params else self.path(".")
+            with ZipFile(self.path(paths[0])) as zf:
+                zf.extractall(dest)
+        elif name == "tar" and paths and any("x" in o for o in opts):
+            dest = self.path(params[params.index("-C") + 1]) if "-C" in params else self.path(".")
+            if paths[0] == "-":
+                fileobj = io.BytesIO(self.stdin or b"")
+            elif os.path.isfile(self.path(paths[0])):
+                fileobj = open(self.path(paths[0]), "rb")
+            else:
+                raise FakeShellError(f"tar: {paths[0]}: Cannot open: No such file or directory")
+            with fileobj, tarfile.open(fileobj=fileobj, mode="r|*") as tf:
+                tf.extractall(dest)
+        elif name == "sha256sum":
+            lines, missing = [], []
+            for p in paths:
+                local = self.path(p)
+                if os.path.isfile(local):
+                    with open(local, "rb") as fp:
+                        lines.append(f"{hashlib.sha256(fp.read()).hexdigest()}  {p}\n")
+                else:
+                    missing.append(f"sha256sum: {p}: No such file or directory")
+            if missing:
+                raise FakeShellError("\n".join(missing), stdout="".join(lines))
+            return "".join(lines)
+        elif name == "touch":
+            for p in paths:
+                os.makedirs(os.path.dirname(self.path(p)), exist_ok=True)
+                with open(self.path(p), "a"):
+                    pass
+        elif name == "ls":
+            lines = []
+            for p in paths or ["."]:
+                local = self.path(p)
+                if not os.path.exists(local):
+                    raise FakeShellError(f"ls: cannot access '{p}': No such file or directory")
+                lines.extend(sorted(os.listdir(local)) if os.path.isdir(local) else [p])
+            return "".join(f"{line}\n" for line in lines)
+        elif name == "base64" and paths:
+            if not os.path.isfile(self.path(paths[0])):
+                raise FakeShellError(f"base64: {paths[0]}: No such file or directory")
+            with open(self.path(paths[0]), "rb") as fp:
+                return base64.encodebytes(fp.read()).decode()
+        elif name == "echo":
+            return " ".join(params) + "\n"
+        elif name in ("test", "[") and not self.test([p for p in params if p != "]"]):
+            raise FakeShellError("")
+        elif name == "false":
+            raise FakeShellError("")
+        elif name.startswith("python") and "http.server" in params:
+            port = params[params.index("http.server") + 1] if params[-1] != "http.server" else "8000"
+            FakeShell.SERVERS[(self.host.ip, port)] = self.path(".")
+            self.env["!"] = 10000 + len(FakeShell.SERVERS)
+            FakeShell.PIDS[(self.host.ip, str(self.env["!"]))] = (self.host.ip, port)
+        elif name == "kill":
+            for pid in paths:
+                FakeShell.SERVERS.pop(FakeShell.PIDS.pop((self.host.ip, pid), None), None)
+        elif name == "curl" and "-o" in params:
+            m = re.match(r"https?://([^:/]+):?(\d*)/(.*)", next(p for p in params if "://" in p))
+            root = FakeShell.SERVERS.get((m.group(1), m.group(2) or "80"))
+            if not root or not os.path.isfile(os.path.join(root, m.group(3))):
+                raise FakeShellError(f"curl: (7) Failed to connect to {m.group(1)}")
+            data = open(os.path.join(root, m.group(3)), "rb").read()
+            FakeSshHost.transfer_delay(len(data))
+            output = self.path(params[params.index("-o") + 1])
+            with open(output, "wb") as fp:
+                fp.write(data)
+        return ""
+
+    def test(self, params):
+        if not params:
+            return False
+        if params[0] == "!":
+            return not self.test(params[1:])
+        if len(params) == 2:
+            flag, value = params
+            return {
+                "-e": lambda: os.path.exists(self.path(value)),
+                "-f": lambda: os.path.isfile(self.path(value)),
+                "-d": lambda: os.path.isdir(self.path(value)),
+                "-x": lambda: True,
+                "-z": lambda: not value,
+                "-n": lambda: bool(value),
+            }.get(flag, lambda: False)()
+        if len(params) == 3:
+            left, op, right = params
+            if op in ("=", "=="):
+                return left == right
+            if op == "!=":
+                return left != right
+            ops = {"-eq": int.__eq__, "-ne": int.__ne__, "-lt": int.__lt__,
+                   "-le": int.__le__, "-gt": int.__gt__, "-ge": int.__ge__}
+            if op in ops:
+                return ops[op](int(left), int(right))
+        return bool(params[0])
+
+
+class FakeSshHost(SshHost):
+    # 模拟主机文件根目录
+    ROOT = None
+    # 单次往返延迟(秒)
+    LATENCY = 0.0
+    # 建立连接的往返次数
+    HANDSHAKE_RTT = 3
+    # 带宽 bytes/s, None 为不限制
+    BANDWIDTH = None
+    # 命令失败注入 [(pattern, exit code)]
+    FAILURES = []
+    # 命令随机失败、会话随机断开的概率
+    FAILURE_RATE = 0.0
+    DROP_RATE = 0.0
+    # 执行记录 [(ip, op, target)]
+    RECORDS = []
+    LOCK = threading.Lock()
+    RANDOM = random.Random()
+
+    @staticmethod
+    def configure(root=None, latency=None, bandwidth=None, failures=None,
+                  failure_rate=None, drop_rate=None, seed=None):
+        """
+        模拟参数配置
+        :param root: 模拟主机文件根目录, 默认临时目录
+        :param latency: 单次往返延迟(秒)
+        :param bandwidth: 带宽 bytes/s
+        :param failures: [(pattern, exit code)], 匹配的命令返回指定退出码
+        :param failure_rate: 命令随机失败概率
+        :param drop_rate: 会话随机断开概率
+        :param seed: 随机种子
+        :return:
+        """
+        if root:
+            FakeSshHost.ROOT = root
+        if latency is not None:
+            FakeSshHost.LATENCY = latency
+        if bandwidth is not None:
+            FakeSshHost.BANDWIDTH = bandwidth or None
+        if failures is not None:
+            FakeSshHost.FAILURES = list(failures)
+        if failure_rate is not None:
+            FakeSshHost.FAILURE_RATE = failure_rate
+        if drop_rate is not None:
+            FakeSshHost.DROP_RATE = drop_rate
+        if seed is not None:
+            FakeSshHost.RANDOM.seed(seed)
+
+    @staticmethod
+    def reset():
+        """
+        清空执行记录及模拟参数
+        :return:
+        """
+        FakeSshHost.LATENCY = 0.0
+        FakeSshHost.BANDWIDTH = None
+        FakeSshHost.FAILURES = []
+        FakeSshHost.FAILURE_RATE = 0.0
+        FakeSshHost.DROP_RATE = 0.0
+        with FakeSshHost.LOCK:
+            FakeSshHost.RECORDS = []
+        FakeShell.SERVERS.clear()
+        FakeShell.PIDS.clear()
+
+    @staticmethod
+    def root():
+        if not FakeSshHost.ROOT:
+            FakeSshHost.ROOT = tempfile.mkdtemp(prefix="fake-ssh-")
+        return FakeSshHost.ROOT
+
+    @staticmethod
+    def home(host):
+        return f"/home/{host.username}"
+
+    @staticmethod
+    def local_path(host, path):
+        """
+        远程路径对应的本地模拟路径
+        """
+        path = path.replace("$HOME", FakeSshHost.home(host))
+        if not path.startswith("/"):
+            path = f"{FakeSshHost.home(host)}/{path}"
+        return os.path.join(FakeSshHost.root(), host.ip, os.path.normpath(path).lstrip("/"))
+
+    @staticmethod
+    def delay(rtt=1):
+        if FakeSshHost.LATENCY:
+            time.sleep(FakeSshHost.LATENCY * rtt)
+
+    @staticmethod
+    def transfer_delay(size):
+        if FakeSshHost.BANDWIDTH and size:
+            time.sleep(size / FakeSshHost.BANDWIDTH)
+
+    @staticmethod
+    def maybe(rate):
+        if not rate:
+            return False
+        with FakeSshHost.LOCK:
+            return FakeSshHost.RANDOM.random() < rate
+
+    @staticmethod
+    def record(ip, op, target):
+        with FakeSshHost.LOCK:
+            FakeSshHost.RECORDS.append((ip, op, target))
+
+    @staticmethod
+    def commands(ip=None):
+        """
+        已执行的命令
+        :param ip: 只返回指定主机的命令
+        :return: list
+        """
+        with FakeSshHost.LOCK:
+            return [t for i, op, t in FakeSshHost.RECORDS if op == "exec" and (ip is None or i == ip)]
+
+    def connect(self, host):
+        if isinstance(host, Host):
+            return FakeConnection(host)
+        else:
+            raise AttributeError("required Object<utils.remote.Host>")
+
+    def is_alive(self):
+        return self.conn is not None
+
+    def _open(self):
+        if not self.conn:
+            raise AttributeError("cannot login in remote ssh!")
+        if not self.conn.is_connected:
+            start = time.time()
+            self.conn.open()
+            SshHost.METRICS.record(self.host.ip, "connect", f"{self.host.username}@{self.host.ip}", start)
+            FakeSshHost.record(self.host.ip, "connect", self.host.ip)
+
+    def upload(self, local, remote, **kwargs):
+        FakeSshHost.record(self.host.ip, "upload", remote)
+        return super(FakeSshHost, self).upload(local, remote, **kwargs)
+
+    def download(self, remote, local, **kwargs):
+        FakeSshHost.record(self.host.ip, "download", remote)
+        return super(FakeSshHost, self).download(remote, local, **kwargs)
+
+
+SshHost.register_backend("fake", FakeSshHost)
@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+    远程操作统计: 记录每次 connect/run/sudo/upload/download/stream 的
+        主机、耗时、退出码、收发字节数、重试次数及所属部署阶段,
+    部署结束时按主机、阶段、操作类型汇总输出, 可导出为 json
+"""
+import json
+import time
+import logging
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+class OpRecord(object):
+    """
+    单次远程操作记录
+    """
+    def __init__(self, host, op, target, stage, start, duration,
+                 exited=None, bytes_in=0, bytes_out=0, retries=0, error=None):
+        """
+        :param host: 主机 ip
+        :param op: connect/run/sudo/upload/download/stream
+        :param target: 命令 或 文件路径
+        :param stage: 部署阶段
+        :param start: 开始时间戳
+        :param duration: 耗时(秒)
+        :param exited: 命令退出码
+        :param bytes_in: 接收字节数(stdout/stderr, 下载)
+        :param bytes_out: 发送字节数(上传, stdin)
+        :param retries: 会话断开重试次数
+        :param error: 失败原因
+        """
+        self.host = host
+        self.op = op
+        self.target = target
+        self.stage = stage
+        self.start = start
+        self.duration = duration
+        self.exited = exited
+        self.bytes_in = bytes_in
+        self.bytes_out = bytes_out
+        self.retries = retries
+        self.error = error
+
+    @property
+    def ok(self):
+        return self.error is None and self.exited in (None, 0)
+
+    def to_dict(self):
+        return OrderedDict([
+            ("host", self.host), ("op", self.op), ("target", self.target), ("stage", self.stage),
+            ("start", round(self.start, 3)), ("duration", round(self.duration, 3)), ("exited", self.exited),
+            ("bytes_in", self.bytes_in), ("bytes_out", self.bytes_out), ("retries", self.retries),
+            ("ok", self.ok), ("error", self.error),
+        ])
+
+
+class RemoteMetrics(object):
+    def __init__(self):
+        self.records = []
+        self.stage = None
+        self.lock = threading.Lock()
+
+    def begin_stage(self, stage):
+        """
+        设置当前部署阶段, 之后的远程操作记录归属该阶段
+        :param stage:
+        :return:
+        """
+        self.stage = stage
+
+    def clear(self):
+        with self.lock:
+            self.records = []
+            self.stage = None
+
+    def record(self, host, op, target, start, result=None, error=None, retries=0):
+        """
+        记录一次远程操作, 根据返回结果提取退出码与字节数
+        :param host: 主机 ip
+        :param op: 操作类型
+        :param target: 命令 或 文件路径
+        :param start: 开始时间戳
+        :param result: invoke.Result / AsyncResult / TransferStats
+        :param error: 异常
+        :param retries: 重试次数
+        :return: <OpRecord>
+        """
+        exited, bytes_in, bytes_out = None, 0, 0
+        ret = result if result is not None else getattr(error, "result", None)
+        if ret is None and error is not None and error.args:
+            # RuntimeError(result)
+            ret = error.args[0]
+        if hasattr(ret, "exited"):
+            exited = ret.exited
+            bytes_in = len(getattr(ret, "stdout", "") or "") + len(getattr(ret, "stderr", "") or "")
+            bytes_out = getattr(ret, "bytes_out", 0)
+        elif hasattr(ret, "direction"):
+            if ret.direction == "upload":
+                bytes_out = ret.bytes
+            else:
+                bytes_in = ret.bytes
+        rec = OpRecord(host, op, target if isinstance(target, str) else repr(target), self.stage, start,
+                       time.time() - start, exited=exited, bytes_in=bytes_in, bytes_out=bytes_out,
+                       retries=retries, error=repr(error) if error is not None else None)
+        with self.lock:
+            self.records.append(rec)
+        return rec
+
+    @staticmethod
+    def __aggregate(records, key):
+        groups = OrderedDict()
+        for rec in records:
+            k = key(rec)
+            g = groups.setdefault(k, OrderedDict([("ops", 0), ("failed", 0), ("duration", 0.0),
+                                                  ("bytes_in", 0), ("bytes_out", 0), ("retries", 0)]))
+            g["ops"] += 1
+            g["failed"] += 0 if rec.ok else 1
+            g["duration"] += rec.duration
+            g["bytes_in"] += rec.bytes_in
+            g["bytes_out"] += rec.bytes_out
+            g["retries"] += rec.retries
+        for g in groups.values():
+            g["duration"] = round(g["duration"], 3)
+        return groups
+
+    def summary(self):
+        """
+        按主机、阶段、操作类型汇总
+        :return: OrderedDict
+        """
+        with self.lock:
+            records = list(self.records)
+        slowest = sorted(records, key=lambda r: r.duration, reverse=True)[:10]
+        return OrderedDict([
+            ("hosts", self.__aggregate(records, lambda r: r.host)),
+            ("stages", self.__aggregate(records, lambda r: r.stage or "-")),
+            ("ops", self.__aggregate(records, lambda r: r.op)),
+            ("slowest", [r.to_dict() for r in slowest]),
+        ])
+
+    def report(self, log=logger):
+        """
+        打印汇总报告
+        :param log:
+        :return:
+        """
+        summary = self.summary()
+        for title in ("stages", "hosts", "ops"):
+            log.info(f"remote operations by {title[:-1]}:")
+            for name, g in summary[title].items():
+                log.info(f"    {name:<32} ops={g['ops']:<5} failed={g['failed']:<3} time={g['duration']:.2f}s "
+                         f"in={g['bytes_in']}B out={g['bytes_out']}B retries={g['retries']}")
+        log.info("slowest remote operations:")
+        for r in summary["slowest"]:
+            log.info(f"    [{r['host']}] {r['op']} {r['duration']:.2f}s {str(r['target'])[:80]}")
+
+    def dump(self, filename):
+        """
+        导出 json: 汇总及所有操作记录
+        :param filename:
+        :return:
+        """
+        data = self.summary()
+        with self.lock:
+            data["records"] = [r.to_dict() for r in self.records]
+        with open(filename, "w") as fp:
+            json.dump(data, fp, indent=4)
+        logger.info(f"remote operation metrics saved to {filename}")
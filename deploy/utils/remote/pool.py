@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+    SSH 连接池:
+        - 连接以 (ip, user, auth) 为键
+        - 复用前进行存活探测, 断开的连接重新建立
+        - 空闲超时回收, 连接数上限按 LRU 淘汰
+        - 线程安全
+"""
+import time
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+def host_key(host):
+    """
+    连接池键值, 认证信息只保存摘要
+    :param host: <utils.remote.Host>
+    :return: (ip, user, auth)
+    """
+    if host.key:
+        auth = f"key:{host.key}"
+    else:
+        auth = "password:" + hashlib.sha256((host.password or "").encode("utf-8")).hexdigest()[:16]
+    return host.ip, host.username, auth
+
+
+class SshConnectionPool(object):
+    def __init__(self, max_size=256, idle_timeout=600):
+        """
+        :param max_size: 最大连接数
+        :param idle_timeout: 空闲超时时间(秒), 超时的连接在下次获取连接时关闭
+        """
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.pool = OrderedDict()
+        self.lock = threading.RLock()
+
+    def get(self, host, factory):
+        """
+        获取连接, 不存在或已失效时通过 factory 新建
+        :param host: <utils.remote.Host>
+        :param factory: 连接构造函数 factory(host) => <SshHost>
+        :return: <SshHost>
+        """
+        key = host_key(host)
+        with self.lock:
+            self.evict_idle()
+            ssh = self.pool.get(key, None)
+            if ssh is not None and type(ssh) is not factory:
+                self.__close(key)
+                ssh = None
+            if ssh is not None and not ssh.busy and not ssh.is_alive():
+                logger.warning(f"[{host.ip}] ssh connection is not alive, reconnecting ...")
+                ssh.reconnect()
+            if ssh is None:
+                ssh = factory(host)
+                self.pool[key] = ssh
+                self.evict_overflow()
+            self.pool.move_to_end(key)
+            ssh.last_used = time.time()
+            return ssh
+
+    def evict_idle(self):
+        """
+        关闭空闲超时的连接
+        :return:
+        """
+        if not self.idle_timeout:
+            return
+        now = time.time()
+        with self.lock:
+            for key in [k for k, ssh in self.pool.items()
+                        if not ssh.busy and now - ssh.last_used > self.idle_timeout]:
+                logger.info(f"[{key[0]}] close idle ssh connection")
+                self.__close(key)
+
+    def evict_overflow(self):
+        """
+        超出连接数上限时, 关闭最久未使用的空闲连接
+        :return:
+        """
+        with self.lock:
+            for key in list(self.pool):
+                if len(self.pool) <= self.max_size:
+                    break
+                if not self.pool[key].busy:
+                    self.__close(key)
+
+    def __close(self, key):
+        ssh = self.pool.pop(key, None)
+        if ssh is not None:
+            try:
+                ssh.close()
+            except Exception as e:
+                logger.warning(f"[{key[0]}] close ssh connection failed: {e}")
+
+    def close(self, host):
+        """
+        关闭主机对应的连接
+        :param host: <utils.remote.Host>
+        :return:
+        """
+        with self.lock:
+            self.__close(host_key(host))
+
+    def close_all(self):
+        """
+        关闭所有连接
+        :return:
+        """
+        with self.lock:
+            for key in list(self.pool):
+                self.__close(key)
+
+    def items(self):
+        with self.lock:
+            return list(self.pool.items())
+
+    def __len__(self):
+        return len(self.pool)
@@ -6,12 +6,22 @@
 @Email:  quanbin@parcelx.io
 """
 
-from invoke import UnexpectedExit
+from invoke import UnexpectedExit, Result
 from fabric import Connection, Config
+from paramiko import SSHException
 from collections import OrderedDict
+from utils.remote.pool import SshConnectionPool
+from utils.remote.batch import RemoteBatch
+from utils.remote.transfer import SftpTransfer
+from utils.remote.metrics import RemoteMetrics
+import time
 import logging
+import threading
 logger = logging.getLogger(__name__)
 
+# 会话断开相关异常: 发送命令前发生时重连后执行, 执行中发生时只重试幂等操作
+SESSION_ERRORS = (SSHException, EOFError, ConnectionError, TimeoutError)
+
 
 class Host(object):
     """
@@ -110,21 +120,113 @@ class HostPool(object):
 
 class SshHost(object):
     # 连接池
-    SSH_POOL_HOSTS = OrderedDict()
+    SSH_POOL = SshConnectionPool()
+    # transport keepalive 间隔(秒)
+    KEEPALIVE = 30
+    # sftp 传输: 分块大小, pipelined 读写, ssh 传输层压缩
+    CHUNK_SIZE = SftpTransfer.CHUNK_SIZE
+    PIPELINED = True
+    COMPRESS = False
+    # 远程操作统计
+    METRICS = RemoteMetrics()
+    # 远程执行后端 name => class
+    BACKENDS = OrderedDict()
+    BACKEND = "fabric"
+    # 是否为 asyncio 后端
+    ASYNC = False
+
+    @staticmethod
+    def register_backend(name, cls):
+        """
+        注册远程执行后端
+        :param name: 后端名称
+        :param cls:  SshHost 子类
+        :return:
+        """
+        if not issubclass(cls, SshHost):
+            raise AttributeError("backend class must be subclass of <utils.remote.SshHost>")
+        SshHost.BACKENDS[name] = cls
+
+    @staticmethod
+    def use_backend(name):
+        """
+        选择远程执行后端, 已建立的连接会被关闭
+        :param name: fabric / asyncssh
+        :return:
+        """
+        if name not in SshHost.BACKENDS:
+            raise AttributeError(f'ssh backend<{name}> could not been supported! eg:{"/".join(SshHost.BACKENDS)}')
+        if name != SshHost.BACKEND:
+            SshHost.close_all()
+        SshHost.BACKEND = name
+
+    @staticmethod
+    def backend():
+        """
+        当前使用的远程执行后端
+        :return: SshHost 子类
+        """
+        return SshHost.BACKENDS[SshHost.BACKEND]
+
+    @staticmethod
+    def configure_pool(max_size=None, idle_timeout=None, keepalive=None):
+        """
+        连接池配置
+        :param max_size: 最大连接数
+        :param idle_timeout: 空闲超时时间(秒)
+        :param keepalive: transport keepalive 间隔(秒)
+        :return:
+        """
+        if max_size:
+            SshHost.SSH_POOL.max_size = max_size
+        if idle_timeout is not None:
+            SshHost.SSH_POOL.idle_timeout = idle_timeout
+        if keepalive is not None:
+            SshHost.KEEPALIVE = keepalive
+
+    @staticmethod
+    def configure_transfer(chunk_size=None, pipelined=None, compress=None):
+        """
+        sftp 传输配置, compress 只对之后建立的连接生效
+        :param chunk_size: 分块大小(字节)
+        :param pipelined: 上传不等待写确认, 下载预读
+        :param compress: 启用 ssh 传输层 zlib 压缩
+        :return:
+        """
+        if chunk_size:
+            SshHost.CHUNK_SIZE = chunk_size
+        if pipelined is not None:
+            SshHost.PIPELINED = pipelined
+        if compress is not None:
+            SshHost.COMPRESS = compress
 
     @staticmethod
     def getConnection(host):
         """获取连接"""
         if isinstance(host, Host):
-            if host.ip not in SshHost.SSH_POOL_HOSTS:
-                SshHost.SSH_POOL_HOSTS[host.ip] = SshHost(host)
-            return SshHost.SSH_POOL_HOSTS[host.ip]
+            return SshHost.SSH_POOL.get(host, SshHost.backend())
         else:
             raise AttributeError("required Object<utils.remote.Host>")
 
+    @staticmethod
+    def close_all():
+        """关闭连接池中的所有连接"""
+        SshHost.SSH_POOL.close_all()
+        for cls in SshHost.BACKENDS.values():
+            cls.release_all()
+
+    @staticmethod
+    def release_all():
+        """后端释放自身持有的资源, 由 close_all 调用"""
+        pass
+
     def __init__(self, host):
         self.host = host
         self.conn = self.connect(host)
+        # 正在执行的操作数, 连接池不会回收忙碌的连接; per_host_workers > 1 时多个线程共用同一连接
+        self.busy = 0
+        self.busy_lock = threading.Lock()
+        self.last_used = time.time()
 
     def connect(self, host):
         if isinstance(host, Host):
@@ -133,6 +235,7 @@ class SshHost(object):
                 connArgs = {'key_filename': host.keyFile}
             else:
                 connArgs = {'password': host.password}
+            connArgs['compress'] = SshHost.COMPRESS
             return Connection(host.ip, user=host.username, connect_kwargs=connArgs, config=config)
         else:
             raise AttributeError("required Object<utils.remote.Host>")
@@ -148,73 +251,244 @@ class SshHost(object):
     #     else:
     #         pass
 
-    def sudo(self, cmd, throw=True, **kwargs):
+    def is_alive(self):
+        """
+        存活探测: 未建立的连接在使用时建立; 已建立的连接检查 transport 状态
+        :return:
+        """
+        if not self.conn:
+            return False
+        if self.conn.transport is None:
+            return True
+        try:
+            transport = self.conn.transport
+            if transport.is_active():
+                transport.send_ignore()
+            return transport.is_active()
+        except (SSHException, EOFError, OSError):
+            return False
+
+    def reconnect(self):
+        """
+        重新建立连接
+        :return:
+        """
+        self.close()
+        self.conn = self.connect(self.host)
+
+    def _open(self):
+        if not self.conn or not isinstance(self.conn, Connection):
+            raise AttributeError("cannot login in remote ssh!")
+        if not self.conn.is_connected:
+            start, error = time.time(), None
+            try:
+                self.conn.open()
+            except Exception as e:
+                error = e
+                raise
+            finally:
+                SshHost.METRICS.record(self.host.ip, "connect", f"{self.host.username}@{self.host.ip}",
+                                       start, error=error)
+            if SshHost.KEEPALIVE:
+                self.conn.transport.set_keepalive(SshHost.KEEPALIVE)
+
+    def _retry(self, func, op=None, target=None, idempotent=True):
+        """
+        执行远程操作:
+            - 建立连接失败 或 发送前检测到会话已断开时, 重连后再执行
+            - 执行过程中会话断开时, 只有幂等操作(文件传输、只读命令)重连并重试一次;
+              非幂等命令(peer channel create/update、mv、docker exec 等)可能已在远程执行, 直接抛出异常
+        :param func: 无参函数, 通过 self.conn 执行操作
+        :param op: 操作类型, 用于统计
+        :param target: 命令 或 文件路径, 用于统计
+        :param idempotent: 操作可安全重复执行
+        :return:
+        """
+        with self.busy_lock:
+            self.busy += 1
+        self.last_used = time.time()
+        start, retries, result, error = time.time(), 0, None, None
+        try:
+            try:
+                self._open()
+                if not self.is_alive():
+                    raise EOFError("ssh session is not alive")
+            except SESSION_ERRORS as e:
+                logger.warning(f"[{self.host.ip}] ssh session dropped before {op}: {e!r}, reconnecting ...")
+                retries += 1
+                self.reconnect()
+                self._open()
+            try:
+                result = func()
+            except SESSION_ERRORS as e:
+                if not idempotent:
+                    logger.error(f"[{self.host.ip}] ssh session dropped during {op}, "
+                                 f"not retried because it may have run remotely: {target}")
+                    raise
+                logger.warning(f"[{self.host.ip}] ssh session dropped: {e!r}, reconnecting ...")
+                retries += 1
+                self.reconnect()
+                self._open()
+                result = func()
+            return result
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            with self.busy_lock:
+                self.busy -= 1
+            self.last_used = time.time()
+            if op:
+                SshHost.METRICS.record(self.host.ip, op, target, start, result=result, error=error, retries=retries)
+
+    def sudo(self, cmd, throw=True, idempotent=False, **kwargs):
+        """
+        :param idempotent: 命令可安全重复执行(只读命令等), 会话中途断开时重试
+        """
         try:
             logger.info(f"[{self.host.ip}] bash# {cmd}")
-            if self.conn and isinstance(self.conn, Connection):
-                ret = self.conn.sudo(cmd, **kwargs)
-                return ret
-            else:
-                raise AttributeError("cannot login in remote ssh!")
+            return self._retry(lambda: self.conn.sudo(cmd, **kwargs), op="sudo", target=cmd, idempotent=idempotent)
         except UnexpectedExit as e:
             if throw:
                 raise RuntimeError(e.result)
             else:
                 logger.error(e.result)
 
-    def run(self, cmd, throw=True, **kwargs):
+    def run(self, cmd, throw=True, idempotent=False, **kwargs):
+        """
+        :param idempotent: 命令可安全重复执行(只读命令等), 会话中途断开时重试
+        """
         try:
             logger.info(f"[{self.host.ip}] bash# {cmd}")
-            if self.conn and isinstance(self.conn, Connection):
-                ret = self.conn.run(cmd, **kwargs)
-                return ret
-            else:
-                raise AttributeError("cannot login in remote ssh!")
+            return self._retry(lambda: self.conn.run(cmd, **kwargs), op="run", target=cmd, idempotent=idempotent)
         except UnexpectedExit as e:
             if throw:
                 raise RuntimeError(e.result)
             else:
                 logger.error(e.result)
 
+    def _transfer(self):
+        return SftpTransfer(self.conn.sftp(), host=self.host.ip,
+                            chunk_size=SshHost.CHUNK_SIZE, pipelined=SshHost.PIPELINED)
+
     def download(self, remote, local, **kwargs):
         """
         Download a file from the current connection to the local filesystem.
         :param remote: Remote file to download.
         :param local: Local path to store downloaded file in, or a file-like object.
-        :return:
+        :return: <utils.remote.transfer.TransferStats>
         """
+        # 可 seek 的 file-like object 重试时丢弃已写入的部分数据
+        position = None
+        if not isinstance(local, str):
+            try:
+                position = local.tell()
+            except (AttributeError, OSError):
+                pass
+
+        def _download():
+            if position is not None:
+                local.seek(position)
+                local.truncate()
+            return self._transfer().download(remote, local)
+
         try:
-            if self.conn and isinstance(self.conn, Connection):
-                ret = self.conn.get(remote, local=local)
-                logger.info(f"download file {remote} from {self.host.ip}")
-                return ret
-            else:
-                raise AttributeError("cannot login in remote ssh!")
-        except UnexpectedExit as e:
+            stats = self._retry(_download, op="download", target=remote)
+            logger.info(f"download file {remote} from {self.host.ip}, {stats}")
+            return stats
+        except (IOError, UnexpectedExit) as e:
             if kwargs.get("throw", True):
-                raise RuntimeError(e.result)
+                raise RuntimeError(getattr(e, "result", e))
             else:
-                logger.error(e.result)
+                logger.error(getattr(e, "result", e))
 
     def upload(self, local, remote, **kwargs):
         """
         Upload a file from the local filesystem to the current connection.
         :param local: Local path of file to upload, or a file-like object.
         :param remote: Remote path to which the local file will be written.
-        :return:
+        :return: <utils.remote.transfer.TransferStats>
         """
+        # 可 seek 的 file-like object 重试时从原位置重新读取
+        position = None
+        if not isinstance(local, str):
+            try:
+                position = local.tell()
+            except (AttributeError, OSError):
+                pass
+
+        def _upload():
+            if position is not None:
+                local.seek(position)
+            return self._transfer().upload(local, remote)
+
         try:
-            if self.conn and isinstance(self.conn, Connection):
-                logger.info(f"upload file {local} to {self.host.ip}")
-                ret = self.conn.put(local, remote=remote)
-                return ret
-            else:
-                raise AttributeError("cannot login in remote ssh!")
-        except UnexpectedExit as e:
+            logger.info(f"upload file {local} to {self.host.ip}")
+            stats = self._retry(_upload, op="upload", target=remote)
+            logger.info(f"{stats}")
+            return stats
+        except (IOError, UnexpectedExit) as e:
             if kwargs.get("throw", True):
-                raise RuntimeError(e.result)
+                raise RuntimeError(getattr(e, "result", e))
             else:
-                logger.error(e.result)
+                logger.error(getattr(e, "result", e))
+
+    def stream(self, cmd, producer, throw=True, idempotent=False):
+        """
+        执行远程命令, 并将 producer 生成的数据通过 ssh channel 写入命令的 stdin, 不产生本地及远程临时文件
+        eg:
+            rc.stream("tar -xzf - -C $HOME/fabric-scripts", ele.write_tar)
+        :param cmd: 远程命令
+        :param producer: producer(fileobj), 向 fileobj 写入数据
+        :param throw: 命令失败时是否抛出 RuntimeError
+        :param idempotent: 命令及 producer 可安全重复执行(如 tar 解压覆盖), 会话中途断开时重试
+        :return: <invoke.Result>
+        """
+        logger.info(f"[{self.host.ip}] bash# {cmd} < stream")
+
+        class _Stdin(object):
+            def __init__(self, fp):
+                self.fp = fp
+                self.bytes = 0
+
+            def write(self, data):
+                self.fp.write(data)
+                self.bytes += len(data)
+                return len(data)
+
+            def flush(self):
+                self.fp.flush()
+
+        def _stream():
+            chan = self.conn.transport.open_session()
+            try:
+                chan.exec_command(cmd)
+                stdin = _Stdin(chan.makefile("wb"))
+                producer(stdin)
+                stdin.flush()
+                chan.shutdown_write()
+                stdout = chan.makefile("rb").read().decode("utf-8", "replace")
+                stderr = chan.makefile_stderr("rb").read().decode("utf-8", "replace")
+                ret = Result(stdout=stdout, stderr=stderr, command=cmd, exited=chan.recv_exit_status())
+                ret.bytes_out = stdin.bytes
+                return ret
+            finally:
+                chan.close()
+
+        result = self._retry(_stream, op="stream", target=cmd, idempotent=idempotent)
+        if result.failed:
+            if throw:
+                raise RuntimeError(result)
+            else:
+                logger.error(result)
+        return result
+
+    def batch(self):
+        """
+        批量执行: 连续的命令合并为一个脚本执行, 文件传输复用 sftp 会话
+        :return: <utils.remote.batch.RemoteBatch>
+        """
+        return RemoteBatch(self)
 
     def close(self):
         if self.conn:
@@ -225,3 +499,6 @@ class SshHost(object):
 
     def __del__(self):
         self.close()
+
+
+SshHost.register_backend("fabric", SshHost)
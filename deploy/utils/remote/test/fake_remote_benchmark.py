@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+    使用模拟远程后端对 DeployContext 配置拷贝(scp_zip) + 安装(install)的编排进行基准测试, 对比串行与并发执行:
+        cd deploy && python utils/remote/test/fake_remote_benchmark.py --hosts 10 100 1000 --latency 0.02
+"""
+import os
+import sys
+import time
+import shutil
+import logging
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "..")))
+
+from utils.context import DeployContext
+from utils.configuration import Configuration
+from utils.remote import SshHost, Host
+from utils.remote.fake import FakeSshHost
+from utils.tool.assign import AssignManage
+from utils.tool.module import Role
+
+
+def build_manager(root, count, payload):
+    """
+    生成 count 台主机、每台一个 peer 的组件配置
+    """
+    manager = AssignManage(os.path.join(root, "output"))
+    manager.domain = "example.com"
+    manager.compose_output = os.path.join(root, "compose")
+    manager.crypto_output = os.path.join(root, "crypto")
+    os.makedirs(manager.compose_output, exist_ok=True)
+    with open(os.path.join(manager.compose_output, "peer.yaml"), "w") as fp:
+        fp.write("version: '2'\n")
+
+    for i in range(count):
+        ip = f"10.{i // 65536}.{i // 256 % 256}.{i % 256}"
+        manager.add_host(Host(ip, username="fabric", password="fabric"))
+        manager.add_item(i, "org1", Role.PEER, "example.com", ip)
+        with open(os.path.join(manager.compose_output, f"peer{i}.example.com.sh"), "w") as fp:
+            fp.write("docker-compose -f peer.yaml up -d\n")
+        peer_dir = os.path.join(manager.crypto_output, "crypto-config/peerOrganizations/org1.example.com/peers",
+                                f"peer{i}.example.com", "msp")
+        os.makedirs(peer_dir, exist_ok=True)
+        with open(os.path.join(peer_dir, "cert.pem"), "wb") as fp:
+            fp.write(os.urandom(payload))
+    manager.zip("peer")
+    return manager
+
+
+def build_context(manager):
+    """
+    不加载 deployment.yaml, 只使用生成的组件分配构造 DeployContext
+    """
+    cfg = Configuration.__new__(Configuration)
+    cfg.assign_manager = manager
+    context = DeployContext(cfg=cfg)
+    context._load = True
+    return context
+
+
+def deploy(context):
+    """
+    onekey_deploy 中配置拷贝 + 组件安装的编排
+    """
+    context.assign_manager.reset_shipped()
+    context.scp_zip(modules="peer")
+    context.install(services="peer")
+
+
+def benchmark(count, args):
+    root = tempfile.mkdtemp(prefix="fake-benchmark-")
+    try:
+        manager = build_manager(root, count, args.payload)
+        context = build_context(manager)
+        timings = []
+        for parallel in (False, True):
+            FakeSshHost.reset()
+            FakeSshHost.configure(root=os.path.join(root, "remote", str(parallel)), latency=args.latency,
+                                  bandwidth=args.bandwidth, failure_rate=args.failure_rate, seed=0)
+            SshHost.METRICS.clear()
+            manager.set_parallel(parallel, max_workers=args.max_workers)
+            start = time.time()
+            try:
+                deploy(context)
+            except RuntimeError as e:
+                print(f"    {e}".splitlines()[0])
+            timings.append(time.time() - start)
+            SshHost.close_all()
+        print(f"hosts={count:<5} serial={timings[0]:.2f}s parallel={timings[1]:.2f}s "
+              f"speedup={timings[0] / max(timings[1], 1e-6):.1f}x")
+        if args.report:
+            SshHost.METRICS.report()
+    finally:
+        FakeSshHost.reset()
+        shutil.rmtree(root, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="fake remote orchestration benchmark")
+    parser.add_argument("--hosts", nargs="+", type=int, default=[10, 100])
+    parser.add_argument("--latency", type=float, default=0.02, help="round trip latency in seconds")
+    parser.add_argument("--bandwidth", type=int, default=0, help="bytes per second, 0 is unlimited")
+    parser.add_argument("--payload", type=int, default=16 * 1024, help="certificate bytes per host")
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--max-workers", type=int, default=32)
+    parser.add_argument("--report", action="store_true", help="print remote metrics of parallel run")
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.INFO if args.report else logging.ERROR)
+    SshHost.use_backend("fake")
+    for count in args.hosts:
+        benchmark(count, args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,326 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+    模拟远程后端测试, 不需要真实主机:
+        cd deploy && python -m unittest utils/remote/test/fake_remote_test.py
+"""
+import os
+import io
+import time
+import hashlib
+import asyncio
+import shutil
+import tarfile
+import tempfile
+import unittest
+from zipfile import ZipFile
+
+from utils.remote import SshHost, Host
+from utils.remote.fake import FakeSshHost, FakeShell
+from utils.tool.delta import remote_digest_cmd, parse_digests, changed_files
+from utils.tool.executor import ParallelExecutor, KeyedSemaphore
+from utils.tool.assign import AssignManage, Role
+from utils.tool.relay import TreeRelay
+from utils.tool.bundle import SharedBundle
+from utils.tool.archive import get_package_format
+
+
+def zip_digests(filename):
+    """
+    zip 包内每个文件内容的 sha256
+    """
+    with ZipFile(filename, "r") as fp:
+        return {info.filename: hashlib.sha256(fp.read(info)).hexdigest()
+                for info in fp.infolist() if not info.filename.endswith("/")}
+
+
+class FakeRemoteTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp(prefix="fake-ssh-test-")
+        self.backend = SshHost.BACKEND
+        SshHost.use_backend("fake")
+        FakeSshHost.reset()
+        FakeSshHost.configure(root=self.root, seed=1)
+        self.host = Host("10.0.0.1", username="fabric", password="fabric")
+        self.rc = SshHost.getConnection(self.host)
+
+        self.zip = os.path.join(self.root, "peer0-org1.zip")
+        with ZipFile(self.zip, "w") as fp:
+            fp.writestr("peer0.org1.sh", "docker-compose up -d")
+            fp.writestr("crypto-config/peer0/tls/server.crt", "cert")
+
+    def tearDown(self):
+        SshHost.close_all()
+        SshHost.use_backend(self.backend)
+        FakeSshHost.reset()
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def remote_path(self, path):
+        return FakeSshHost.local_path(self.host, path)
+
+    def test_commands_recorded(self):
+        self.rc.run("echo hello", hide=True)
+        self.rc.sudo("docker ps", hide=True)
+        self.assertEqual(["echo hello", "docker ps"], FakeSshHost.commands("10.0.0.1"))
+        self.assertEqual([], FakeSshHost.commands("10.0.0.2"))
+
+    def test_upload_unzip(self):
+        stats = self.rc.upload(self.zip, "/tmp")
+        self.assertEqual(os.path.getsize(self.zip), stats.bytes)
+        self.rc.run("mkdir -p $HOME/fabric-scripts && unzip -o /tmp/peer0-org1.zip -d $HOME/fabric-scripts")
+        with open(self.remote_path("$HOME/fabric-scripts/crypto-config/peer0/tls/server.crt")) as fp:
+            self.assertEqual("cert", fp.read())
+
+        # 解压后远程文件与 zip 包一致, 增量上传无需上传任何文件
+        local = zip_digests(self.zip)
+        ret = self.rc.run(remote_digest_cmd("$HOME/fabric-scripts", local), hide=True)
+        self.assertEqual([], changed_files(local, parse_digests(ret.stdout)))
+
+    def test_upload_fileobj(self):
+        fp = io.BytesIO()
+        with open(self.zip, "rb") as src:
+            fp.write(src.read())
+        fp.seek(0)
+        stats = self.rc.upload(fp, "/tmp/memory.zip")
+        self.assertEqual(os.path.getsize(self.zip), stats.bytes)
+        self.assertEqual(zip_digests(self.zip), zip_digests(self.remote_path("/tmp/memory.zip")))
+
+    def test_download(self):
+        self.rc.run("mkdir -p /tmp/out")
+        self.rc.upload(self.zip, "/tmp/out/a.zip")
+        local = os.path.join(self.root, "download", "a.zip")
+        self.rc.download("/tmp/out/a.zip", local)
+        self.assertEqual(zip_digests(self.zip), zip_digests(local))
+
+    def test_download_fileobj(self):
+        self.rc.upload(self.zip, "/tmp/memory.zip")
+        fp = io.BytesIO()
+        stats = self.rc.download("/tmp/memory.zip", fp)
+        with open(self.zip, "rb") as src:
+            self.assertEqual(src.read(), fp.getvalue())
+        self.assertEqual(len(fp.getvalue()), stats.bytes)
+
+    def test_stream_untar(self):
+        def producer(fp):
+            with tarfile.open(fileobj=fp, mode="w|gz") as tar:
+                info = tarfile.TarInfo("peer0.org1.sh")
+                info.size = 3
+                tar.addfile(info, io.BytesIO(b"abc"))
+        ret = self.rc.stream("mkdir -p $HOME/fabric-scripts && tar -xzf - -C $HOME/fabric-scripts", producer)
+        self.assertGreater(ret.bytes_out, 0)
+        self.assertTrue(os.path.isfile(self.remote_path("$HOME/fabric-scripts/peer0.org1.sh")))
+
+    def test_batch(self):
+        with self.rc.batch() as b:
+            b.run("mkdir -p /tmp/batch")
+            b.upload(self.zip, "/tmp/batch")
+            b.run("mv /tmp/batch/peer0-org1.zip /tmp/batch/b.zip && echo moved")
+        self.assertEqual("moved", b.results[-1].stdout)
+        self.assertTrue(os.path.isfile(self.remote_path("/tmp/batch/b.zip")))
+
+    def test_batch_inline_download(self):
+        self.rc.upload(self.zip, "/tmp/src.zip")
+        FakeSshHost.reset()
+        FakeSshHost.configure(root=self.root)
+        buffer = io.BytesIO()
+        # 获取 + 下载 + 清理只需一次往返
+        with self.rc.batch() as b:
+            b.sudo("cp /tmp/src.zip /tmp/fetch.zip")
+            b.download("/tmp/fetch.zip", buffer)
+            b.sudo("rm -f /tmp/fetch.zip")
+        self.assertEqual(["exec"], [r[1] for r in FakeSshHost.RECORDS])
+        with open(self.zip, "rb") as fp:
+            self.assertEqual(fp.read(), buffer.getvalue())
+        self.assertEqual(len(buffer.getvalue()), b.results[1].bytes)
+        self.assertFalse(os.path.exists(self.remote_path("/tmp/fetch.zip")))
+
+        local = os.path.join(self.root, "download", "inline.zip")
+        with self.rc.batch() as b:
+            b.run("true")
+            b.download("/tmp/src.zip", local)
+        self.assertEqual(zip_digests(self.zip), zip_digests(local))
+
+        with self.assertRaises(RuntimeError):
+            with self.rc.batch() as b:
+                b.run("true")
+                b.download("/tmp/missing.zip", buffer)
+
+    def test_failure_injection(self):
+        FakeSshHost.configure(failures=[("docker-compose", 2)])
+        with self.assertRaises(RuntimeError) as cm:
+            self.rc.sudo("docker-compose -f peer.yaml up -d")
+        self.assertEqual(2, cm.exception.args[0].exited)
+        self.assertTrue(self.rc.run("docker-compose up", throw=False, warn=True).failed)
+
+    def test_session_drop_retry(self):
+        FakeSshHost.configure(drop_rate=0.3, seed=3)
+        for _ in range(20):
+            try:
+                self.rc.run("echo retry", hide=True, idempotent=True)
+            except EOFError:
+                # 重试时会话再次断开
+                pass
+        records = [r for r in SshHost.METRICS.records if r.host == "10.0.0.1" and r.op == "run"]
+        self.assertTrue(any(r.retries and r.ok for r in records))
+
+        FakeSshHost.configure(drop_rate=0)
+        self.assertEqual("ok", self.rc.run("echo ok", hide=True).stdout.strip())
+
+    def test_session_drop_not_idempotent(self):
+        self.rc.run("echo warmup", hide=True)
+        FakeSshHost.configure(drop_rate=1)
+        with self.assertRaises(EOFError):
+            self.rc.run("mv /tmp/a /tmp/b", hide=True)
+        # 会话中途断开, 命令可能已执行, 不重试
+        self.assertEqual(1, FakeSshHost.commands("10.0.0.1").count("mv /tmp/a /tmp/b"))
+
+        # 下一条命令发送前重新建立连接
+        FakeSshHost.configure(drop_rate=0)
+        self.assertEqual("ok", self.rc.run("echo ok", hide=True).stdout.strip())
+
+    def test_parallel_latency(self):
+        FakeSshHost.configure(latency=0.02)
+        hosts = [Host(f"10.0.1.{i}", username="fabric", password="fabric") for i in range(20)]
+
+        start = time.time()
+        for host in hosts:
+            SshHost.getConnection(host).run("echo serial", hide=True)
+        serial = time.time() - start
+
+        SshHost.close_all()
+        start = time.time()
+        executor = ParallelExecutor(max_workers=20)
+        for host in hosts:
+            executor.submit(host.ip, host.ip, SshHost.getConnection(host).run, "echo parallel", hide=True)
+        executor.run().raise_for_failure()
+        parallel = time.time() - start
+
+        self.assertLess(parallel * 4, serial)
+
+    def test_shared_bundle_formats(self):
+        shared = os.path.join(self.root, "users", "Admin", "msp")
+        os.makedirs(shared)
+        with open(os.path.join(shared, "cert.pem"), "w") as fp:
+            fp.write("cert")
+        for spec in ("zip", "tar.gz"):
+            bundle = SharedBundle(os.path.join(self.root, "users"), "crypto-config/users", get_package_format(spec))
+            self.assertTrue(bundle.filename.endswith(get_package_format(spec).SUFFIX))
+            self.rc.upload(bundle.build(os.path.join(self.root, spec)), "/tmp")
+            self.rc.run(" && ".join(bundle.remote_install_bashes("$HOME/" + spec, "/tmp")))
+            with open(self.remote_path(f"$HOME/{spec}/crypto-config/users/Admin/msp/cert.pem")) as fp:
+                self.assertEqual("cert", fp.read())
+            ret = self.rc.run(SharedBundle.remote_list_cmd("$HOME/" + spec), hide=True)
+            self.assertEqual([bundle.name], ret.stdout.split())
+            self.assertFalse(os.path.exists(self.remote_path(f"/tmp/{bundle.filename}")))
+
+    def test_tree_relay(self):
+        hosts = [Host(f"10.0.1.{i}", username="fabric", password="fabric") for i in range(5)]
+        TreeRelay(hosts, fanout=2).distribute(self.zip, "$HOME/fabric-scripts")
+        for host in hosts:
+            remote = FakeSshHost.local_path(host, "$HOME/fabric-scripts/peer0-org1.zip")
+            self.assertEqual(zip_digests(self.zip), zip_digests(remote))
+        # 只上传至种子主机, http 服务只监听主机 ip, 下载路径为随机路径
+        uploads = [r for r in FakeSshHost.RECORDS if r[1] == "upload"]
+        self.assertEqual(["10.0.1.0"], [r[0] for r in uploads])
+        serves = [c for c in FakeSshHost.commands("10.0.1.0") if "http.server" in c]
+        self.assertIn("--bind 10.0.1.0", serves[0])
+        pulls = [c for c in FakeSshHost.commands("10.0.1.1") if "curl" in c]
+        self.assertRegex(pulls[0], r"http://10\.0\.1\.0:\d+/[0-9a-f]{32}/peer0-org1\.zip")
+        self.assertEqual({}, FakeShell.SERVERS)
+
+    def test_tree_relay_failure(self):
+        hosts = [Host(f"10.0.1.{i}", username="fabric", password="fabric") for i in range(5)]
+        FakeSshHost.configure(failures=[("mv /tmp/relay-", 1)])
+        with self.assertRaises(RuntimeError):
+            TreeRelay(hosts, fanout=2).distribute(self.zip, "$HOME/fabric-scripts")
+        # 分发失败时停止 http 服务并清理临时目录
+        self.assertEqual({}, FakeShell.SERVERS)
+        for host in hosts:
+            self.assertEqual([], [p for p in os.listdir(FakeSshHost.local_path(host, "/tmp"))
+                                  if p.startswith("relay-")])
+
+    def test_keyed_semaphore(self):
+        locks = KeyedSemaphore()
+        running, peak = {}, {}
+
+        def _task(key):
+            with locks.hold(key):
+                running[key] = running.get(key, 0) + 1
+                peak[key] = max(peak.get(key, 0), running[key])
+                time.sleep(0.02)
+                running[key] -= 1
+
+        executor = ParallelExecutor(max_workers=8, per_host=8)
+        for i in range(8):
+            executor.submit(f"channel{i}", "localhost", _task, f"peer-cli{i % 2}")
+        executor.run().raise_for_failure()
+        self.assertEqual({"peer-cli0": 1, "peer-cli1": 1}, peak)
+
+
+class AssignManageFakeTest(unittest.TestCase):
+    """
+    handle_func/handle_coroutine 并发分发至模拟主机
+    """
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp(prefix="fake-assign-test-")
+        self.backend = SshHost.BACKEND
+        SshHost.use_backend("fake")
+        FakeSshHost.reset()
+        FakeSshHost.configure(root=self.root, seed=1, latency=0.02)
+        self.manager = AssignManage(os.path.join(self.root, "output"))
+        self.manager.domain = "parcelx.io"
+        for name in ("crypto_output", "configtx_output", "compose_output"):
+            setattr(self.manager, name, os.path.join(self.root, "output", name))
+        self.hosts = [Host(f"10.0.2.{i}", username="fabric", password="fabric") for i in range(4)]
+        for i, host in enumerate(self.hosts):
+            self.manager.add_host(host)
+            self.manager.add_item(i, None, Role.ZOOKEEPER, "parcelx.io", host.ip)
+
+    def tearDown(self):
+        SshHost.close_all()
+        SshHost.use_backend(self.backend)
+        FakeSshHost.reset()
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def test_handle_func_parallel(self):
+        def _touch(ele=None, host=None, domain=None, **kwargs):
+            SshHost.getConnection(host).run(f"mkdir -p /tmp/{domain}", hide=True)
+            return host.ip
+
+        result = self.manager.handle_func(_touch, "zookeeper", parallel=True)
+        self.assertTrue(result.ok)
+        self.assertEqual([h.ip for h in self.hosts], [r.result for r in result.results])
+        for r in result.results:
+            self.assertTrue(os.path.isdir(FakeSshHost.local_path(self.manager.get_host(r.host), f"/tmp/{r.key}")))
+
+    def test_shipped_record_validated_remotely(self):
+        os.makedirs(self.manager.compose_output, exist_ok=True)
+        with open(os.path.join(self.manager.compose_output, "zookeeper.yaml"), "w") as fp:
+            fp.write("version: '2'\n")
+        for domain in self.manager.zookeeper:
+            with open(os.path.join(self.manager.compose_output, f"{domain}.sh"), "w") as fp:
+                fp.write("docker-compose -f zookeeper.yaml up -d\n")
+        self.manager.zip("zookeeper")
+        ele = next(iter(self.manager.zookeeper.values()))
+        self.manager.mark_shipped(ele)
+
+        # 对比远程 sha256 时仍需检查远程文件, 已重建的主机会重新拷贝
+        self.assertTrue(self.manager.is_dirty(ele))
+        self.manager.delta_upload = False
+        self.assertFalse(self.manager.is_dirty(ele))
+
+    def test_handle_coroutine(self):
+        async def _touch(ele=None, host=None, domain=None, **kwargs):
+            rc = SshHost.getConnection(host)
+            await asyncio.get_event_loop().run_in_executor(None, lambda: rc.run(f"mkdir -p /tmp/{domain}", hide=True))
+            return host.ip
+
+        result = self.manager.handle_coroutine(_touch, "zookeeper")
+        self.assertTrue(result.ok)
+        self.assertEqual([h.ip for h in self.hosts], [r.result for r in result.results])
+
+
+if __name__ == '__main__':
+    unittest.main()
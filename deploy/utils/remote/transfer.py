@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+    sftp 文件传输:
+        - 上传使用 pipelined 写入, 不等待每个写请求的确认
+        - 下载使用 prefetch 预读, 多个读请求同时在途
+        - 分块大小可配置
+        - 每次传输记录字节数、耗时、吞吐量和打开远程文件的延迟
+"""
+import os
+import stat
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def human_size(size):
+    """
+    字节数格式化
+    :param size:
+    :return:
+    """
+    for unit in ("B", "KB", "MB"):
+        if size < 1024:
+            return f"{size:.1f}{unit}"
+        size /= 1024.0
+    return f"{size:.1f}GB"
+
+
+class TransferStats(object):
+    """
+    单次文件传输的统计信息
+    """
+    def __init__(self, direction, local, remote, host=None):
+        """
+        :param direction: upload / download
+        :param local:  本地路径 或 file-like object
+        :param remote: 远程路径
+        :param host:   主机 ip
+        """
+        self.direction = direction
+        self.local = local
+        self.remote = remote
+        self.host = host
+        self.bytes = 0
+        self.chunks = 0
+        # 打开远程文件的耗时(秒), 约等于一次往返
+        self.latency = 0.0
+        self.duration = 0.0
+
+    @property
+    def throughput(self):
+        """
+        吞吐量 bytes/s
+        """
+        return self.bytes / self.duration if self.duration > 0 else 0.0
+
+    def __str__(self):
+        return f"{self.direction} {self.local} {'->' if self.direction == 'upload' else '<-'} " \
+            f"{self.host}:{self.remote} {human_size(self.bytes)} in {self.duration:.2f}s " \
+            f"({human_size(self.throughput)}/s, latency {self.latency * 1000:.0f}ms)"
+
+    def __repr__(self):
+        return f"<TransferStats: {self}>"
+
+
+class SftpTransfer(object):
+    # paramiko 单个 sftp 读写请求最大 32KB, 更大的分块会被拆分为多个在途请求
+    CHUNK_SIZE = 32768
+
+    def __init__(self, sftp, host=None, chunk_size=None, pipelined=True):
+        """
+        :param sftp: <paramiko.SFTPClient>
+        :param host: 主机 ip, 用于日志
+        :param chunk_size: 每次读写的字节数
+        :param pipelined: 上传时不等待写请求确认, 下载时预读
+        """
+        self.sftp = sftp
+        self.host = host
+        self.chunk_size = chunk_size or SftpTransfer.CHUNK_SIZE
+        self.pipelined = pipelined
+
+    def __is_remote_dir(self, remote):
+        try:
+            return stat.S_ISDIR(self.sftp.stat(remote).st_mode)
+        except IOError:
+            return False
+
+    def upload(self, local, remote):
+        """
+        上传文件, remote 为目录时保存为 remote/basename(local); 关闭远程文件时等待所有在途写请求确认
+        :param local: 本地文件路径, 或 file-like object
+        :param remote: 远程路径
+        :return: <TransferStats>
+        """
+        is_file_like = not isinstance(local, str)
+        if not is_file_like and (not remote or remote.endswith("/") or self.__is_remote_dir(remote)):
+            remote = os.path.join(remote or ".", os.path.basename(local))
+        stats = TransferStats("upload", local, remote, self.host)
+
+        start = time.time()
+        fp = local if is_file_like else open(local, "rb")
+        try:
+            with self.sftp.open(remote, "wb") as rf:
+                stats.latency = time.time() - start
+                rf.set_pipelined(self.pipelined)
+                while True:
+                    data = fp.read(self.chunk_size)
+                    if not data:
+                        break
+                    rf.write(data)
+                    stats.bytes += len(data)
+                    stats.chunks += 1
+        finally:
+            if not is_file_like:
+                fp.close()
+        if not is_file_like:
+            self.sftp.chmod(remote, stat.S_IMODE(os.stat(local).st_mode))
+        stats.duration = time.time() - start
+        return stats
+
+    def download(self, remote, local):
+        """
+        下载文件, local 为目录时保存为 local/basename(remote)
+        :param remote: 远程路径
+        :param local: 本地文件路径, 或 file-like object
+        :return: <TransferStats>
+        """
+        is_file_like = not isinstance(local, str)
+        if not is_file_like:
+            if not local or local.endswith(os.sep) or os.path.isdir(local):
+                local = os.path.join(local or os.getcwd(), os.path.basename(remote))
+            local_dir = os.path.dirname(local)
+            if local_dir and not os.path.exists(local_dir):
+                os.makedirs(local_dir)
+        stats = TransferStats("download", local, remote, self.host)
+
+        start = time.time()
+        fp = local if is_file_like else open(local, "wb")
+        try:
+            with self.sftp.open(remote, "rb") as rf:
+                stats.latency = time.time() - start
+                attr = rf.stat()
+                if self.pipelined:
+                    rf.prefetch(attr.st_size)
+                while True:
+                    data = rf.read(self.chunk_size)
+                    if not data:
+                        break
+                    fp.write(data)
+                    stats.bytes += len(data)
+                    stats.chunks += 1
+        finally:
+            if not is_file_like:
+                fp.close()
+        if not is_file_like:
+            os.chmod(local, stat.S_IMODE(attr.st_mode))
+        stats.duration = time.time() - start
+        return stats
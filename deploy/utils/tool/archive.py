@@ -0,0 +1,349 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+    配置包格式: zip(存储)、zip-deflate、tar.gz、tar.zst, 格式名后可指定压缩级别, 如 zip-deflate:9、tar.zst:19
+        - 证书、私钥几乎不可压缩, 局域网内 zip 存储模式打包、解压最快; 广域网下 tar.zst 体积最小
+        - 所有格式均可重现: 文件按归档路径顺序写入, 修改时间、属主固定
+        - 远程解压命令随格式变化, tar.zst 需要本地安装 zstandard 模块, 远程主机缺少 zstd 时自动安装
+"""
+import os
+import gzip
+import time
+import shutil
+import tarfile
+import tempfile
+from pathlib import Path
+from zipfile import ZipFile, ZIP_STORED, ZIP_DEFLATED
+from collections import OrderedDict
+from .zip import ConfigZipFile
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# 可重现打包时 tar 文件使用的修改时间, 与 REPRODUCIBLE_DATE_TIME 一致
+REPRODUCIBLE_MTIME = 315532800
+
+
+def package_members(zip_filenames):
+    """
+    待打包文件列表, 与 ConfigZipFile 的归档路径一致, 重复的归档路径只保留第一个
+    :param zip_filenames: [(absolute path, (archive path, ZipType))], 同 Element.zip_filenames
+    :return: OrderedDict {archive name: absolute path}
+    """
+    from .module import ZipType
+    members = OrderedDict()
+    for absolute_path, (archive_path, path_type) in zip_filenames:
+        if path_type is ZipType.FILE:
+            name = Path(os.path.join(archive_path, os.path.basename(absolute_path))).as_posix()
+            members.setdefault(name, absolute_path)
+        elif path_type is ZipType.DIR:
+            for root, dirs, files in os.walk(absolute_path):
+                dirs.sort()
+                for file in sorted(files):
+                    file_path = os.path.join(root, file)
+                    relative_path = Path(file_path).relative_to(absolute_path)
+                    members.setdefault(Path(os.path.join(archive_path, relative_path)).as_posix(), file_path)
+    return members
+
+
+def build_package(filename, zip_filenames, package_format=None):
+    """
+    重新生成配置包, 可在子进程中执行
+    :param filename: 配置包路径
+    :param zip_filenames: [(absolute path, (archive path, ZipType))], 同 Element.zip_filenames
+    :param package_format: <PackageFormat>, 默认 zip 存储模式
+    :return: filename
+    """
+    package_format = package_format or ZipFormat()
+    return package_format.write(filename, package_members(zip_filenames))
+
+
+class PackageFormat(object):
+    # 格式名
+    NAME = None
+    # 配置包后缀
+    SUFFIX = None
+    # 压缩级别范围及默认值, None 为不支持压缩级别
+    LEVELS = None
+    DEFAULT_LEVEL = None
+    # 是否可以流的形式写入远程解压命令
+    STREAM = False
+
+    def __init__(self, level=None):
+        """
+        :param level: 压缩级别, 默认 DEFAULT_LEVEL
+        """
+        if level is not None and (self.LEVELS is None or level not in self.LEVELS):
+            raise AttributeError(f"package format<{self.NAME}> does not support compression level {level}!")
+        self.level = self.DEFAULT_LEVEL if level is None else level
+
+    @property
+    def spec(self):
+        """
+        格式说明, 如 zip-deflate:6
+        """
+        return self.NAME if self.level is None else f"{self.NAME}:{self.level}"
+
+    def write(self, filename, members):
+        """
+        生成配置包, 先写入临时文件再替换, 打包失败时不留下不完整的配置包
+        :param filename: 配置包路径
+        :param members: {archive name: absolute path}
+        :return: filename
+        """
+        base_dir = os.path.dirname(filename)
+        if base_dir and not os.path.exists(base_dir):
+            os.makedirs(base_dir, exist_ok=True)
+        tmp = f"{filename}.{os.getpid()}.tmp"
+        try:
+            with open(tmp, "wb") as fp:
+                self.write_fileobj(fp, members)
+            os.replace(tmp, filename)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+        return filename
+
+    def write_fileobj(self, fileobj, members):
+        """
+        写入可写的 file-like object
+        :param fileobj:
+        :param members: {archive name: absolute path}
+        :return:
+        """
+        raise NotImplementedError
+
+    def extract(self, filename, dest):
+        """
+        本地解压配置包
+        :param filename:
+        :param dest:
+        :return:
+        """
+        raise NotImplementedError
+
+    def remote_extract_bashes(self, remote_path, dest):
+        """
+        解压远程配置包的命令
+        :param remote_path: 远程配置包路径
+        :param dest: 远程解压目录
+        :return: list<command>
+        """
+        raise NotImplementedError
+
+    def remote_stream_bashes(self, dest):
+        """
+        从 stdin 解压配置包流的命令
+        :param dest: 远程解压目录
+        :return: list<command>
+        """
+        raise NotImplementedError
+
+    def __eq__(self, other):
+        return isinstance(other, PackageFormat) and self.spec == other.spec
+
+    def __hash__(self):
+        return hash(self.spec)
+
+    def __repr__(self):
+        return f"<PackageFormat: {self.spec}>"
+
+
+class ZipFormat(PackageFormat):
+    NAME = "zip"
+    SUFFIX = ".zip"
+    COMPRESSION = ZIP_STORED
+
+    def write_fileobj(self, fileobj, members):
+        # 复用 ConfigZipFile 的批量写入, 压缩包只打开一次
+        with ConfigZipFile(fileobj, reproducible=True, compression=self.COMPRESSION,
+                           compresslevel=self.level) as config_zip:
+            for name, absolute_path in members.items():
+                config_zip.add_member(absolute_path, name)
+
+    def extract(self, filename, dest):
+        with ZipFile(filename, "r") as fp:
+            fp.extractall(dest)
+
+    def remote_extract_bashes(self, remote_path, dest):
+        return [
+            # 安装 unzip command
+            'command -v unzip >/dev/null 2>&1 || { sudo apt-get install unzip -y; }',
+            # 创建解压目录
+            f"mkdir -p {dest}",
+            # 解压压缩文件到指定目录
+            f"unzip -o {remote_path} -d {dest}"
+        ]
+
+
+class ZipDeflateFormat(ZipFormat):
+    NAME = "zip-deflate"
+    COMPRESSION = ZIP_DEFLATED
+    LEVELS = range(0, 10)
+    DEFAULT_LEVEL = 6
+
+
+class TarGzFormat(PackageFormat):
+    NAME = "tar.gz"
+    SUFFIX = ".tar.gz"
+    LEVELS = range(1, 10)
+    DEFAULT_LEVEL = 6
+    STREAM = True
+    # 远程 tar 解压参数
+    TAR_FLAGS = "-xzf"
+
+    def write_tar(self, fileobj, members):
+        """
+        写入 tar 流, 文件属主、修改时间固定
+        :param fileobj: 可写的 file-like object, 不要求可 seek
+        :param members: {archive name: absolute path}
+        :return:
+        """
+        with tarfile.open(fileobj=fileobj, mode="w|", format=tarfile.GNU_FORMAT) as tar:
+            for name, absolute_path in members.items():
+                st = os.stat(absolute_path)
+                info = tarfile.TarInfo(name)
+                info.size = st.st_size
+                info.mode = st.st_mode & 0o777
+                info.mtime = REPRODUCIBLE_MTIME
+                with open(absolute_path, "rb") as fp:
+                    tar.addfile(info, fp)
+
+    def write_fileobj(self, fileobj, members):
+        with gzip.GzipFile(filename="", mode="wb", fileobj=fileobj, compresslevel=self.level, mtime=0) as gz:
+            self.write_tar(gz, members)
+
+    def extract(self, filename, dest):
+        with tarfile.open(filename, "r:gz") as tar:
+            tar.extractall(dest)
+
+    def remote_extract_bashes(self, remote_path, dest):
+        return [
+            f"mkdir -p {dest}",
+            f"tar {self.TAR_FLAGS} {remote_path} -C {dest}"
+        ]
+
+    def remote_stream_bashes(self, dest):
+        return [
+            f"mkdir -p {dest}",
+            f"tar {self.TAR_FLAGS} - -C {dest}"
+        ]
+
+
+class TarZstFormat(TarGzFormat):
+    NAME = "tar.zst"
+    SUFFIX = ".tar.zst"
+    LEVELS = range(1, 23)
+    DEFAULT_LEVEL = 3
+
+    def __init__(self, level=None):
+        if zstandard is None:
+            raise ImportError("package format<tar.zst> required, please run 'pip3 install zstandard'")
+        super(TarZstFormat, self).__init__(level)
+
+    def write_fileobj(self, fileobj, members):
+        # 只结束 zstd 帧, 不关闭 fileobj(如 ssh channel)
+        writer = zstandard.ZstdCompressor(level=self.level).stream_writer(fileobj)
+        self.write_tar(writer, members)
+        writer.flush(zstandard.FLUSH_FRAME)
+
+    def extract(self, filename, dest):
+        with open(filename, "rb") as fp:
+            reader = zstandard.ZstdDecompressor().stream_reader(fp)
+            with tarfile.open(fileobj=reader, mode="r|") as tar:
+                tar.extractall(dest)
+
+    def remote_extract_bashes(self, remote_path, dest):
+        return [
+            'command -v zstd >/dev/null 2>&1 || { sudo apt-get install zstd -y; }',
+            f"mkdir -p {dest}",
+            f"zstd -dcq {remote_path} | tar -xf - -C {dest}"
+        ]
+
+    def remote_stream_bashes(self, dest):
+        return [
+            'command -v zstd >/dev/null 2>&1 || { sudo apt-get install zstd -y; }',
+            f"mkdir -p {dest}",
+            f"zstd -dcq | tar -xf - -C {dest}"
+        ]
+
+
+# 支持的配置包格式
+FORMATS = OrderedDict((f.NAME, f) for f in (ZipFormat, ZipDeflateFormat, TarGzFormat, TarZstFormat))
+
+
+def get_package_format(spec):
+    """
+    解析配置包格式
+    :param spec: 格式名[:压缩级别], 如 zip、zip-deflate:9、tar.gz、tar.zst:19
+    :return: <PackageFormat>
+    """
+    if isinstance(spec, PackageFormat):
+        return spec
+    name, _, level = str(spec).strip().partition(":")
+    if name not in FORMATS:
+        raise AttributeError(f'package format:{name} could not been supported! eg:{"/".join(FORMATS)}')
+    try:
+        level = int(level) if level else None
+    except ValueError:
+        raise AttributeError(f"package format<{name}> compression level must be an integer: {spec}")
+    return FORMATS[name](level)
+
+
+def benchmark_formats(packages, specs=None):
+    """
+    对比各配置包格式的大小及打包、解压耗时
+    :param packages: list [{archive name: absolute path}], 每个元素对应一个配置包
+    :param specs: 待测试的格式, 默认全部格式的默认压缩级别
+    :return: list OrderedDict {format, packages, files, raw, size, ratio, build, extract, error}
+    """
+    raw = sum(os.path.getsize(p) for members in packages for p in members.values())
+    files = sum(len(members) for members in packages)
+    rows = []
+    for spec in specs or list(FORMATS):
+        row = OrderedDict([("format", str(spec)), ("packages", len(packages)), ("files", files), ("raw", raw),
+                           ("size", None), ("ratio", None), ("build", None), ("extract", None), ("error", None)])
+        rows.append(row)
+        try:
+            package_format = get_package_format(spec)
+        except (AttributeError, ImportError) as e:
+            row["error"] = str(e)
+            continue
+        row["format"] = package_format.spec
+        work_dir = tempfile.mkdtemp(prefix="package-benchmark-")
+        try:
+            filenames = [os.path.join(work_dir, f"{i}{package_format.SUFFIX}") for i in range(len(packages))]
+            start = time.perf_counter()
+            for filename, members in zip(filenames, packages):
+                package_format.write(filename, members)
+            row["build"] = time.perf_counter() - start
+            row["size"] = sum(os.path.getsize(f) for f in filenames)
+            row["ratio"] = row["size"] / raw if raw else 1.0
+
+            start = time.perf_counter()
+            for i, filename in enumerate(filenames):
+                package_format.extract(filename, os.path.join(work_dir, f"extract-{i}"))
+            row["extract"] = time.perf_counter() - start
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+    return rows
+
+
+def format_benchmark(rows):
+    """
+    格式化 benchmark_formats 的结果
+    :param rows:
+    :return: str
+    """
+    lines = [f"{'format':<16}{'packages':>10}{'files':>8}{'raw(KB)':>12}{'size(KB)':>12}{'ratio':>8}"
+             f"{'build(ms)':>12}{'extract(ms)':>13}"]
+    for row in rows:
+        if row["error"]:
+            lines.append(f"{row['format']:<16}  {row['error']}")
+            continue
+        lines.append(f"{row['format']:<16}{row['packages']:>10}{row['files']:>8}{row['raw'] / 1024:>12.1f}"
+                     f"{row['size'] / 1024:>12.1f}{row['ratio']:>8.2f}{row['build'] * 1000:>12.1f}"
+                     f"{row['extract'] * 1000:>13.1f}")
+    return "\n".join(lines)
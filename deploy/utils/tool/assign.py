@@ -11,12 +11,18 @@
 import os
 import shutil
 import logging
+import tempfile
+import threading
 from collections import OrderedDict
 from sortedcontainers import SortedSet
-from utils.remote import HostPool, SshHost
+from utils.remote import HostPool, SshHost, EventLoopThread
 from utils import Dict2Obj, format_org_domain, to_array
-from .zip import ConfigZipFile
-from .module import Role, Element, ZipType
+from concurrent.futures import ProcessPoolExecutor
+from .archive import build_package, get_package_format, benchmark_formats
+from .manifest import PackageManifest
+from .bundle import SharedBundle
+from .executor import ParallelExecutor, AsyncExecutor
+from .module import Role, Element
 logger = logging.getLogger(__name__)
 
 
@@ -75,6 +81,68 @@ class AssignManage(object):
 
         self.remote_bash_path = "$HOME/fabric-scripts"
         self.remote_tmp_path = "/tmp"
+        # 拷贝 zip 包时对比远程文件 sha256, 只上传变化的文件
+        self.delta_upload = True
+        # 拷贝配置时以 tar 流直接写入远程解压命令, 不生成本地 zip 包及远程临时文件
+        self.stream_upload = False
+        # 多台主机共用的文件经种子主机树形中继分发
+        self.relay = False
+        self.relay_fanout = 2
+        # 按打包清单跳过未变化的配置包: 打包时不重新生成, 拷贝时不重复拷贝
+        self.incremental = True
+        # 并发打包的进程数, 1 为在当前进程中依次打包
+        self.package_workers = 1
+        # 共用证书目录打包为按内容寻址的共享包, 每台主机只上传一次
+        self.shared_bundle = False
+        self.bundle_output = os.path.join(self.package_output, "bundles")
+        self.__bundles = {}
+        self.__host_bundles = {}
+        self.__bundle_lock = threading.Lock()
+        # 同一台主机的所有配置包合并为一个压缩包, 只上传、解压一次
+        self.host_bundle = False
+        self.host_package_output = os.path.join(self.package_output, "hosts")
+        # 配置包在内存中生成并直接上传, 超过阈值时转存至临时文件, 不写入 package 目录
+        self.memory_package = False
+        self.memory_package_threshold = 16 * 1024 * 1024
+        # 配置包格式, 见 utils.tool.archive
+        self.package_format = get_package_format("zip")
+
+        # 并发执行配置
+        self.parallel = False
+        self.max_workers = 8
+        self.per_host_workers = 1
+        # 一键部署时并发创建/加入的 channel 数, 1 为顺序执行
+        self.channel_workers = 1
+
+    def set_parallel(self, parallel=True, max_workers=None, per_host_workers=None):
+        """
+        设置 handle_func 默认的并发执行模式
+        :param parallel:  是否并发执行
+        :param max_workers:  全局最大并发数
+        :param per_host_workers:  单台主机最大并发数
+        :return:
+        """
+        self.parallel = parallel
+        if max_workers:
+            self.max_workers = max_workers
+        if per_host_workers:
+            self.per_host_workers = per_host_workers
+
+    def set_package_format(self, spec):
+        """
+        设置配置包格式
+        :param spec: 格式名[:压缩级别], 如 zip、zip-deflate:9、tar.gz、tar.zst:19
+        :return:
+        """
+        self.package_format = get_package_format(spec)
+
+    @property
+    def stream_format(self):
+        """
+        流式拷贝使用的格式, zip 格式无法从 stdin 解压, 使用 tar.gz
+        :return: <PackageFormat>
+        """
+        return self.package_format if self.package_format.STREAM else get_package_format("tar.gz")
 
     @property
     def network(self,):
@@ -226,23 +294,165 @@ class AssignManage(object):
 
     def zip(self, *modules):
         """
-        压缩服务对应组件需要的配置文件
+        压缩服务对应组件需要的配置文件, 打包文件内容与清单一致的配置包不重新生成
+        :return: list 重新打包的组件域名
         """
+        dirty = OrderedDict()
+        layout = "+".join(([] if self.package_format.NAME == "zip" else [self.package_format.spec]) +
+                          (["shared-bundle"] if self.shared_bundle else []))
+        with self.__bundle_lock:
+            self.__bundles = {}
+
         def _zip(elements):
             for _domain in elements:
-                elements[_domain].reload()
-                zip_files = elements[_domain].zip_filenames
-                config_zip = ConfigZipFile(elements[_domain].absolute_zip_path)
-                for absolute_path in zip_files:
-                    archive_path, path_type = zip_files[absolute_path]
-                    if path_type is ZipType.FILE:
-                        config_zip.add_file(absolute_path, archive_path)
-                    elif path_type is ZipType.DIR:
-                        config_zip.add_directory(absolute_path, archive_path)
-                    else:
-                        pass
+                ele = elements[_domain]
+                ele.reload()
+                previous = PackageManifest.load(ele.absolute_manifest_path)
+                manifest = PackageManifest.build(ele.archive_members(), previous, layout)
+                # 流式拷贝、内存打包时在上传过程中打包, 只记录清单
+                packaged = self.stream_upload or self.memory_package or os.path.exists(ele.absolute_zip_path)
+                if self.incremental and packaged and manifest.same_content(previous):
+                    if manifest.entries != previous.entries:
+                        # 只有修改时间变化, 更新清单
+                        manifest.save(ele.absolute_manifest_path)
+                    continue
+                dirty[_domain] = (ele, manifest)
+                # 预先生成共享包
+                self.element_bundles(ele)
         _ = list(map(lambda m: _zip(self.__get_module(m)), modules))
 
+        if not self.stream_upload and not self.memory_package:
+            jobs = [(ele.absolute_zip_path, list(ele.package_filenames(not self.shared_bundle).items()))
+                    for ele, _ in dirty.values()]
+            if self.package_workers > 1 and len(jobs) > 1:
+                with ProcessPoolExecutor(max_workers=min(self.package_workers, len(jobs))) as pool:
+                    _ = list(pool.map(build_package, [j[0] for j in jobs], [j[1] for j in jobs],
+                                      [self.package_format] * len(jobs)))
+            else:
+                _ = [build_package(*job, self.package_format) for job in jobs]
+        for ele, manifest in dirty.values():
+            manifest.save(ele.absolute_manifest_path)
+
+        dirty = list(dirty)
+        if dirty:
+            logger.info(f"packages rebuilt: {', '.join(dirty)}")
+        else:
+            logger.info("all packages are up to date.")
+        return dirty
+
+    def open_package(self, members):
+        """
+        在内存中生成配置包, 超过 memory_package_threshold 时转存至临时文件
+        :param members: {archive name: absolute path}
+        :return: file-like object, 已 seek 至开头, 使用后需要 close
+        """
+        fp = tempfile.SpooledTemporaryFile(max_size=self.memory_package_threshold)
+        try:
+            self.package_format.write_fileobj(fp, members)
+            fp.seek(0)
+        except Exception:
+            fp.close()
+            raise
+        return fp
+
+    def benchmark(self, *modules, specs=None):
+        """
+        对比各配置包格式打包当前输出目录中的配置文件时的大小及打包、解压耗时
+        :param modules: 组件名 zookeeper/kafka/orderer/peer/orderer-cli/peer-cli/explorer
+        :param specs: 待测试的格式, 默认全部格式
+        :return: list, 见 utils.tool.archive.benchmark_formats
+        """
+        packages = []
+        for module in modules:
+            for ele in self.__get_module(module).values():
+                ele.reload()
+                packages.append(ele.archive_members(not self.shared_bundle))
+        return benchmark_formats(packages, specs)
+
+    def is_dirty(self, ele):
+        """
+        配置包是否需要拷贝: 未按清单拷贝至组件所在主机, 或拷贝后内容已变化;
+        对比远程 sha256 时拷贝记录不作为跳过依据(主机可能已重建或远程目录被清除), 由一次远程 sha256 对比决定
+        :param ele: object <Element>
+        :return:
+        """
+        if not self.incremental or self.delta_upload:
+            return True
+        return not PackageManifest.load(ele.absolute_manifest_path).is_shipped(ele.ip)
+
+    def mark_shipped(self, ele):
+        """
+        记录配置包已拷贝至组件所在主机
+        :param ele: object <Element>
+        :return:
+        """
+        manifest = PackageManifest.load(ele.absolute_manifest_path)
+        if manifest.entries:
+            manifest.mark_shipped(ele.ip)
+            manifest.save(ele.absolute_manifest_path)
+
+    def reset_shipped(self, ip=None):
+        """
+        清除配置包的拷贝记录, 远程配置目录被删除后需要重新拷贝
+        :param ip: 主机 ip, 为空时清除所有主机
+        :return:
+        """
+        for module in AssignManage.MODULES - {"docker"}:
+            for ele in self.__get_module(module).values():
+                if (ip is None or ele.ip == ip) and os.path.exists(ele.absolute_manifest_path):
+                    manifest = PackageManifest.load(ele.absolute_manifest_path)
+                    manifest.reset_shipped(ip)
+                    manifest.save(ele.absolute_manifest_path)
+        with self.__bundle_lock:
+            if ip is None:
+                self.__host_bundles = {}
+            else:
+                self.__host_bundles.pop(ip, None)
+
+    def element_bundles(self, ele):
+        """
+        组件引用的共享包, 未生成的共享包在此生成
+        :param ele: object <Element>
+        :return: list<SharedBundle>
+        """
+        if not self.shared_bundle:
+            return []
+        bundles = []
+        for absolute_path in sorted(ele.shared_paths):
+            if not os.path.isdir(absolute_path):
+                continue
+            with self.__bundle_lock:
+                bundle = self.__bundles.get(absolute_path, None)
+                if bundle is None:
+                    bundle = SharedBundle(absolute_path, ele.zip_filenames[absolute_path][0], self.package_format)
+                    if not os.path.exists(self.bundle_output):
+                        os.makedirs(self.bundle_output)
+                    bundle.build(self.bundle_output)
+                    self.__bundles[absolute_path] = bundle
+            bundles.append(bundle)
+        return bundles
+
+    def host_bundles(self, ip):
+        """
+        主机已安装的共享包
+        :param ip:
+        :return: set<bundle name>, 未查询过远程主机时返回 None
+        """
+        with self.__bundle_lock:
+            return self.__host_bundles.get(ip, None)
+
+    def add_host_bundles(self, ip, names):
+        """
+        记录主机已安装的共享包
+        :param ip:
+        :param names: 共享包名
+        :return: set<bundle name>
+        """
+        with self.__bundle_lock:
+            installed = self.__host_bundles.setdefault(ip, set())
+            installed.update(names)
+            return set(installed)
+
     def show_zip(self, module):
         """
         show 服务对应组件需要的配置文件
@@ -253,28 +463,28 @@ class AssignManage(object):
         for _domain in elements:
             elements[_domain].show_zip_path()
 
-    def handle_func(self, func, modules=None, hosts=None, **kwargs):
+    def __todo_elements(self, modules=None, hosts=None, **kwargs):
         """
-        对模块对应的服务器进行操作
-        :param func:   def handle(domain, ele, host)
+        获取待处理的组件
         :param modules:  组件名 zookeeper/kafka/orderer/peer/orderer-cli/peer-cli/explorer
         :param hosts:  主机 ips/domains
         :param kwargs:
-            orgs :  当modules 为 peer/peer-cli 时 支持 org 选择；
-                    当指定 ips/domains 不支持 org 选择
-        :return:
+            orgs :  当modules 为 peer/peer-cli 时 支持 org 选择
+        :return: list [(domain, ele)], 参数错误时返回 None
         """
         modules = to_array(modules, "modules")
         hosts = to_array(hosts, "hosts")
 
         if not modules:
             logger.error(f'Please specify the module [{"/".join(AssignManage.MODULES)}]')
-            return
+            return None
 
         if hosts and len(modules) > 1:
             logger.error('Host cannot be specified when multiple modules are specified!')
-            return
+            return None
 
+        # 待处理的组件 [(domain, ele)]
+        todo_elements = []
         if hosts:
             module = modules[0]
             # 当处理 peer/peer-cli 模块时指定了 --remote-hosts, 只支持指定一个 org
@@ -284,11 +494,11 @@ class AssignManage(object):
                 if len(orgs) == 0:
                     logger.error(f"When dealing with module<{module}>, it is specified that --remote-hosts,"
                                  f"parameter --remote-org/--install-org have to fill one org-name!")
-                    return
+                    return None
                 if orgs and len(orgs) != 1:
                     logger.error(f"When dealing with module<{module}>, it is specified that --remote-hosts,"
                                  f"parameter --remote-org/--install-org supports only one org-name!")
-                    return
+                    return None
                 _tmp_msg = f"<organization [{format_org_domain(orgs[0])}]>"
                 elements = self.get_org_elements(module, orgs)
             else:
@@ -302,18 +512,123 @@ class AssignManage(object):
                 host = self.get_host(h, throw=True)
                 if host.ip not in module_ips:
                     logger.error(f'The host<{h}> does not belong to the peers of the module <{module}{_tmp_msg}>')
-                    return
+                    return None
                 todo_ips.add(host.ip)
-            # do func
             for k in elements:
                 ele = elements[k]
                 if ele.ip in todo_ips:
-                    func(domain=ele.role_domain, ele=ele, host=self.get_host(ele.ip), **kwargs)
+                    todo_elements.append((ele.role_domain, ele))
         else:
             for _module in modules:
                 elements = self.get_org_elements(_module, kwargs.get("orgs", None))
                 for d, e in elements.items():
-                    func(ele=e, host=self.get_host(e.ip), domain=d, **kwargs)
+                    todo_elements.append((d, e))
+
+        return todo_elements
+
+    def handle_func(self, func, modules=None, hosts=None, parallel=None, **kwargs):
+        """
+        对模块对应的服务器进行操作
+        :param func:   def handle(domain, ele, host)
+        :param modules:  组件名 zookeeper/kafka/orderer/peer/orderer-cli/peer-cli/explorer
+        :param hosts:  主机 ips/domains
+        :param parallel:  是否并发执行, 默认使用 AssignManage.parallel 配置
+                    并发执行时单个组件失败不会中断其他组件, 全部执行完成后汇总抛出 RuntimeError
+        :param kwargs:
+            orgs :  当modules 为 peer/peer-cli 时 支持 org 选择；
+                    当指定 ips/domains 不支持 org 选择
+        :return: 并发执行时返回 <ExecuteResult>
+        """
+        todo_elements = self.__todo_elements(modules, hosts, **kwargs)
+        if todo_elements is None:
+            return
+
+        parallel = self.parallel if parallel is None else parallel
+        # do func
+        if not parallel:
+            for d, e in todo_elements:
+                func(ele=e, host=self.get_host(e.ip), domain=d, **kwargs)
+            return
+
+        executor = ParallelExecutor(max_workers=self.max_workers, per_host=self.per_host_workers)
+        for d, e in todo_elements:
+            executor.submit(d, e.ip, func, ele=e, host=self.get_host(e.ip), domain=d, **kwargs)
+        result = executor.run()
+        result.summary(logger)
+        result.raise_for_failure()
+        return result
+
+    def handle_host_func(self, func, modules=None, hosts=None, parallel=None, **kwargs):
+        """
+        按主机对模块对应的组件进行操作, 同一台主机的组件在一次调用中处理
+        :param func:   def handle(host, elements), elements 为 list [(domain, ele)]
+        :param modules:  组件名 zookeeper/kafka/orderer/peer/orderer-cli/peer-cli/explorer
+        :param hosts:  主机 ips/domains
+        :param parallel:  是否并发执行, 默认使用 AssignManage.parallel 配置
+        :param kwargs:
+            orgs :  当modules 为 peer/peer-cli 时 支持 org 选择
+        :return: 并发执行时返回 <ExecuteResult>
+        """
+        todo_elements = self.__todo_elements(modules, hosts, **kwargs)
+        if todo_elements is None:
+            return
+        todo_hosts = OrderedDict()
+        for d, e in todo_elements:
+            todo_hosts.setdefault(e.ip, []).append((d, e))
+
+        parallel = self.parallel if parallel is None else parallel
+        if not parallel:
+            for ip, elements in todo_hosts.items():
+                func(host=self.get_host(ip), elements=elements, **kwargs)
+            return
+
+        executor = ParallelExecutor(max_workers=self.max_workers, per_host=1)
+        for ip, elements in todo_hosts.items():
+            executor.submit(ip, ip, func, host=self.get_host(ip), elements=elements, **kwargs)
+        result = executor.run()
+        result.summary(logger)
+        result.raise_for_failure()
+        return result
+
+    def host_zip_name(self, ip):
+        """
+        主机合并配置包名
+        :param ip:
+        :return:
+        """
+        return f"host-{ip.replace('.', '-')}{self.package_format.SUFFIX}"
+
+    def host_zip_path(self, ip):
+        """
+        主机合并配置包路径
+        :param ip:
+        :return:
+        """
+        if not os.path.exists(self.host_package_output):
+            os.makedirs(self.host_package_output)
+        return os.path.join(self.host_package_output, self.host_zip_name(ip))
+
+    def handle_coroutine(self, func, modules=None, hosts=None, **kwargs):
+        """
+        对模块对应的服务器进行异步操作, 所有组件在同一个事件循环中并发执行
+        :param func:   async def handle(domain, ele, host)
+        :param modules:  组件名 zookeeper/kafka/orderer/peer/orderer-cli/peer-cli/explorer
+        :param hosts:  主机 ips/domains
+        :param kwargs:
+            orgs :  当modules 为 peer/peer-cli 时 支持 org 选择
+        :return: <ExecuteResult>
+        """
+        todo_elements = self.__todo_elements(modules, hosts, **kwargs)
+        if todo_elements is None:
+            return
+
+        executor = AsyncExecutor(max_workers=self.max_workers, per_host=self.per_host_workers)
+        for d, e in todo_elements:
+            executor.submit(d, e.ip, func, ele=e, host=self.get_host(e.ip), domain=d, **kwargs)
+        result = EventLoopThread.instance().call(executor.run())
+        result.summary(logger)
+        result.raise_for_failure()
+        return result
 
     def clean_package(self):
         """
@@ -336,6 +651,7 @@ class AssignManage(object):
             if self.remote_tmp_path != "/":
                 _cmd.append(f"sh -c 'if [ -x {self.remote_bash_path} ]; then sudo rm -rf {self.remote_bash_path}; fi'")
             _cmd.append(f"sh -c 'if [ -x /data ]; then sudo rm -rf /data; fi'")
+            self.reset_shipped(host.ip)
 
             # remove docker images
             _cmd.append("""docker images | grep "^hyperledger" | awk '{print $3}' > /tmp/h""")
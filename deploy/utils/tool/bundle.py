@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+    共享证书包: 多个组件共用的证书目录(组织 users、orderer tlscacerts 等)按内容 sha256 寻址
+        - 每个共享目录只打包一次, 包名为内容摘要, 组件配置包中不再包含共享目录
+        - 远程主机在 <bash path>/.bundles 下记录已解压的共享包, 已持有的共享包不再上传
+        - 共享包解压至与组件配置包相同的根目录, 远程目录结构不变
+        - 共享包使用与组件配置包相同的格式(--package-format)打包、解压
+"""
+import os
+import hashlib
+from pathlib import Path
+from collections import OrderedDict
+from .archive import ZipFormat
+from .delta import file_digests
+
+
+class SharedBundle(object):
+    # 远程记录已安装共享包的目录, 相对 remote_bash_path
+    STORE = ".bundles"
+
+    def __init__(self, absolute_path, archive_path, package_format=None):
+        """
+        :param absolute_path: 共享目录本地路径
+        :param archive_path:  共享目录归档路径
+        :param package_format: <PackageFormat>, 默认 zip 存储模式
+        """
+        self.absolute_path = absolute_path
+        self.archive_path = archive_path
+        self.package_format = package_format or ZipFormat()
+        self.members = OrderedDict()
+        for root, dirs, files in os.walk(absolute_path):
+            dirs.sort()
+            for file in sorted(files):
+                file_path = os.path.join(root, file)
+                relative_path = Path(file_path).relative_to(absolute_path)
+                self.members[Path(os.path.join(archive_path, relative_path)).as_posix()] = file_path
+
+        sha256 = hashlib.sha256()
+        for name, digest in file_digests(self.members).items():
+            sha256.update(f"{name}\0{digest}\n".encode("utf-8"))
+        self.digest = sha256.hexdigest()
+        # 共享包名, 与格式无关, 同时作为远程的安装记录
+        self.name = self.digest[:16]
+        self.filename = f"{self.name}{self.package_format.SUFFIX}"
+
+    def build(self, output):
+        """
+        生成共享包, 内容相同的共享包已存在时不重新生成
+        :param output: 共享包目录
+        :return: 共享包路径
+        """
+        filename = os.path.join(output, self.filename)
+        if not os.path.exists(filename):
+            self.package_format.write(filename, self.members)
+        return filename
+
+    @staticmethod
+    def remote_list_cmd(bash_path):
+        """
+        列出远程已安装的共享包
+        """
+        return f"ls {bash_path}/{SharedBundle.STORE} 2>/dev/null; true"
+
+    def remote_install_bashes(self, bash_path, tmp_path):
+        """
+        解压共享包并记录, 解压命令随格式变化
+        :param bash_path: 远程解压目录
+        :param tmp_path:  共享包上传目录
+        :return: list<command>
+        """
+        return self.package_format.remote_extract_bashes(f"{tmp_path}/{self.filename}", bash_path) + [
+            f"mkdir -p {bash_path}/{SharedBundle.STORE}",
+            f"rm -f {tmp_path}/{self.filename}",
+            f"touch {bash_path}/{SharedBundle.STORE}/{self.name}"
+        ]
+
+    def __repr__(self):
+        return f"<SharedBundle: {self.filename} {self.archive_path}>"
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+    增量上传: 对比待打包文件与远程解压目录中文件的 sha256
+        - 全部一致时跳过上传和解压
+        - 部分变化时只打包变化的文件上传
+"""
+import shlex
+import hashlib
+from collections import OrderedDict
+
+
+def file_digests(members):
+    """
+    本地文件内容的 sha256
+    :param members: {archive name: absolute path}
+    :return: OrderedDict {archive name: sha256}
+    """
+    digests = OrderedDict()
+    for name, absolute_path in members.items():
+        sha256 = hashlib.sha256()
+        with open(absolute_path, "rb") as fp:
+            for chunk in iter(lambda: fp.read(1024 * 1024), b""):
+                sha256.update(chunk)
+        digests[name] = sha256.hexdigest()
+    return digests
+
+
+def remote_digest_cmd(root, names):
+    """
+    远程计算文件 sha256 的命令, 不存在的文件不输出
+    :param root:  远程解压目录, 可包含 $HOME 等环境变量
+    :param names: 相对 root 的文件列表
+    :return:
+    """
+    files = " ".join(shlex.quote(name) for name in names)
+    return f"cd {root} 2>/dev/null && sha256sum -- {files} 2>/dev/null; true"
+
+
+def parse_digests(stdout):
+    """
+    解析 sha256sum 输出
+    :param stdout:
+    :return: dict {name: sha256}
+    """
+    digests = {}
+    for line in (stdout or "").splitlines():
+        parts = line.strip().split(None, 1)
+        if len(parts) == 2:
+            # 二进制模式下文件名前带 '*'
+            digests[parts[1].lstrip("*")] = parts[0]
+    return digests
+
+
+def changed_files(local, remote):
+    """
+    本地与远程内容不一致或远程不存在的文件
+    :param local:  {name: sha256}
+    :param remote: {name: sha256}
+    :return: list
+    """
+    return [name for name, digest in local.items() if remote.get(name, None) != digest]
+
@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+    并发执行器: 按主机并发执行组件回调函数
+        - 全局并发数上限 max_workers
+        - 单台主机并发数上限 per_host
+    按 key 的信号量: 不同任务共用的资源(容器、orderer 等)需要串行访问时使用
+"""
+import time
+import asyncio
+import logging
+import threading
+from contextlib import contextmanager
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+logger = logging.getLogger(__name__)
+
+
+class TaskResult(object):
+    """
+    单个任务执行结果
+    """
+    def __init__(self, key, host, ok, duration, result=None, error=None):
+        """
+        :param key:  任务标识, 一般为 role_domain
+        :param host: 任务对应的主机 ip
+        :param ok:   是否执行成功
+        :param duration: 执行耗时(秒)
+        :param result: 回调函数返回值
+        :param error:  执行失败时的异常
+        """
+        self.key = key
+        self.host = host
+        self.ok = ok
+        self.duration = duration
+        self.result = result
+        self.error = error
+
+    def __repr__(self):
+        state = "OK" if self.ok else f"FAILED({self.error})"
+        return f"<TaskResult: {self.key}@{self.host} {state} {self.duration:.2f}s>"
+
+
+class ExecuteResult(object):
+    """
+    所有任务的汇总结果
+    """
+    def __init__(self, results, duration):
+        self.results = results
+        self.duration = duration
+
+    @property
+    def succeeded(self):
+        return [r for r in self.results if r.ok]
+
+    @property
+    def failed(self):
+        return [r for r in self.results if not r.ok]
+
+    @property
+    def ok(self):
+        return not self.failed
+
+    def summary(self, log=logger):
+        """
+        打印执行汇总
+        :param log:
+        :return:
+        """
+        for r in self.results:
+            if r.ok:
+                log.info(f"[{r.host}] {r.key} finished in {r.duration:.2f}s")
+            else:
+                log.error(f"[{r.host}] {r.key} failed in {r.duration:.2f}s: {r.error}")
+        slowest = max(self.results, key=lambda r: r.duration) if self.results else None
+        log.info(f"{len(self.succeeded)} succeeded, {len(self.failed)} failed, "
+                 f"wall time {self.duration:.2f}s"
+                 f"{f', slowest {slowest.key}@{slowest.host} {slowest.duration:.2f}s' if slowest else ''}")
+
+    def raise_for_failure(self):
+        """
+        存在失败任务时抛出汇总异常
+        :raise RuntimeError
+        """
+        if self.failed:
+            raise RuntimeError("; ".join(f"{r.key}@{r.host}: {r.error}" for r in self.failed))
+
+
+class ParallelExecutor(object):
+    """
+    线程池执行器, 同一主机上的任务数受 per_host 限制, 保证同一 ssh 连接不会被过多线程同时使用
+    """
+    def __init__(self, max_workers=8, per_host=1):
+        """
+        :param max_workers: 全局最大并发数
+        :param per_host: 单台主机最大并发数
+        """
+        if max_workers < 1 or per_host < 1:
+            raise AttributeError("max_workers and per_host must be greater than 0!")
+        self.max_workers = max_workers
+        self.per_host = per_host
+        self.tasks = []
+
+    def submit(self, _key, _ip, _func, *args, **kwargs):
+        """
+        添加任务, args/kwargs 原样传递给回调函数(可包含 key/host 等参数)
+        :param _key:  任务标识
+        :param _ip:   主机 ip
+        :param _func: 回调函数
+        :return:
+        """
+        self.tasks.append((_key, _ip, _func, args, kwargs))
+
+    @staticmethod
+    def _call(key, host, func, args, kwargs):
+        start = time.time()
+        try:
+            ret = func(*args, **kwargs)
+            return TaskResult(key, host, True, time.time() - start, result=ret)
+        except Exception as e:
+            return TaskResult(key, host, False, time.time() - start, error=e)
+
+    def run(self):
+        """
+        执行所有任务, 单个任务失败不会中断其他任务
+        :return: <ExecuteResult>
+        """
+        start = time.time()
+        pending = deque(enumerate(self.tasks))
+        results = [None] * len(self.tasks)
+        self.tasks = []
+        running = {}
+        host_running = {}
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            while pending or running:
+                # 调度: 主机仍有空闲额度的任务才提交
+                skipped = deque()
+                while pending and len(running) < self.max_workers:
+                    index, task = pending.popleft()
+                    key, host, func, args, kwargs = task
+                    if host_running.get(host, 0) >= self.per_host:
+                        skipped.append((index, task))
+                        continue
+                    host_running[host] = host_running.get(host, 0) + 1
+                    running[pool.submit(self._call, key, host, func, args, kwargs)] = (index, host)
+                pending.extendleft(reversed(skipped))
+
+                done, _ = wait(list(running), return_when=FIRST_COMPLETED)
+                for future in done:
+                    index, host = running.pop(future)
+                    host_running[host] -= 1
+                    results[index] = future.result()
+
+        return ExecuteResult(results, time.time() - start)
+
+
+class KeyedSemaphore(object):
+    """
+    按 key 分配的信号量, 同一 key 同时持有的线程数受 size 限制
+        locks = KeyedSemaphore()
+        with locks.hold("peer-cli0.orgEast.parcelx.io"), locks.hold(host.ip, per_host_workers):
+            ...
+    多个 key 需按相同的顺序获取, 避免死锁
+    """
+    def __init__(self, size=1):
+        """
+        :param size: 默认的同一 key 最大并发数
+        """
+        if size < 1:
+            raise AttributeError("size must be greater than 0!")
+        self.size = size
+        self.__lock = threading.Lock()
+        self.__semaphores = {}
+
+    def get(self, key, size=None):
+        """
+        :param key:
+        :param size: 首次获取该 key 时的最大并发数, 默认 self.size
+        :return: threading.BoundedSemaphore
+        """
+        with self.__lock:
+            if key not in self.__semaphores:
+                self.__semaphores[key] = threading.BoundedSemaphore(max(size or self.size, 1))
+            return self.__semaphores[key]
+
+    @contextmanager
+    def hold(self, key, size=None):
+        with self.get(key, size):
+            yield
+
+
+class AsyncExecutor(object):
+    """
+    协程执行器, 所有任务在同一个事件循环中执行, 并发数受 max_workers 和 per_host 限制
+    """
+    def __init__(self, max_workers=64, per_host=1):
+        """
+        :param max_workers: 全局最大并发数
+        :param per_host: 单台主机最大并发数
+        """
+        if max_workers < 1 or per_host < 1:
+            raise AttributeError("max_workers and per_host must be greater than 0!")
+        self.max_workers = max_workers
+        self.per_host = per_host
+        self.tasks = []
+
+    def submit(self, _key, _ip, _func, *args, **kwargs):
+        """
+        添加任务, args/kwargs 原样传递给回调函数(可包含 key/host 等参数)
+        :param _key:  任务标识
+        :param _ip:   主机 ip
+        :param _func: 协程函数 async def
+        :return:
+        """
+        self.tasks.append((_key, _ip, _func, args, kwargs))
+
+    async def run(self):
+        """
+        执行所有任务, 单个任务失败不会中断其他任务
+        :return: <ExecuteResult>
+        """
+        start = time.time()
+        tasks, self.tasks = self.tasks, []
+        total = asyncio.Semaphore(self.max_workers)
+        hosts = {host: asyncio.Semaphore(self.per_host) for _, host, _, _, _ in tasks}
+
+        async def _call(key, host, func, args, kwargs):
+            async with total, hosts[host]:
+                _start = time.time()
+                try:
+                    ret = await func(*args, **kwargs)
+                    return TaskResult(key, host, True, time.time() - _start, result=ret)
+                except Exception as e:
+                    return TaskResult(key, host, False, time.time() - _start, error=e)
+
+        results = await asyncio.gather(*[_call(*task) for task in tasks])
+        return ExecuteResult(list(results), time.time() - start)
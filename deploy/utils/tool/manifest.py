@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+    打包清单: 记录组件配置包中每个文件的归档路径、源路径、大小、修改时间及 sha256
+        - 重新打包前对比清单, 输入文件未变化的配置包不重新生成
+        - 大小及修改时间未变化的文件复用上次计算的 sha256
+        - 记录每台主机最近一次拷贝的配置包摘要, 未变化的配置包不再拷贝
+"""
+import os
+import json
+import hashlib
+from collections import OrderedDict
+
+
+class PackageManifest(object):
+
+    def __init__(self, entries=None, shipped=None, layout=""):
+        """
+        :param entries: OrderedDict {archive name: {"path", "size", "mtime", "sha256"}}
+        :param shipped: dict {ip: 已拷贝的配置包摘要}
+        :param layout:  打包方式, 打包方式变化时配置包需要重新生成
+        """
+        self.entries = entries if entries is not None else OrderedDict()
+        self.shipped = shipped if shipped is not None else {}
+        self.layout = layout
+
+    @staticmethod
+    def load(filename):
+        """
+        读取清单, 不存在或格式错误时返回空清单
+        :param filename:
+        :return: <PackageManifest>
+        """
+        if not os.path.exists(filename):
+            return PackageManifest()
+        try:
+            with open(filename, "r") as fp:
+                data = json.load(fp, object_pairs_hook=OrderedDict)
+            return PackageManifest(data.get("entries", OrderedDict()), data.get("shipped", {}), data.get("layout", ""))
+        except (ValueError, AttributeError):
+            return PackageManifest()
+
+    def save(self, filename):
+        with open(filename, "w") as fp:
+            json.dump(OrderedDict([("digest", self.digest), ("layout", self.layout), ("entries", self.entries),
+                                   ("shipped", self.shipped)]), fp, indent=4)
+
+    @staticmethod
+    def build(members, previous=None, layout=""):
+        """
+        生成清单
+        :param members: {archive name: absolute path}
+        :param previous: 上次的清单, 源路径、大小及修改时间一致的文件复用其 sha256
+        :param layout: 打包方式
+        :return: <PackageManifest>
+        """
+        entries = OrderedDict()
+        old = previous.entries if previous is not None else {}
+        for name, absolute_path in members.items():
+            st = os.stat(absolute_path)
+            entry = old.get(name, None)
+            if not (entry and entry["path"] == absolute_path and entry["size"] == st.st_size
+                    and entry["mtime"] == st.st_mtime):
+                sha256 = hashlib.sha256()
+                with open(absolute_path, "rb") as fp:
+                    for chunk in iter(lambda: fp.read(1024 * 1024), b""):
+                        sha256.update(chunk)
+                entry = OrderedDict([("path", absolute_path), ("size", st.st_size),
+                                     ("mtime", st.st_mtime), ("sha256", sha256.hexdigest())])
+            entries[name] = entry
+        return PackageManifest(entries, dict(previous.shipped) if previous is not None else {}, layout)
+
+    @property
+    def digest(self):
+        """
+        配置包内容摘要, 只与打包方式、归档路径及文件内容有关
+        :return:
+        """
+        sha256 = hashlib.sha256()
+        if self.layout:
+            sha256.update(f"layout\0{self.layout}\n".encode("utf-8"))
+        for name in sorted(self.entries):
+            sha256.update(f"{name}\0{self.entries[name]['sha256']}\n".encode("utf-8"))
+        return sha256.hexdigest()
+
+    def same_content(self, other):
+        return other is not None and self.digest == other.digest
+
+    def is_shipped(self, ip):
+        return self.shipped.get(ip, None) == self.digest
+
+    def mark_shipped(self, ip):
+        self.shipped[ip] = self.digest
+
+    def reset_shipped(self, ip=None):
+        if ip is None:
+            self.shipped = {}
+        else:
+            self.shipped.pop(ip, None)
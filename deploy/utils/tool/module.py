@@ -12,6 +12,7 @@ import json
 from collections import OrderedDict
 from utils import POSIX, to_array
 from enum import Enum, IntEnum, unique
+from .archive import package_members
 
 
 @unique
@@ -51,12 +52,15 @@ class Element(object):
         # 角色对应的域名
         self.role_domain = kwargs["role_domain"]
 
-        # zip 包名
-        self.zip_name = self.role_domain.replace(".", "-") + ".zip"
-        # zip 包相对路径
-        self.absolute_zip_path = os.path.join(self.parent.package_output, self.zip_name)
+        # 配置包名, 后缀由配置包格式决定
+        self.package_name = self.role_domain.replace(".", "-")
+        # 打包清单, 记录打包文件的 sha256 及已拷贝的主机
+        self.manifest_name = self.role_domain.replace(".", "-") + ".manifest.json"
+        self.absolute_manifest_path = os.path.join(self.parent.package_output, self.manifest_name)
         # zip 包待压缩的文件列表
         self.zip_filenames = OrderedDict()
+        # 多个组件共用的目录, 可打包为共享证书包
+        self.shared_paths = set()
 
         # docker container name
         self.docker_container_name = None
@@ -82,15 +86,18 @@ class Element(object):
         absolute_path = os.path.join(self.parent.compose_output, f"{self.role_domain}.sh")
         self.zip_filenames[absolute_path] = ("", ZipType.FILE)
 
-    def __crypto_path_join(self, path, t=ZipType.DIR):
+    def __crypto_path_join(self, path, t=ZipType.DIR, shared=False):
         """
         目录拼接，设置证书路径和归档路径
         :param path:  证书相对路径
+        :param shared: 是否为多个组件共用的目录
         :return:
         """
         absolute_path = os.path.join(self.parent.crypto_output, path)
         if t is ZipType.DIR:
             self.zip_filenames[absolute_path] = (path, t)
+            if shared:
+                self.shared_paths.add(absolute_path)
         elif t is ZipType.FILE:
             self.zip_filenames[absolute_path] = (os.path.dirname(path), t)
         else:
@@ -126,10 +133,10 @@ class Element(object):
             self.__crypto_path_join(path)
             # peer user msp
             path = f"crypto-config/peerOrganizations/{self.org}.{self.domain}/users"
-            self.__crypto_path_join(path)
+            self.__crypto_path_join(path, shared=True)
             # orderer tls ca
             path = f"crypto-config/ordererOrganizations/{self.domain}/users/Admin@{self.domain}/msp/tlscacerts/"
-            self.__crypto_path_join(path)
+            self.__crypto_path_join(path, shared=True)
             # docker info
             self.docker_container_name = self.role_domain
             self.docker_container_volume = f'/data/fabric/{self.role_domain.replace("-cli", "")}/cli-data'
@@ -144,7 +151,7 @@ class Element(object):
         elif self.role is Role.ORDERER_CLI:
             # orderer user msp
             path = f"crypto-config/ordererOrganizations/{self.domain}/users/"
-            self.__crypto_path_join(path)
+            self.__crypto_path_join(path, shared=True)
             # docker info
             self.docker_container_name = self.role_domain
 
@@ -179,9 +186,6 @@ class Element(object):
                 for value in peers.values():
                     if "tlsCACerts" in value:
                         self.__crypto_path_join(value["tlsCACerts"]["path"][5:], t=ZipType.FILE)
-
-            if os.path.exists(self.absolute_zip_path):
-                os.remove(self.absolute_zip_path)
         else:
             pass
 
@@ -197,6 +201,35 @@ class Element(object):
             raise AttributeError("Add zip path type error! (ZipType.DIR | ZipType.FILE)")
         self.zip_filenames[absolute_path] = (archive_path, path_type)
 
+    def package_filenames(self, shared=True):
+        """
+        配置包待压缩的文件列表
+        :param shared: 是否包含共享目录
+        :return: OrderedDict, 同 zip_filenames
+        """
+        return OrderedDict((k, v) for k, v in self.zip_filenames.items() if shared or k not in self.shared_paths)
+
+    def archive_members(self, shared=True):
+        """
+        打包文件列表, 与 ConfigZipFile 的归档路径一致, 重复的归档路径只保留第一个
+        :param shared: 是否包含共享目录中的文件
+        :return: OrderedDict {archive name: absolute path}
+        """
+        return package_members(self.package_filenames(shared).items())
+
+    def write_tar(self, fileobj, names=None, shared=True):
+        """
+        以 tar 流的形式写入打包文件, 压缩方式同 AssignManage.stream_format
+        :param fileobj: 可写的 file-like object, 如 ssh channel
+        :param names: 只写入指定的归档文件, None 时写入全部
+        :param shared: 是否包含共享目录中的文件
+        :return:
+        """
+        names = set(names) if names is not None else None
+        self.parent.stream_format.write_fileobj(fileobj, OrderedDict((name, absolute_path)
+                                               for name, absolute_path in self.archive_members(shared).items()
+                                               if names is None or name in names))
+
     def show_zip_path(self):
         print(f"ZIP: {self.zip_name}")
         for absolute_path in self.zip_filenames:
@@ -205,29 +238,81 @@ class Element(object):
             archive_type = "FILE" if self.zip_filenames[absolute_path][1] is ZipType.FILE else "DIR"
             print(f"\t\tArchive type: {archive_type}")
 
+    @property
+    def zip_name(self):
+        """
+        配置包名
+        :return:
+        """
+        return self.package_name + self.parent.package_format.SUFFIX
+
+    @property
+    def absolute_zip_path(self):
+        """
+        配置包本地路径
+        :return:
+        """
+        return os.path.join(self.parent.package_output, self.zip_name)
+
+    @property
+    def delta_zip_name(self):
+        """
+        增量配置包名, 只包含远程服务器上已变化的文件
+        :return:
+        """
+        return self.package_name + ".delta" + self.parent.package_format.SUFFIX
+
+    @property
+    def absolute_delta_zip_path(self):
+        return os.path.join(self.parent.package_output, self.delta_zip_name)
+
     @property
     def remote_os_path(self):
         """
-        获取zip包远程服务器的路径
+        获取配置包远程服务器的路径
         :return: linux <zip path>
         """
         return POSIX(os.path.join(self.parent.remote_tmp_path, self.zip_name))
 
+    @property
+    def remote_delta_os_path(self):
+        """
+        获取增量配置包远程服务器的路径
+        :return: linux <zip path>
+        """
+        return POSIX(os.path.join(self.parent.remote_tmp_path, self.delta_zip_name))
+
     @property
     def remote_unzip_bashes(self):
         """
-        获取解压 zip 命令
+        获取解压配置包命令
         :return: list<command>
         """
-        return [
-            # 安装 unzip command
-            # 'sh -c \'if ! [ -x $(command -v unzip) ]; then apt-get install unzip -y; else echo "unzip installed"; fi\'',
-            'command -v unzip >/dev/null 2>&1 || { sudo apt-get install unzip -y; }',
-            # # 创建解压目录
-            f"mkdir -p {self.parent.remote_bash_path}",
-            # 解压压缩文件到指定目录
-            f"unzip -o {self.remote_os_path} -d {self.parent.remote_bash_path}"
-        ]
+        return self.unzip_bashes(self.remote_os_path)
+
+    @property
+    def remote_delta_unzip_bashes(self):
+        """
+        获取解压增量配置包命令
+        :return: list<command>
+        """
+        return self.unzip_bashes(self.remote_delta_os_path)
+
+    @property
+    def remote_untar_bashes(self):
+        """
+        从 stdin 解压 tar 流的命令
+        :return: list<command>
+        """
+        return self.parent.stream_format.remote_stream_bashes(self.parent.remote_bash_path)
+
+    def unzip_bashes(self, remote_zip_path):
+        """
+        解压远程配置包的命令, 随配置包格式变化
+        :param remote_zip_path:
+        :return: list<command>
+        """
+        return self.parent.package_format.remote_extract_bashes(remote_zip_path, self.parent.remote_bash_path)
 
     @property
     def install_bashes(self):
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+    树形中继分发: 同一个文件需要拷贝至多台主机时, 只上传一次
+        1. 上传文件至种子主机
+        2. 每一轮中已持有文件的主机启动临时 http 服务, 每台主机为 fanout 台新主机提供下载
+           http 服务只监听主机配置的 ip, 文件位于每次分发随机生成的路径下, 不知道路径无法下载
+        3. 每一跳下载后校验 sha256, 校验失败或下载失败时由本机直接上传
+        4. 所有主机持有文件后停止 http 服务, 将文件移动至目标目录; 分发失败时停止 http 服务并清理临时目录
+
+    主机之间需通过配置的 ip 互通, 远程主机需安装 python3 及 curl
+"""
+import os
+import hashlib
+import secrets
+import logging
+from collections import OrderedDict
+from utils.remote import SshHost
+from .executor import ParallelExecutor
+
+logger = logging.getLogger(__name__)
+
+
+def file_sha256(filename):
+    sha256 = hashlib.sha256()
+    with open(filename, "rb") as fp:
+        for chunk in iter(lambda: fp.read(1024 * 1024), b""):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+class TreeRelay(object):
+    # 临时 http 服务端口
+    PORT = 18080
+
+    def __init__(self, hosts, fanout=2, port=None, max_workers=8):
+        """
+        :param hosts: list<Host>, 同一 ip 只分发一次
+        :param fanout: 每台主机每轮最多提供下载的主机数
+        :param port: 临时 http 服务端口
+        :param max_workers: 每轮最大并发数
+        """
+        if fanout < 1:
+            raise AttributeError("relay fanout must be greater than 0!")
+        unique = OrderedDict()
+        for host in hosts:
+            unique.setdefault(host.ip, host)
+        self.hosts = list(unique.values())
+        self.fanout = fanout
+        self.port = port or TreeRelay.PORT
+        self.max_workers = max_workers
+
+    @staticmethod
+    def __check(host, path, digest):
+        """
+        校验远程文件 sha256
+        :raise RuntimeError
+        """
+        ret = SshHost.getConnection(host).run(f"sha256sum {path}", hide=True)
+        remote_digest = ret.stdout.split()[0] if ret.stdout.strip() else None
+        if remote_digest != digest:
+            raise RuntimeError(f"{host.ip}:{path} sha256 mismatch, expected {digest}, got {remote_digest}")
+
+    def __push(self, host, local, stage, token, digest):
+        """
+        由本机直接上传
+        """
+        with SshHost.getConnection(host).batch() as b:
+            # 临时目录仅当前用户可读, 根目录放置空 index.html, 避免 http 服务列出随机路径
+            b.run(f"umask 077 && mkdir -p {stage}/{token} && touch {stage}/index.html")
+            b.upload(local, f"{stage}/{token}")
+        self.__check(host, f"{stage}/{token}/{os.path.basename(local)}", digest)
+
+    def __pull(self, parent, host, stage, token, name, digest):
+        """
+        从已持有文件的主机下载
+        """
+        SshHost.getConnection(host).run(
+            f"umask 077 && mkdir -p {stage}/{token} && touch {stage}/index.html && "
+            f"curl -fsS --retry 5 --retry-connrefused --retry-delay 1 "
+            f"http://{parent.ip}:{self.port}/{token}/{name} -o {stage}/{token}/{name}", hide=True)
+        self.__check(host, f"{stage}/{token}/{name}", digest)
+
+    def __serve(self, host, stage):
+        """
+        启动临时 http 服务, 只监听主机配置的 ip
+        :return: pid
+        """
+        ret = SshHost.getConnection(host).run(
+            f"cd {stage} && (nohup python3 -m http.server {self.port} --bind {host.ip} "
+            f"</dev/null >/dev/null 2>&1 & echo $!)", hide=True)
+        return ret.stdout.strip()
+
+    def distribute(self, local, remote_dir):
+        """
+        分发文件至所有主机的 remote_dir 目录
+        :param local: 本地文件
+        :param remote_dir: 远程目标目录
+        :return:
+        """
+        if not self.hosts:
+            return
+        digest = file_sha256(local)
+        name = os.path.basename(local)
+        stage = f"/tmp/relay-{digest[:12]}"
+        # 每次分发随机生成下载路径
+        token = secrets.token_hex(16)
+
+        seed, pending = self.hosts[0], list(self.hosts[1:])
+        logger.info(f"relay {name} to {len(self.hosts)} hosts, seed {seed.ip}, fanout {self.fanout}")
+        holders = [seed]
+        servers = OrderedDict()
+        try:
+            self.__push(seed, local, stage, token, digest)
+            while pending:
+                executor = ParallelExecutor(max_workers=self.max_workers, per_host=1)
+                for parent in list(holders):
+                    if not pending:
+                        break
+                    if parent.ip not in servers:
+                        servers[parent.ip] = (parent, self.__serve(parent, stage))
+                    for _ in range(self.fanout):
+                        if not pending:
+                            break
+                        host = pending.pop(0)
+                        executor.submit(parent.ip, host.ip, self.__pull, parent, host, stage, token, name, digest)
+                        holders.append(host)
+
+                result = executor.run()
+                for r in result.failed:
+                    logger.warning(f"relay {name} {r.key} -> {r.host} failed: {r.error}, upload directly.")
+                    self.__push(next(h for h in holders if h.ip == r.host), local, stage, token, digest)
+        except Exception:
+            self.__stop(servers)
+            self.__clean(holders, stage)
+            raise
+        self.__stop(servers)
+
+        executor = ParallelExecutor(max_workers=self.max_workers, per_host=1)
+        for host in self.hosts:
+            executor.submit(name, host.ip, SshHost.getConnection(host).run,
+                            f"mkdir -p {remote_dir} && mv {stage}/{token}/{name} {remote_dir}/ && rm -rf {stage}")
+        result = executor.run()
+        result.summary(logger)
+        if not result.ok:
+            self.__clean(self.hosts, stage)
+        result.raise_for_failure()
+
+    @staticmethod
+    def __stop(servers):
+        """
+        停止临时 http 服务
+        :param servers: OrderedDict {ip: (Host, pid)}
+        """
+        for parent, pid in servers.values():
+            if pid:
+                SshHost.getConnection(parent).run(f"kill {pid}", throw=False, warn=True, hide=True)
+        servers.clear()
+
+    @staticmethod
+    def __clean(hosts, stage):
+        """
+        清理临时目录
+        """
+        for host in hosts:
+            SshHost.getConnection(host).run(f"rm -rf {stage}", throw=False, warn=True, hide=True)
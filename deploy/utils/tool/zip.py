@@ -6,39 +6,124 @@
 @Email:  quanbin@parcelx.io
 """
 import os
-from zipfile import ZipFile
+import shutil
+from zipfile import ZipFile, ZipInfo, ZIP_STORED
 from pathlib import Path
+from contextlib import contextmanager
+
+# 可重现打包时所有文件使用的修改时间
+REPRODUCIBLE_DATE_TIME = (1980, 1, 1, 0, 0, 0)
 
 
 class ConfigZipFile(object):
 
-    def __init__(self, filename):
+    def __init__(self, filename, reproducible=False, compression=ZIP_STORED, compresslevel=None):
         """
-        配置文件压缩操作
-        :param filename: 压缩包名
+        配置文件压缩操作, 可作为上下文管理器批量写入:
+            with ConfigZipFile(filename) as config_zip:
+                config_zip.add_file(...)
+                config_zip.add_directory(...)
+        批量写入时压缩包只打开一次, 退出时写一次中央目录
+        :param filename: 压缩包名, 或可写的 file-like object(只能批量写入)
+        :param reproducible: 文件修改时间固定为 1980-01-01, 目录内文件按名称排序写入
+        :param compression: 压缩方式 ZIP_STORED/ZIP_DEFLATED
+        :param compresslevel: 压缩级别
         """
         self.filename = filename
-        base_dir = os.path.dirname(self.filename)
-        if not os.path.exists(base_dir):
-            os.makedirs(base_dir)
+        self.reproducible = reproducible
+        self.compression = compression
+        self.compresslevel = compresslevel
 
+        # 批量写入时打开的压缩包
+        self.fp = None
         # 去重, 兼容windows
         self.archive_set = set()
-        with ZipFile(self.filename, self.open_mode) as fp:
+        if not isinstance(self.filename, str):
+            return
+        base_dir = os.path.dirname(self.filename)
+        if not os.path.exists(base_dir):
+            os.makedirs(base_dir)
+        with ZipFile(self.filename, "r" if os.path.exists(self.filename) else "w") as fp:
             self.archive_set = set(fp.namelist())
 
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def open(self):
+        """
+        打开压缩包, 之后的 add_file/add_directory 复用同一个文件句柄, 直到 close
+        :return:
+        """
+        if self.fp is None:
+            self.fp = self.__open()
+
+    def close(self):
+        """
+        关闭压缩包, 写入中央目录
+        :return:
+        """
+        if self.fp is not None:
+            self.fp.close()
+            self.fp = None
+
+    def __write(self, fp, file_path, archive_name):
+        if not self.reproducible:
+            fp.write(file_path, archive_name)
+            return
+        info = ZipInfo.from_file(file_path, archive_name)
+        info.date_time = REPRODUCIBLE_DATE_TIME
+        info.compress_type = fp.compression
+        with open(file_path, "rb") as src, fp.open(info, "w") as dest:
+            shutil.copyfileobj(src, dest, 1024 * 8)
+
+    def __open(self):
+        return ZipFile(self.filename, self.open_mode, self.compression, compresslevel=self.compresslevel)
+
+    @contextmanager
+    def __archive(self):
+        """
+        批量写入时返回已打开的压缩包, 否则临时打开
+        """
+        if self.fp is not None:
+            yield self.fp
+        elif not isinstance(self.filename, str):
+            raise AttributeError("file-like object must be written in batch, use ConfigZipFile as context manager!")
+        else:
+            with self.__open() as fp:
+                yield fp
+
     @property
     def open_mode(self):
+        if not isinstance(self.filename, str):
+            return "w"
         return "a" if os.path.exists(self.filename) else "w"
 
     def clear(self):
+        self.close()
         if os.path.exists(self.filename):
             os.remove(self.filename)
+        self.archive_set = set()
 
     def contain(self, archive_name):
         return True if Path(archive_name).as_posix() in self.archive_set \
             else False
 
+    def add_member(self, file_path, archive_name):
+        """
+        以指定的归档文件名添加单个文件
+        :param file_path:    要压缩文件的路径
+        :param archive_name: 归档文件名
+        :return:
+        """
+        with self.__archive() as fp:
+            if not self.contain(archive_name):
+                self.__write(fp, file_path, archive_name)
+                self.archive_set.add(Path(archive_name).as_posix())
+
     def add_file(self, file_path, archive_path):
         """
         添加单个文件
@@ -46,11 +131,11 @@ class ConfigZipFile(object):
         :param archive_path:归档文件根路径
         :return:
         """
-        with ZipFile(self.filename, self.open_mode) as fp:
+        with self.__archive() as fp:
             file_name = os.path.basename(file_path)
             archive_name = os.path.join(archive_path, file_name)
             if not self.contain(archive_name):
-                fp.write(file_path, archive_name)
+                self.__write(fp, file_path, archive_name)
                 self.archive_set.add(Path(archive_name).as_posix())
 
     def add_directory(self, src_path, archive_root_path):
@@ -60,13 +145,14 @@ class ConfigZipFile(object):
         :param archive_root_path:归档目录根路径
         :return:
         """
-        with ZipFile(self.filename, self.open_mode) as fp:
-            for root, _, files in os.walk(src_path):
-                for file in files:
+        with self.__archive() as fp:
+            for root, dirs, files in os.walk(src_path):
+                dirs.sort()
+                for file in sorted(files):
                     file_path = os.path.join(root, file)
                     relative_path = Path(file_path).relative_to(src_path)
                     archive_path = os.path.join(archive_root_path, relative_path)
                     if not self.contain(archive_path):
-                        fp.write(file_path, archive_path)
+                        self.__write(fp, file_path, archive_path)
                         self.archive_set.add(Path(archive_path).as_posix())
 